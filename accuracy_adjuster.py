@@ -1,98 +1,185 @@
-import os
-import json
 import time
-import requests
+import config
+import discovery_cache
+import http_client
+import journal
+import log_sink
+import metrics
+import performance_tracker
+import relayer_client
+import scheduler
+import telegram_notify
 from datetime import datetime
-from telegram import Bot
-
-# === Load Agent Config ===
-AGENT_JSON = "agent_instructions.json"
-
-def load_agent_config():
-    with open(AGENT_JSON, "r") as f:
-        return json.load(f)
-
-agent_config = load_agent_config()
 
 # === Telegram Setup ===
-telegram_bot = Bot(token=agent_config["telegram"]["bot_token"])
-CHAT_ID = agent_config["telegram"]["chat_id"]
+def notify(msg: str, key: str | None = None):
+    telegram_notify.send(msg, key=key)
+
+# === Gelato ===
+def current_relayer():
+    """Configured relayer, or the shared discovery cache while config says auto-update."""
+    configured = config.get().gelato.relayer
+    if configured and configured != "auto-update":
+        return configured
+    return discovery_cache.gelato_relayer()
 
-def notify(msg: str):
-    print(msg)
+# === Safe POST ===
+def safe_post(url, payload, retries=3, deadline=None, headers=None):
+    def on_retry(attempt, total, error):
+        notify(f"Retry {attempt}/{total} failed for {url}: {error}", key=f"retry:{url}")
     try:
-        telegram_bot.send_message(chat_id=CHAT_ID, text=msg)
+        return http_client.post(url, json=payload, retries=retries, deadline=deadline, on_retry=on_retry,
+                                headers=headers, lane="submit").json()
     except Exception as e:
-        print(f"[WARN] Telegram notify failed: {e}")
+        notify(f"❌ Request to {url} failed: {e}")
+        return None
 
-# === Wallet & Gelato ===
-WALLET_ADDRESS = agent_config["wallet"]["address"]
-GELATO_RELAYER = agent_config["gelato"].get("relayer")
-PREDICTOR_API = agent_config["predictor"]["api_endpoint"]
+# === Adjust Accuracy Logic ===
+# Confidence per feed is its calibrated hit rate (see calibration.py), fitted
+# incrementally from the prediction log and checkpointed between runs.
+_engine = None
 
-# === Logging Files ===
-PERF_FILE = agent_config["logging"]["performance_file"]
-ERROR_FILE = agent_config["logging"]["error_file"]
+def calibration_engine():
+    global _engine
+    if _engine is None:
+        import calibration
+        _engine = calibration.CalibrationEngine.from_checkpoint()
+    return _engine
 
-# === Safe POST ===
-def safe_post(url, payload, retries=3, delay=5):
-    for i in range(retries):
-        try:
-            r = requests.post(url, json=payload, timeout=15)
-            r.raise_for_status()
-            return r.json()
-        except Exception as e:
-            notify(f"Retry {i+1}/{retries} failed for {url}: {e}")
-            time.sleep(delay)
-    return None
+def calibrated_confidences(feeds):
+    """Fit outcomes resolved since the last pass, then every feed's confidence in one vectorized read."""
+    import calibration
+    engine = calibration_engine()
+    with metrics.stage("calibration"):
+        fitted = calibration.refresh(engine)
+        confidences = engine.calibrator.confidences([feed["name"] for feed in feeds])
+    metrics.inc("calibration_outcomes_total", fitted)
+    return confidences
 
-# === Adjust Accuracy Logic ===
-def adjust_prediction_confidence(feed):
-    """Simple example: slightly adjust confidence up or down randomly."""
-    import random
-    current_conf = feed.get("confidence", 0.7)
-    change = random.uniform(-0.05, 0.05)
-    new_conf = min(max(current_conf + change, 0.5), 0.95)
-    feed["confidence"] = round(new_conf, 2)
+def adjust_prediction_confidence(feed, confidence):
+    feed["confidence"] = round(float(confidence), 2)
     return feed
 
-def submit_adjusted_feed(feed):
-    payload = {
+def build_adjusted_payload(feed):
+    return {
         "feed": feed["name"],
         "confidence": feed["confidence"],
-        "wallet": WALLET_ADDRESS,
+        "wallet": config.get().wallet.address,
         "timestamp": datetime.utcnow().isoformat()
     }
-    if GELATO_RELAYER:
-        response = safe_post(GELATO_RELAYER, payload)
-        if response:
+
+def submit_adjusted_feed(feed, payload=None):
+    submit_adjusted_round([(feed, payload or build_adjusted_payload(feed))])
+
+# Adjustments share the submission journal with predictions, under their own feed key.
+JOURNAL_PREFIX = "adjust:"
+
+def adjustment_epoch(feed, now=None):
+    """The epoch an adjustment sent now applies to: the one closing next."""
+    return scheduler.next_boundary(scheduler.feed_interval_seconds(feed), now)
+
+def submit_adjusted_round(prepared):
+    """
+    Send a round's adjustments in one batched relayer call when the relayer
+    accepts batches. Each (wallet, feed, epoch) goes through the submission
+    journal, so a retried POST or a rerun round applies an adjustment once.
+    """
+    relayer = current_relayer()
+    if not relayer:
+        notify("❌ Gelato relayer unavailable. Skipping submission.")
+        return
+    now = time.time()
+    epochs = {feed["name"]: adjustment_epoch(feed, now) for feed, _ in prepared}
+    with metrics.stage("journal"):
+        todo = journal.default_journal().begin(
+            [(p["wallet"], JOURNAL_PREFIX + feed["name"], epochs[feed["name"]], epochs[feed["name"]], p)
+             for feed, p in prepared])
+    sending = {entry[1][len(JOURNAL_PREFIX):] for entry in todo}
+    prepared = [(feed, p) for feed, p in prepared if feed["name"] in sending]
+    if not prepared:
+        return
+    payloads = [payload for _, payload in prepared]
+    keys = {p["feed"]: journal.submission_key(p["wallet"], JOURNAL_PREFIX + p["feed"], epochs[p["feed"]])
+            for p in payloads}
+    deadline = min(epochs.values())
+
+    def send_one(p):
+        return safe_post(relayer, p, deadline=epochs[p["feed"]], headers={"Idempotency-Key": keys[p["feed"]]})
+
+    batch_key = journal.submission_key(relayer, ",".join(sorted(keys.values())), 0)
+    with metrics.stage("submission"):
+        sent = relayer_client.submit_many(relayer, payloads, send_one, deadline=deadline,
+                                          headers={"Idempotency-Key": batch_key},
+                                          keys=[keys[p["feed"]] for p in payloads])
+    with metrics.stage("journal"):
+        journal.default_journal().finish(
+            [(p["wallet"], JOURNAL_PREFIX + p["feed"], epochs[p["feed"]], ok) for p, ok in zip(payloads, sent)])
+    for (feed, _), ok in zip(prepared, sent):
+        if ok:
             notify(f"✅ Submitted adjusted confidence for {feed['name']}: {feed['confidence']}")
         else:
             notify(f"❌ Failed to submit adjusted confidence for {feed['name']}")
-    else:
-        notify("❌ Gelato relayer unavailable. Skipping submission.")
+
+# === Pipeline ===
+# The next round's adjustments and payloads are built in the idle time after a
+# round, so only the send (with a fresh timestamp) happens at the deadline.
+_next_round = None
+
+def prepare_adjustments():
+    global _next_round
+    feeds = config.get().feeds
+    prepared = []
+    for feed, confidence in zip(feeds, calibrated_confidences(feeds)):
+        feed = adjust_prediction_confidence(dict(feed), confidence)
+        prepared.append((feed, build_adjusted_payload(feed)))
+    _next_round = prepared
+
+def take_adjustments():
+    global _next_round
+    prepared, _next_round = _next_round, None
+    if prepared is None:
+        prepare_adjustments()
+        prepared, _next_round = _next_round, None
+    timestamp = datetime.utcnow().isoformat()
+    return [(feed, dict(payload, timestamp=timestamp)) for feed, payload in prepared]
 
 # === Main Loop ===
+def adjust_round(boundary=None):
+    """One adjustment pass over every feed; errors are logged and the next epoch still fires."""
+    log_files = config.get().logging
+    try:
+        with telegram_notify.round_digest("🎯 Accuracy adjustment round"):
+            prepared = take_adjustments()
+            submit_adjusted_round(prepared)
+            for feed, _ in prepared:
+                # Log performance
+                with metrics.stage("log_write"):
+                    performance_tracker.record_adjustment(feed["name"], feed["confidence"])
+                log_sink.log(log_files.performance_file, f"Adjusted {feed['name']} - confidence {feed['confidence']}")
+    except Exception as e:
+        notify(f"❌ Unhandled error in Accuracy Adjuster: {e}")
+        log_sink.log(log_files.error_file, f"ERROR: {e}")
+    finally:
+        try:
+            prepare_adjustments()
+        except Exception as e:
+            notify(f"⚠️ Could not prepare next adjustment round: {e}")
+
+def report_miss(name, boundary, late_by):
+    notify(f"⏰ Missed {name} epoch deadline by {late_by:.1f}s", key=f"miss:{name}")
+
 def main():
+    metrics.start_from_env()
+    cfg = config.get()
+    telegram_notify.configure(cfg.telegram.bot_token, cfg.telegram.chat_id)
     notify("🚀 Accuracy Adjuster started")
-    FEEDS = agent_config["feeds"]
-    INTERVAL = agent_config["predictor"]["interval_seconds"]
+    INTERVAL = min(cfg.feed_intervals())  # calibration is cheap enough to refit every epoch
+    LEAD = cfg.predictoor.schedule_lead_seconds
 
-    while True:
-        try:
-            for feed in FEEDS:
-                feed = adjust_prediction_confidence(feed)
-                submit_adjusted_feed(feed)
-                # Log performance
-                with open(PERF_FILE, "a") as f:
-                    f.write(f"{datetime.utcnow().isoformat()} - Adjusted {feed['name']} - confidence {feed['confidence']}\n")
-            notify(f"Sleeping for {INTERVAL} seconds before next round...")
-            time.sleep(INTERVAL)
-        except Exception as e:
-            notify(f"❌ Unhandled error in Accuracy Adjuster: {e}")
-            with open(ERROR_FILE, "a") as f:
-                f.write(f"{datetime.utcnow().isoformat()} - ERROR: {e}\n")
-            time.sleep(30)
+    sched = scheduler.EpochScheduler(lead_seconds=LEAD, on_miss=report_miss)
+    sched.add("accuracy-adjust", INTERVAL, adjust_round)
+    notify(f"Adjusting every {INTERVAL} seconds, {LEAD}s before epoch close")
+    sched.run()
 
 # === Entrypoint ===
 if __name__ == "__main__":
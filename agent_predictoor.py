@@ -1,69 +1,135 @@
-import os
-import json
 import time
-import random
-import requests
+import functools
+import threading
+import candle_store
+import config
+import discovery_cache
+import http_client
+import journal
+import metrics
+import performance_tracker
+import prediction_engine
+import relayer_client
+import scheduler
+import telegram_notify
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
-from telegram import Bot
 
 # === CONFIG ===
-AGENT_JSON = "agent_instructions.json"
+# Read from the shared config layer on every use, so edits to
+# agent_instructions.json or feeds.yaml apply from the next round.
+#   max_concurrency / submit_margin_seconds: every feed in a round is fanned
+#     out at once and must land before its epoch closes, minus the margin.
+#   schedule_lead_seconds: rounds fire this long before each epoch boundary.
+#   pipelined / prepare_lead_seconds / refresh_budget_seconds: predictions are
+#     prepared ahead and only refreshed with the newest candle at fire time.
+#   batch_submit: pack a round into one relayer call, per feed if rejected.
+def settings():
+    return config.get().predictoor
 
-def load_agent_config():
-    with open(AGENT_JSON, "r") as f:
-        return json.load(f)
+# === TELEGRAM NOTIFY ===
+def notify(msg, key=None):
+    telegram_notify.send(msg, key=key)
 
-agent_config = load_agent_config()
-telegram_bot = Bot(token=agent_config["telegram"]["bot_token"])
-wallet = agent_config["wallet"]
-feeds = agent_config["feeds"]
-predictoor = agent_config["predictoor"]
-gelato_relayer = agent_config["gelato"].get("relayer")
+# === SAFE REQUEST ===
+def safe_post(url, payload, retries=3, deadline=None, headers=None):
+    """POST with pooled retries; never waits past `deadline` (unix time) when given."""
+    def on_retry(attempt, total, error):
+        notify(f"Retry {attempt}/{total} failed for {url}: {error}", key=f"retry:{url}")
+    try:
+        return http_client.post(url, json=payload, retries=retries, deadline=deadline, on_retry=on_retry,
+                                headers=headers, lane="submit").json()
+    except Exception as e:
+        notify(f"❌ Request to {url} failed: {e}")
+        return None
 
-# === TELEGRAM NOTIFY ===
-def notify(msg):
-    print(msg)
+# === PREDICTION LOGIC ===
+def load_closes(feed):
+    """Top up the feed's local candle store and return a view of its recent closes."""
+    store = candle_store.store_for_feed(feed)
     try:
-        telegram_bot.send_message(chat_id=agent_config["telegram"]["chat_id"], text=msg)
+        store.top_up()
     except Exception as e:
-        print(f"[WARN] Telegram notify failed: {e}")
+        notify(f"⚠️ Candle top-up failed for {feed['name']}: {e}", key=f"candles:{feed['name']}")
+    return store.tail(settings().lookback)["close"]
 
-# === SAFE REQUEST ===
-def safe_post(url, payload, retries=3, delay=5):
-    for i in range(retries):
-        try:
-            r = requests.post(url, json=payload, timeout=15)
-            r.raise_for_status()
-            return r.json()
-        except Exception as e:
-            notify(f"Retry {i+1}/{retries} failed for {url}: {e}")
-            time.sleep(delay)
-    return None
+def prepare_predictions(round_feeds, wallet_address=None):
+    """Payloads for every feed from one vectorized model pass."""
+    with metrics.stage("candles"):
+        windows = list(get_candle_executor().map(load_closes, round_feeds))
+    return predict(round_feeds, windows, wallet_address)
+
+def predict(round_feeds, windows, wallet_address=None):
+    """`wallet_address` defaults to the configured wallet."""
+    cfg = config.get()
+    with metrics.stage("prediction"):
+        return prediction_engine.predict_batch(
+            round_feeds, windows, wallet_address or cfg.wallet.address, cfg.predictoor.model, cfg.predictoor.lookback)
 
-# === PREDICTION LOGIC ===
 def prepare_prediction(feed):
+    """Single-feed payload; rounds use prepare_predictions for the whole batch."""
+    return prepare_predictions([feed])[0]
+
+# === PIPELINE ===
+_prepared = {}
+_prepared_lock = threading.Lock()
+
+def prepare_ahead(interval, round_feeds, boundary):
+    """Idle-time phase: fill candle stores, run the model and resolve the relayer for `boundary`."""
+    try:
+        payloads = prepare_predictions(round_feeds)
+        current_relayer()
+    except Exception as e:
+        notify(f"⚠️ Could not prepare round for {interval}s feeds: {e}", key=f"prepare:{interval}")
+        return
+    with _prepared_lock:
+        _prepared[interval] = {"boundary": boundary, "payloads": payloads}
+
+def refresh_prepared(round_feeds, payloads):
     """
-    Simple example: mock prediction payload.
-    In real case: build model based on previous epochs.
+    Re-run the model with the newest candle. Top-ups that miss the refresh
+    budget fall back to what is already stored, so this never waits long.
     """
-    prediction_confidence = random.uniform(0.6, 0.9)
-    direction = "up" if prediction_confidence >= 0.7 else "down"
-    payload = {
-        "feed": feed["name"],
-        "exchange": feed["exchange"],
-        "direction": direction,
-        "confidence": round(prediction_confidence, 2),
-        "wallet": wallet["address"],
-        "timestamp": datetime.utcnow().isoformat()
-    }
-    return payload
+    pool = get_candle_executor()
+    futures = [pool.submit(load_closes, feed) for feed in round_feeds]
+    with metrics.stage("candles_refresh"):
+        wait(futures, timeout=settings().refresh_budget_seconds)
+    for f in futures:
+        f.cancel()  # drop top-ups still queued; running ones finish on the candle pool, never the submit pool
+    try:
+        windows = [
+            f.result() if f.done() and not f.cancelled()
+            else candle_store.store_for_feed(feed).tail(settings().lookback)["close"]
+            for f, feed in zip(futures, round_feeds)
+        ]
+        return predict(round_feeds, windows)
+    except Exception as e:
+        notify(f"⚠️ Refresh failed, sending prepared predictions: {e}", key="refresh")
+        return payloads
+
+def take_prepared(interval, boundary):
+    with _prepared_lock:
+        prepared = _prepared.pop(interval, None)
+    if prepared and prepared["boundary"] == boundary:
+        return prepared["payloads"]
+    return None
 
 # === SUBMIT TO GELATO RELAYER ===
-def submit_prediction(payload):
-    if not gelato_relayer:
+def current_relayer():
+    """Env/config relayer, or the shared discovery cache while config says auto-update."""
+    configured = config.get().gelato.relayer
+    if configured and configured != "auto-update":
+        return configured
+    return discovery_cache.gelato_relayer()
+
+def submit_prediction(payload, deadline=None, epoch=None):
+    """`epoch` adds an idempotency key, so a retried POST the relayer already accepted applies once."""
+    relayer = current_relayer()
+    if not relayer:
         notify("❌ Gelato relayer unavailable.")
         return False
-    response = safe_post(gelato_relayer, payload)
+    headers = {"Idempotency-Key": journal.submission_key(payload["wallet"], payload["feed"], epoch)} if epoch else None
+    response = safe_post(relayer, payload, deadline=deadline, headers=headers)
     if response:
         notify(f"✅ Submitted prediction for {payload['feed']} | {payload['direction']} @ {payload['confidence']}")
         return True
@@ -71,15 +137,258 @@ def submit_prediction(payload):
         notify(f"❌ Submission failed for {payload['feed']}")
         return False
 
+# === CONCURRENT ROUND ===
+_executor = None
+_candle_executor = None
+
+def get_executor():
+    """Long-lived bounded pool, so a stuck feed never blocks the next round's teardown."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings().max_concurrency, thread_name_prefix="submit")
+    return _executor
+
+def get_candle_executor():
+    """Candle top-ups get their own pool, so slow exchange reads never queue ahead of submissions."""
+    global _candle_executor
+    if _candle_executor is None:
+        _candle_executor = ThreadPoolExecutor(max_workers=settings().max_concurrency, thread_name_prefix="candles")
+    return _candle_executor
+
+def epoch_close(feed, now=None):
+    """Unix time at which the feed's current epoch closes."""
+    return scheduler.next_boundary(scheduler.feed_interval_seconds(feed), now)
+
+def feed_deadline(feed, now=None):
+    return epoch_close(feed, now) - settings().submit_margin_seconds
+
+def record_submission(payload, feed, ok, epoch, finished, deadline):
+    if ok:
+        with metrics.stage("log_write"):
+            performance_tracker.record_prediction(
+                payload, epoch, feed.get("symbol"), scheduler.feed_interval_seconds(feed))
+    metrics.observe("deadline_slack_seconds", max(0.0, deadline - finished))
+    metrics.set_gauge("deadline_slack_last_seconds", deadline - finished, feed=payload["feed"])
+    metrics.inc("submissions_total", status="submitted" if ok else "failed")
+
+def submit_feed(payload, feed, deadline, epoch=None):
+    """Submit one prepared payload; returns (status, seconds taken)."""
+    started = time.time()
+    epoch = epoch or epoch_close(feed, started)
+    with metrics.stage("submission"):
+        ok = submit_prediction(payload, deadline=deadline, epoch=epoch)
+    finished = time.time()
+    with metrics.stage("journal"):
+        journal.default_journal().finish([(payload["wallet"], payload["feed"], epoch, ok)])
+    record_submission(payload, feed, ok, epoch, finished, deadline)
+    return ("submitted" if ok else "failed"), finished - started
+
+def submit_round_batch(payloads, by_name, deadlines, epochs):
+    """
+    Send the whole round in one relayer call. Returns (results for accepted
+    feeds, payloads still to send one by one), or None if batches are rejected.
+    """
+    relayer = current_relayer()
+    if not relayer:
+        return None
+    started = time.time()
+    def on_retry(attempt, total, error):
+        notify(f"Retry {attempt}/{total} failed for batch to {relayer}: {error}", key=f"retry:{relayer}")
+    # Same per-item keys as submit_prediction, so resending a batch that landed unanswered applies once.
+    keys = [journal.submission_key(p["wallet"], p["feed"], epochs[p["feed"]]) for p in payloads]
+    headers = {"Idempotency-Key": journal.submission_key(relayer, ",".join(sorted(keys)), 0)}
+    items = relayer_client.submit_batch(relayer, payloads, deadline=min(deadlines.values()), on_retry=on_retry,
+                                        headers=headers, keys=keys)
+    if items is None:
+        return None
+    finished = time.time()
+    with metrics.stage("journal"):
+        journal.default_journal().finish(
+            [(p["wallet"], p["feed"], epochs[p["feed"]], True) for p, item in zip(payloads, items) if item.get("ok")])
+    results, leftover = {}, []
+    for payload, item in zip(payloads, items):
+        name = payload["feed"]
+        if item.get("ok"):
+            record_submission(payload, by_name[name], True, epochs[name], finished, deadlines[name])
+            results[name] = {"status": "submitted", "seconds": round(finished - started, 2)}
+        else:
+            leftover.append(payload)
+    notify(f"✅ Batch-submitted {len(results)}/{len(payloads)} predictions"
+           + (f", retrying {len(leftover)} individually" if leftover else ""))
+    return results, leftover
+
+def run_round(round_feeds, payloads=None):
+    """
+    Fan out every feed at once and wait until the latest per-feed deadline.
+    Uses `payloads` when they were prepared ahead, otherwise predicts now.
+    Feeds the journal already has as sent for this epoch are skipped.
+    Returns a summary dict: per-feed status plus counts and round time.
+    """
+    started = time.time()
+    deadlines = {feed["name"]: feed_deadline(feed, started) for feed in round_feeds}
+    epochs = {feed["name"]: epoch_close(feed, started) for feed in round_feeds}
+    if payloads is None:
+        payloads = prepare_predictions(round_feeds)
+    pool = get_executor()
+    by_name = {feed["name"]: feed for feed in round_feeds}
+    with metrics.stage("journal"):
+        todo = journal.default_journal().begin(
+            [(p["wallet"], p["feed"], epochs[p["feed"]], deadlines[p["feed"]], p) for p in payloads])
+    sending = {entry[1] for entry in todo}
+    results = {p["feed"]: {"status": "duplicate"} for p in payloads if p["feed"] not in sending}
+    payloads = [entry[4] for entry in todo]
+    wallets = {p["feed"]: p["wallet"] for p in payloads}
+    if settings().batch_submit and len(payloads) > 1:
+        batched = submit_round_batch(payloads, by_name, deadlines, epochs)
+        if batched is not None:
+            batch_results, payloads = batched
+            results.update(batch_results)
+    submit = telegram_notify.bind(submit_feed)  # the pool's notifications join this round's digest
+    futures = {pool.submit(submit, p, by_name[p["feed"]], deadlines[p["feed"]], epochs[p["feed"]]): p["feed"]
+               for p in payloads}
+    wait(futures, timeout=max(0, max(deadlines.values(), default=started) - time.time()))
+
+    for future, name in futures.items():
+        if not future.done():
+            future.cancel()
+            results[name] = {"status": "missed", "seconds": round(time.time() - started, 2)}
+        elif future.exception():
+            results[name] = {"status": "error", "error": str(future.exception())}
+        else:
+            status, seconds = future.result()
+            results[name] = {"status": status, "seconds": round(seconds, 2)}
+
+    unfinished = [name for name, r in results.items() if r["status"] in ("missed", "error")]
+    if unfinished:
+        journal.default_journal().finish([(wallets[name], name, epochs[name], False) for name in unfinished])
+    counts = {}
+    for r in results.values():
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    metrics.observe("round_seconds", time.time() - started)
+    if counts.get("missed"):
+        metrics.inc("submissions_total", counts["missed"], status="missed")
+    return {"feeds": results, "counts": counts, "seconds": round(time.time() - started, 2)}
+
+def format_summary(summary):
+    counts = ", ".join(f"{k}={v}" for k, v in sorted(summary["counts"].items()))
+    return f"📋 Round finished in {summary['seconds']}s | {counts}"
+
+def predict_round(round_feeds, interval=None, boundary=None):
+    payloads = take_prepared(interval, boundary) if settings().pipelined else None
+    if payloads is not None:
+        payloads = refresh_prepared(round_feeds, payloads)
+    with telegram_notify.round_digest("🔮 Prediction round"):
+        summary = run_round(round_feeds, payloads)
+        notify(format_summary(summary))
+    compact_journal()
+    return summary
+
+# === JOURNAL ===
+COMPACT_EVERY = 3600
+_compacted = 0.0
+
+def compact_journal():
+    """Drop journal rows past journal.RETENTION, at most once per COMPACT_EVERY; runs after a round's deadline."""
+    global _compacted
+    if time.time() - _compacted < COMPACT_EVERY:
+        return
+    _compacted = time.time()
+    try:
+        journal.default_journal().compact()
+    except Exception as e:
+        notify(f"⚠️ Journal compaction failed: {e}", key="journal-compact")
+
+def resume_submissions():
+    """
+    Crash recovery: resend submissions a previous run journaled as pending
+    while their epoch is still open; the rest are expired.
+    """
+    entries = journal.default_journal().recover()
+    feeds = {feed["name"]: feed for feed in config.get().feeds}
+    entries = [entry for entry in entries if entry[1] in feeds]
+    if not entries:
+        return
+    notify(f"♻️ Resuming {len(entries)} unfinished submission(s) from the journal")
+    pool = get_executor()
+    futures = [pool.submit(submit_feed, payload, feeds[feed], deadline, epoch)
+               for wallet, feed, epoch, deadline, payload in entries]
+    wait(futures, timeout=max(0, max(entry[3] for entry in entries) - time.time()))
+
+# === SCHEDULE ===
+def feeds_by_interval(feed_list):
+    groups = {}
+    for feed in feed_list:
+        groups.setdefault(scheduler.feed_interval_seconds(feed), []).append(feed)
+    return groups
+
+def prepare_interval(interval, boundary):
+    """Prepare whichever feeds are configured for `interval` at fire time."""
+    round_feeds = config.get().feeds_for(interval)
+    if round_feeds:
+        prepare_ahead(interval, round_feeds, boundary)
+
+def predict_interval(interval, boundary):
+    round_feeds = config.get().feeds_for(interval)
+    if round_feeds:
+        return predict_round(round_feeds, interval, boundary)
+
+def spawn(target, name, *args):
+    """Scheduler callback running `target` on its own thread, so groups sharing a boundary don't queue."""
+    def fire(boundary):
+        threading.Thread(target=target, args=(*args, boundary), name=name, daemon=True).start()
+    return fire
+
+def report_miss(name, boundary, late_by):
+    closed = datetime.utcfromtimestamp(boundary).strftime("%H:%M:%S")
+    notify(f"⏰ Missed {name} epoch closing {closed} UTC (late by {late_by:.1f}s)", key=f"miss:{name}")
+
+def round_tasks(intervals=None):
+    """(name, interval, run(boundary), lead_seconds) for the prepare and predict rounds of each feed interval."""
+    cfg = config.get()
+    lead, prepare_lead = cfg.predictoor.schedule_lead_seconds, cfg.predictoor.prepare_lead_seconds
+    tasks = []
+    for interval in cfg.feed_intervals() if intervals is None else intervals:
+        if cfg.predictoor.pipelined and prepare_lead > lead:
+            tasks.append((f"prepare-{interval}s", interval, functools.partial(prepare_interval, interval),
+                          min(prepare_lead, interval - 1)))
+        tasks.append((f"predict-{interval}s", interval, functools.partial(predict_interval, interval), lead))
+    return tasks
+
+def watch_feed_intervals(add):
+    """After a config reload, pass round tasks for feed intervals not scheduled yet to `add(*task)`."""
+    scheduled = set(config.get().feed_intervals())
+
+    def schedule_new(old, new):
+        fresh = [interval for interval in new.feed_intervals() if interval not in scheduled]
+        scheduled.update(fresh)
+        for task in round_tasks(fresh):
+            add(*task)
+        if fresh:
+            notify(f"🔄 Scheduled new feed interval(s): {', '.join(f'{i}s' for i in fresh)}")
+
+    config.on_reload(schedule_new)
+
 # === MAIN LOOP ===
 def main():
+    metrics.start_from_env()
+    cfg = config.get()
+    telegram_notify.configure(cfg.telegram.bot_token, cfg.telegram.chat_id)
     notify("Starting Predictoor Agent...")
-    while True:
-        for feed in feeds:
-            payload = prepare_prediction(feed)
-            submit_prediction(payload)
-        notify(f"Sleeping for {feeds[0]['interval_minutes']} minutes before next round...")
-        time.sleep(feeds[0]["interval_minutes"] * 60)  # repeat per feed interval
+    current_relayer()  # warm the discovery cache before the first deadline
+    resume_submissions()
+    lead = cfg.predictoor.schedule_lead_seconds
+    sched = scheduler.EpochScheduler(lead_seconds=lead, on_miss=report_miss)
+
+    def add(name, interval, run, lead_seconds):
+        sched.add(name, interval, spawn(run, name.split("-")[0] + "-round"), lead_seconds=lead_seconds)
+
+    for task in round_tasks():
+        add(*task)
+    watch_feed_intervals(add)
+    sched.add("config-watch", config.WATCH_INTERVAL, lambda boundary: config.get(), lead_seconds=1)
+    for interval, group in feeds_by_interval(cfg.feeds).items():
+        notify(f"Scheduled {len(group)} feed(s) every {interval}s, {lead}s before epoch close")
+    sched.run()
 
 # === ENTRYPOINT ===
 if __name__ == "__main__":
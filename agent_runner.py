@@ -1,113 +1,77 @@
-import os
-import sys
-import time
-import json
-import requests
+import discovery_cache
+import config
+import log_sink
+import metrics
+import scheduler
+import telegram_notify
 from datetime import datetime
-from telegram import Bot
-
-# === LOAD INSTRUCTIONS ===
-with open("agent_instructions.json", "r") as f:
-    instructions = json.load(f)
-
-FEEDS = instructions["feeds"]
-PRED_INTERVAL = instructions["prediction_interval_minutes"]
-FALLBACK_CONTRACT = instructions["fallback_predictoor"]
-RELAYER_FALLBACK = instructions["gelato"]["fallback"]
-CONTRACT_URLS = instructions["predictoor_contracts"]
-RELAYER_URLS = instructions["gelato"]["relayer_urls"]
-
-TELEGRAM_BOT_TOKEN = os.getenv(instructions["telegram"]["bot_token_env"])
-TELEGRAM_CHAT_ID = os.getenv(instructions["telegram"]["chat_id_env"])
-WALLET_PRIVATE_KEY = os.getenv(instructions["wallet"]["private_key_env"])
-WALLET_ADDRESS = os.getenv(instructions["wallet"]["address_env"])
-
-bot = Bot(token=TELEGRAM_BOT_TOKEN)
 
 # === TELEGRAM NOTIFY ===
-def notify(msg):
-    print(msg)
-    if TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID:
-        try:
-            bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=msg)
-        except Exception as e:
-            print(f"Telegram notify failed: {e}")
-
-# === SAFE REQUEST ===
-def safe_get(url, retries=3, delay=3):
-    for i in range(retries):
-        try:
-            r = requests.get(url, timeout=10)
-            r.raise_for_status()
-            return r.text
-        except Exception as e:
-            notify(f"Retry {i+1}/{retries} failed for {url}: {e}")
-            time.sleep(delay)
-    return None
+def notify(msg, key=None):
+    telegram_notify.send(msg, key=key)
 
 # === GET PREDICTOOR CONTRACT ===
 def get_predictoor_contract():
-    for url in CONTRACT_URLS:
-        text = safe_get(url)
-        if text:
-            try:
-                data = json.loads(text)
-                contract = data.get("sapphire-mainnet", {}).get("Predictoor")
-                if contract:
-                    notify(f"✅ Using Predictoor contract: {contract}")
-                    return contract
-            except Exception as e:
-                notify(f"JSON parse failed for {url}: {e}")
-    notify(f"⚠️ Using fallback Predictoor contract: {FALLBACK_CONTRACT}")
-    return FALLBACK_CONTRACT
+    """Served from the shared discovery cache; stale entries revalidate in the background."""
+    settings = config.get().predictoor
+    fallback = settings.fallback_contract or discovery_cache.FALLBACK_CONTRACT
+    contract = discovery_cache.predictoor_contract(settings.contract_urls, fallback)
+    if contract == fallback:
+        notify(f"⚠️ Using fallback Predictoor contract: {fallback}")
+    else:
+        notify(f"✅ Using Predictoor contract: {contract}")
+    return contract
 
 # === GET GELATO RELAYER ===
 def get_gelato_relayer():
-    for url in RELAYER_URLS:
-        text = safe_get(url)
-        if text:
-            try:
-                parsed = json.loads(text)
-                if isinstance(parsed, list) and len(parsed) > 0:
-                    relayer = parsed[0].get("address") or RELAYER_FALLBACK
-                    notify(f"✅ Selected Gelato relayer: {relayer}")
-                    return relayer
-            except Exception as e:
-                notify(f"Relayer parse failed for {url}: {e}")
-    notify(f"⚠️ Using fallback Gelato relayer: {RELAYER_FALLBACK}")
-    return RELAYER_FALLBACK
+    settings = config.get().gelato
+    fallback = settings.fallback_relayer or discovery_cache.FALLBACK_RELAYER
+    relayer = discovery_cache.gelato_relayer(settings.relayer_urls, fallback)
+    if relayer == fallback:
+        notify(f"⚠️ Using fallback Gelato relayer: {fallback}")
+    else:
+        notify(f"✅ Selected Gelato relayer: {relayer}")
+    return relayer
 
-# === AUTO RESTART ===
-def auto_restart(reason=None):
-    notify(f"⚠️ Agent restarting: {reason}")
-    time.sleep(10)
-    os.execv(sys.executable, ['python'] + sys.argv)
+# === ROUND ===
+def run_round(boundary=None):
+    contract = get_predictoor_contract()
+    relayer = get_gelato_relayer()
 
-# === MAIN LOOP ===
-def main():
-    while True:
-        try:
-            contract = get_predictoor_contract()
-            relayer = get_gelato_relayer()
+    # Simulate submitting predictions
+    cfg = config.get()
+    timestamp = datetime.utcnow().isoformat()
+    with telegram_notify.round_digest(f"[{timestamp}] Prediction round"):
+        notify(f"Submitting predictions to {relayer} using {contract}")
+        for feed in cfg.feeds:
+            # Normally: call prediction API here
+            notify(f"📊 Predicted feed: {feed['name']}")
 
-            # Simulate submitting predictions
-            timestamp = datetime.utcnow().isoformat()
-            notify(f"[{timestamp}] Submitting predictions to {relayer} using {contract}")
-            for feed in FEEDS:
-                # Normally: call prediction API here
-                notify(f"📊 Predicted feed: {feed}")
+    # Save performance/log
+    log_sink.write(cfg.logging.performance_file,
+                   f"{timestamp} - Submitted predictions for {', '.join(feed['name'] for feed in cfg.feeds)}\n")
 
-            # Save performance/log
-            perf_file = instructions["logging"]["performance_file"]
-            with open(perf_file, "a") as f:
-                f.write(f"{timestamp} - Submitted predictions for {', '.join(FEEDS)}\n")
+def report_miss(name, boundary, late_by):
+    notify(f"⏰ Missed {name} epoch deadline by {late_by:.1f}s", key=f"miss:{name}")
 
-            time.sleep(PRED_INTERVAL * 60)
+def guarded_round(boundary):
+    """A failing round is reported and the schedule carries on; config edits apply from the next round."""
+    try:
+        run_round(boundary)
+    except Exception as e:
+        notify(f"❌ Unhandled error: {e}", key="runner-error")
 
-        except Exception as e:
-            notify(f"❌ Unhandled error: {e}")
-            auto_restart(str(e))
+# === MAIN LOOP ===
+def main():
+    cfg = config.get()
+    telegram_notify.configure(cfg.telegram.bot_token, cfg.telegram.chat_id)
+    sched = scheduler.EpochScheduler(on_miss=report_miss)
+    sched.add("agent-runner", cfg.predictoor.interval_seconds, guarded_round,
+              lead_seconds=cfg.predictoor.schedule_lead_seconds)
+    sched.add("config-watch", config.WATCH_INTERVAL, lambda boundary: config.get(), lead_seconds=1)
+    sched.run()
 
 if __name__ == "__main__":
+    metrics.start_from_env()
     notify("🚀 Starting Predictoor Agent...")
     main()
@@ -0,0 +1,204 @@
+# backtest.py
+"""
+Historical replay of the prediction and confidence-adjustment code.
+
+Every epoch of every feed's stored candle history is replayed as the live
+agent would have seen it: the round fires before the epoch opens, so the
+newest closed candle in its window is the one before the previous. Per feed,
+all epochs are evaluated at once: the closes are turned into a sliding
+window matrix for `prediction_engine.predict_proba`, and the adjuster's
+calibrated confidence comes from `calibration.replay`. Feeds are spread over
+worker processes.
+
+Results are written as the same prediction, outcome and adjustment records
+the live agent logs (see performance_tracker), under `--out` instead of the
+live log. Prediction records carry a simulated `stake` (the base stake
+scaled by the adjusted confidence) and outcome records the `payout` (stake
+times `--payout-ratio` on a hit). A summary of accuracy, calibration and
+profit is printed:
+
+    python backtest.py --days 90 --fetch
+    python -c "import performance_tracker as p; e = p.AccuracyEngine('logs/backtest'); e.catch_up(); print(e.summary())"
+
+`--fetch` fills empty candle stores with `--days` of history first; stores
+only grow forward, so history older than a store's first candle is not fetched.
+"""
+import argparse
+import heapq
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+import calibration
+import candle_store
+import config
+import performance_tracker
+import prediction_engine
+import scheduler
+
+OUT_DIR = "logs/backtest"
+WALLET = "backtest"
+WRITE_BATCH = 10000      # records per flush
+
+
+# === REPLAY ===
+def replay_feed(feed, model, lookback, stake, payout_ratio, since_ms=None):
+    """Arrays describing every replayable epoch of one feed, oldest first."""
+    store = candle_store.store_for_feed(feed)
+    times = np.asarray(store.column("open_time"))
+    opens, closes = np.asarray(store.column("open")), np.asarray(store.column("close"))
+    first = lookback + 1  # target candle t uses closes[t - 1 - lookback : t - 1]
+    if since_ms is not None:
+        first = max(first, int(np.searchsorted(times, since_ms)))
+    if len(times) <= first:
+        return None
+    windows = np.lib.stride_tricks.sliding_window_view(closes, lookback)[first - 1 - lookback:len(times) - 1 - lookback]
+    prob_up = prediction_engine.predict_proba(windows, model)
+    up, confidence = prediction_engine.direction_confidence(prob_up)
+    went_up = closes[first:] > opens[first:]
+    hits = up == went_up
+    adjusted = calibration.replay(hits)
+    # The adjuster only knows outcomes of epochs that closed before its round.
+    adjusted = np.concatenate([adjusted[:1], adjusted[:-1]]).round(2)
+    stakes = stake * adjusted
+    return {
+        "feed": feed,
+        "epoch": times[first:] // 1000,
+        "up": up,
+        "confidence": confidence,
+        "went_up": went_up,
+        "adjusted": adjusted,
+        "stake": stakes,
+        "payout": np.where(hits, stakes * payout_ratio, 0.0),
+    }
+
+
+def _replay(job):
+    return replay_feed(*job)
+
+
+# === OUTPUT ===
+def reset_output(root):
+    os.makedirs(root, exist_ok=True)
+    for name in os.listdir(root):
+        if name.startswith("segment-") or name.endswith(".json"):
+            os.remove(os.path.join(root, name))
+
+
+def feed_records(r):
+    """(epoch, [adjustment, prediction, outcome]) per replayed epoch of one feed."""
+    feed, name = r["feed"], r["feed"]["name"]
+    interval = scheduler.feed_interval_seconds(feed)
+    columns = zip(r["epoch"].tolist(), r["up"].tolist(), r["confidence"].tolist(), r["went_up"].tolist(),
+                  r["adjusted"].tolist(), r["stake"].round(6).tolist(), r["payout"].round(6).tolist())
+    for epoch, up, confidence, went_up, adjusted, stake, payout in columns:
+        yield epoch, [
+            {"type": "adjustment", "feed": name, "confidence": adjusted, "ts": epoch - interval},
+            {"type": "prediction", "feed": name, "epoch": epoch, "direction": "up" if up else "down",
+             "confidence": confidence, "wallet": WALLET, "symbol": feed.get("symbol"), "interval": interval,
+             "ts": epoch - interval, "stake": stake},
+            {"type": "outcome", "feed": name, "epoch": epoch, "direction": "up" if went_up else "down",
+             "ts": epoch + interval, "payout": payout},
+        ]
+
+
+def write_records(results, root):
+    """Append every epoch's records in time order across feeds; returns how many."""
+    rows = heapq.merge(*(feed_records(r) for r in results), key=lambda row: row[0])
+    log = performance_tracker.PredictionLog(root)
+    count, pending = 0, []
+    for _, records in rows:
+        pending += records
+        if len(pending) >= WRITE_BATCH:
+            log.extend(pending)
+            count, pending = count + len(pending), []
+    log.extend(pending)
+    log.close()
+    return count + len(pending)
+
+
+# === SUMMARY ===
+def summarize(result):
+    hits = result["up"] == result["went_up"]
+    buckets = {}
+    for bucket in np.unique(np.minimum((result["confidence"] * 10).astype(int), 9)):
+        mask = np.minimum((result["confidence"] * 10).astype(int), 9) == bucket
+        buckets[f"{bucket / 10:.1f}"] = {"resolved": int(mask.sum()), "accuracy": round(float(hits[mask].mean()), 4)}
+    staked, paid = float(result["stake"].sum()), float(result["payout"].sum())
+    return {
+        "epochs": len(hits),
+        "accuracy": round(float(hits.mean()), 4),
+        "brier_model": round(float(np.mean((result["confidence"] - hits) ** 2)), 4),
+        "brier_adjusted": round(float(np.mean((result["adjusted"] - hits) ** 2)), 4),
+        "mean_adjusted_confidence": round(float(result["adjusted"].mean()), 4),
+        "confidence_buckets": buckets,
+        "staked": round(staked, 4),
+        "payout": round(paid, 4),
+        "profit": round(paid - staked, 4),
+    }
+
+
+def fetch_history(feeds, days):
+    start_ms = int((time.time() - days * 86400) * 1000)
+
+    def top_up(feed):
+        store = candle_store.store_for_feed(feed)
+        return store.top_up(start_ms=start_ms)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        return sum(pool.map(top_up, feeds))
+
+
+def main(argv=None):
+    cfg = config.get()
+    parser = argparse.ArgumentParser(description="Replay stored candle history through the prediction code.")
+    parser.add_argument("--days", type=float, default=None, help="only replay the last N days (default: all)")
+    parser.add_argument("--fetch", action="store_true", help="fill empty candle stores with --days of history first")
+    parser.add_argument("--model", default=cfg.predictoor.model, choices=sorted(prediction_engine.MODELS))
+    parser.add_argument("--lookback", type=int, default=cfg.predictoor.lookback)
+    parser.add_argument("--stake", type=float, default=1.0, help="base stake per prediction")
+    parser.add_argument("--payout-ratio", type=float, default=1.8, help="payout per unit staked on a hit")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--out", default=OUT_DIR)
+    parser.add_argument("--json", help="write the summary here")
+    args = parser.parse_args(argv)
+
+    feeds = list(cfg.feeds)
+    if args.fetch:
+        print(f"📥 Fetched {fetch_history(feeds, args.days or 30)} candles")
+    since_ms = int((time.time() - args.days * 86400) * 1000) if args.days else None
+    started = time.perf_counter()
+    jobs = [(feed, args.model, args.lookback, args.stake, args.payout_ratio, since_ms) for feed in feeds]
+    if args.workers > 1 and len(feeds) > 1:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(feeds))) as pool:
+            results = list(pool.map(_replay, jobs))
+    else:
+        results = [_replay(job) for job in jobs]
+    results = [r for r in results if r is not None]
+    replayed = time.perf_counter() - started
+    reset_output(args.out)
+    records = write_records(results, args.out)
+    elapsed = time.perf_counter() - started
+
+    summary = {
+        "feeds": {r["feed"]["name"]: summarize(r) for r in results},
+        "epochs": sum(len(r["epoch"]) for r in results),
+        "replay_seconds": round(replayed, 3),
+        "total_seconds": round(elapsed, 3),
+        "records": records,
+    }
+    summary["profit"] = round(sum(s["profit"] for s in summary["feeds"].values()), 4)
+    print(json.dumps(summary, indent=2))
+    print(f"🧪 Replayed {summary['epochs']} epochs over {len(results)} feed(s) in {replayed:.2f}s "
+          f"({elapsed:.2f}s with {records} records written to {args.out})")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+# benchmark.py
+"""
+Offline benchmark for the agent scripts.
+
+Starts local stand-ins for the relayer, contract mirrors, Telegram, the
+Sapphire explorer, the exchange, the Gelato jobs API and the Predictoor API
+(see standins.py), points every script at them through its config and
+environment, and drives the per-round work at several feed counts:
+
+    python benchmark.py --feeds 4 50 200 1000 --rounds 5 --latency 0.02 --error-rate 0.01
+
+Each script's `main()` only loops its scheduler, so the harness calls the
+round it schedules (`predict_round`, `adjust_round`, `run_round`,
+`claim_rewards`, `verify_jobs`, `track_profit`). One untimed warm-up round
+per feed count fills candle stores and caches. Reported per script and feed
+count: round latency percentiles, deadline misses (feeds not submitted in
+time, plus rounds slower than the budget the scheduler leaves) and HTTP
+requests per round to each stand-in. `--json` writes the full report.
+
+`--imports` instead checks each entry point's cold import time against
+IMPORT_BUDGET_MS and exits non-zero on a regression:
+
+    python benchmark.py --imports
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import config
+import journal
+import scheduler
+import standins
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DRIVERS = ("predictoor", "adjuster", "runner", "claim", "gelato", "profit")
+WALLET = "0x" + "11" * 20
+
+# Cold `import <module>` budget in milliseconds. Network libraries load on
+# first request, so only the numpy-backed predictor pays for a heavy import.
+IMPORT_BUDGET_MS = {
+    "contract_auto": 50,
+    "profit_tracker": 50,
+    "claim_rewards": 50,
+    "gelato_job_register": 50,
+    "accuracy_adjuster": 50,
+    "agent_runner": 50,
+    "performance_tracker": 50,
+    "supervisor": 50,
+    "sharding": 50,
+    "agent_predictoor": 250,
+}
+
+
+# === STAND-INS ===
+def start_standins(latency, error_rate, rate_limit, seed):
+    common = {"latency": latency, "error_rate": error_rate, "rate_limit": rate_limit}
+    services = {
+        "relayer": standins.StandinRelayer(seed=seed, **common),
+        "exchange": standins.StandinExchange(seed=seed, **common),
+        "telegram": standins.StandinTelegram(seed=seed, **common),
+        "explorer": standins.StandinExplorer(seed=seed, **common),
+        "gelato": standins.StandinGelatoJobs(seed=seed, **common),
+        "predictoor_api": standins.StandinPredictoorAPI(seed=seed, **common),
+    }
+    services["mirror"] = standins.StandinMirror(relayer=services["relayer"].url, seed=seed, **common)
+    for service in services.values():
+        service.start()
+    return services
+
+
+def point_env_at(services):
+    """Environment read by the scripts at import time."""
+    os.environ.update({
+        "TELEGRAM_API": services["telegram"].url,
+        "TELEGRAM_BOT_TOKEN": "bench-token",
+        "TELEGRAM_CHAT_ID": "bench-chat",
+        "BINANCE_API": services["exchange"].url,
+        "SAPPHIRE_API": services["explorer"].url,
+        "GELATO_API": f"{services['gelato'].url}/v2/jobs",
+        "GELATO_RELAYER": services["relayer"].url,
+        "GELATO_API_KEY": "bench-key",
+        "PREDICTOOR_API": services["predictoor_api"].url,
+        "WALLET_ADDRESS": WALLET,
+    })
+
+
+# === CONFIG ===
+def make_feeds(count):
+    return [
+        {"name": f"B{i:04d}/USDT", "exchange": "binance", "interval_minutes": 30, "symbol": f"B{i:04d}USDT"}
+        for i in range(count)
+    ]
+
+
+def write_config(feeds, urls):
+    """The repo's agent_instructions.json with feeds and endpoints swapped for the stand-ins' `urls`."""
+    with open(os.path.join(HERE, "agent_instructions.json"), "r") as f:
+        doc = json.load(f)
+    mirror = urls["mirror"]
+    doc["feeds"] = feeds
+    doc["wallet"]["address"] = WALLET
+    doc["predictoor"].update({
+        "contract_urls": [f"{mirror}/predictoor.json"],
+        "fallback_contract": "0x" + "00" * 20,
+    })
+    doc["gelato"].update({
+        "relayer": urls["relayer"],
+        "fallback_relayer": urls["relayer"],
+        "relayer_urls": [f"{mirror}/relayers"],
+    })
+    doc["logging"]["claim_file"] = "logs/claims.log"
+    os.makedirs("logs", exist_ok=True)
+    with open("agent_instructions.json", "w") as f:
+        json.dump(doc, f, indent=2)
+    config.reset()
+
+
+def load(name):
+    """(Re)import a script so it picks up the config just written."""
+    module = sys.modules.get(name)
+    return importlib.reload(module) if module else importlib.import_module(name)
+
+
+# === DRIVERS ===
+# Each driver returns (run one round, latency budget in seconds or None). The
+# round callable may return how many feeds missed their deadline.
+def predictoor_driver(feeds):
+    agent = load("agent_predictoor")
+    settings = config.get().predictoor
+    interval = config.get().feed_intervals()[0]
+
+    def round_():
+        # Every timed round replays the same epoch, so forget what the last one sent.
+        journal.default_journal().compact(before=2 ** 62)
+        boundary = scheduler.next_boundary(interval)
+        if settings.pipelined:
+            agent.prepare_interval(interval, boundary)
+        summary = agent.predict_interval(interval, boundary)
+        return sum(n for status, n in summary["counts"].items() if status != "submitted")
+
+    return round_, settings.schedule_lead_seconds - settings.submit_margin_seconds
+
+
+def adjuster_driver(feeds):
+    adjuster = load("accuracy_adjuster")
+
+    def round_():
+        journal.default_journal().compact(before=2 ** 62)  # as for predictoor: same epoch every round
+        adjuster.adjust_round()
+
+    return round_, config.get().predictoor.schedule_lead_seconds
+
+
+def runner_driver(feeds):
+    runner = load("agent_runner")
+    return runner.run_round, None
+
+
+_claim_rounds = itertools.count(1)  # shared by every feed count, so no slot is seeded (and claimed) twice
+
+
+def claim_driver(feeds):
+    claim = load("claim_rewards")
+    tracker = load("performance_tracker")
+    interval = config.get().feed_intervals()[0]
+    oldest = scheduler.next_boundary(interval) - 10 ** 4 * interval
+
+    def round_():
+        # One resolved, not yet priced slot per feed, so each round prices and claims like a live check.
+        epoch = oldest + next(_claim_rounds) * interval
+        tracker.default_log().extend([
+            {"type": "prediction", "feed": feed["name"], "epoch": epoch, "direction": "up", "confidence": 0.7,
+             "wallet": WALLET, "interval": interval, "ts": time.time()}
+            for feed in feeds
+        ])
+        claim.claim_rewards()
+
+    return round_, None
+
+
+def gelato_driver(feeds):
+    gelato = load("gelato_job_register")
+    return gelato.verify_jobs, None
+
+
+def profit_driver(feeds):
+    profit = load("profit_tracker")
+    return profit.track_profit, None
+
+
+DRIVER_FACTORIES = {
+    "predictoor": predictoor_driver,
+    "adjuster": adjuster_driver,
+    "runner": runner_driver,
+    "claim": claim_driver,
+    "gelato": gelato_driver,
+    "profit": profit_driver,
+}
+
+
+# === MEASUREMENT ===
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))]
+
+
+def request_counts(services):
+    return {name: len(service.requests) for name, service in services.items()}
+
+
+def bench(driver, feeds, services, rounds, quiet=True):
+    import telegram_notify
+
+    sink = io.StringIO() if quiet else sys.stdout
+    with contextlib.redirect_stdout(sink):
+        round_, budget = DRIVER_FACTORIES[driver](feeds)
+        round_()  # warm-up: candle backfill, discovery cache, connection pools
+        telegram_notify.flush(30)
+    before = request_counts(services)
+    latencies, misses, late = [], 0, 0
+    for _ in range(rounds):
+        with contextlib.redirect_stdout(sink):
+            started = time.perf_counter()
+            misses += round_() or 0
+            elapsed = time.perf_counter() - started
+            telegram_notify.flush(30)
+        latencies.append(elapsed)
+        if budget is not None and elapsed > budget:
+            late += 1
+    after = request_counts(services)
+    per_round = {name: round((after[name] - before[name]) / rounds, 1) for name in after if after[name] > before[name]}
+    return {
+        "driver": driver,
+        "feeds": len(feeds),
+        "rounds": rounds,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies),
+        "deadline_misses": misses,
+        "late_rounds": late,
+        "requests_per_round": per_round,
+    }
+
+
+def import_ms(module, runs=5):
+    """Median cold import time of `module` in fresh interpreters, from -X importtime."""
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=HERE))
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        line = [ln for ln in result.stderr.splitlines() if ln.rstrip().endswith(f"| {module}")][-1]
+        samples.append(int(line.split("|")[1]) / 1000)
+    return statistics.median(samples)
+
+
+def check_imports(budgets=IMPORT_BUDGET_MS):
+    """Print each module's import time against its budget; True when all are within budget."""
+    write_config(make_feeds(4), dict.fromkeys(("mirror", "relayer"), "http://127.0.0.1:9"))
+    ok = True
+    print(f"{'module':<22}{'ms':>8}{'budget':>8}")
+    for module, budget in budgets.items():
+        try:
+            elapsed = import_ms(module)
+        except RuntimeError as e:
+            print(f"{module:<22}{'error':>8}{budget:>8}  ❌ {e}")
+            ok = False
+            continue
+        within = elapsed <= budget
+        ok = ok and within
+        print(f"{module:<22}{elapsed:>8.1f}{budget:>8}  {'✅' if within else '❌ over budget'}")
+    return ok
+
+
+def format_row(row):
+    requests = sum(row["requests_per_round"].values())
+    return (f"{row['driver']:<11}{row['feeds']:>6}{row['p50'] * 1000:>10.1f}{row['p95'] * 1000:>10.1f}"
+            f"{row['p99'] * 1000:>10.1f}{row['deadline_misses']:>8}{row['late_rounds']:>6}{requests:>10.1f}")
+
+
+HEADER = f"{'script':<11}{'feeds':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'missed':>8}{'late':>6}{'req/rnd':>10}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark agent rounds against local stand-ins.")
+    parser.add_argument("--feeds", type=int, nargs="+", default=[4, 50, 200, 1000])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--drivers", nargs="+", choices=DRIVERS, default=list(DRIVERS))
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every stand-in response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--rate-limit", type=float, default=None, help="requests/second per stand-in before 429s")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", help="where configs, candles and logs go (default: a temp dir)")
+    parser.add_argument("--json", help="write the full report here")
+    parser.add_argument("--verbose", action="store_true", help="show the scripts' own output")
+    parser.add_argument("--imports", action="store_true", help="check import-time budgets and exit")
+    args = parser.parse_args(argv)
+
+    report_path = os.path.abspath(args.json) if args.json else None
+    workdir = args.workdir or tempfile.mkdtemp(prefix="predictoor-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    sys.path.insert(0, HERE)
+    os.chdir(workdir)
+    if args.imports:
+        sys.exit(0 if check_imports() else 1)
+
+    services = start_standins(args.latency, args.error_rate, args.rate_limit, args.seed)
+    point_env_at(services)
+    print(f"🧪 Benchmarking in {workdir} | latency={args.latency}s error_rate={args.error_rate} "
+          f"rate_limit={args.rate_limit or 'off'}")
+    print(HEADER)
+    rows = []
+    try:
+        for count in args.feeds:
+            feeds = make_feeds(count)
+            write_config(feeds, {name: service.url for name, service in services.items()})
+            for driver in args.drivers:
+                row = bench(driver, feeds, services, args.rounds, quiet=not args.verbose)
+                rows.append(row)
+                print(format_row(row), flush=True)
+    finally:
+        import telegram_notify
+        telegram_notify.flush()
+        for service in services.values():
+            service.stop()
+
+    if report_path:
+        with open(report_path, "w") as f:
+            json.dump({
+                "settings": {k: v for k, v in vars(args).items() if k not in ("json", "verbose")},
+                "results": rows,
+            }, f, indent=2)
+        print(f"📝 Report written to {report_path}")
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# calibration.py
+"""
+Per-feed confidence calibration from realized outcomes.
+
+Each feed's hit rate is a Beta-Bernoulli posterior: a Beta(PRIOR) prior
+plus exponentially forgotten hit and miss counts, so confidence tracks
+recent accuracy and a feed without history sits at the prior mean. Counts
+for every feed live in two NumPy arrays; a fitting pass folds all newly
+resolved predictions in with a couple of `bincount`s and reads every
+posterior mean at once, so a pass over thousands of feeds takes
+milliseconds.
+
+`CalibrationEngine` extends the streaming AccuracyEngine: it reads only the
+prediction-log records written since its checkpoint and persists the
+calibration counts in that same checkpoint.
+"""
+import numpy as np
+
+import performance_tracker
+
+PRIOR = (7.0, 3.0)     # Beta(alpha, beta): a new feed starts at 0.7, worth ten outcomes
+DECAY = 0.98           # weight kept per newer outcome; ~50 outcomes of memory
+FLOOR, CEILING = 0.5, 0.95
+
+
+class Calibrator:
+    """Beta-Bernoulli hit-rate posteriors for a growing set of feeds."""
+
+    def __init__(self, prior=PRIOR, decay=DECAY):
+        self.prior = prior
+        self.decay = decay
+        self.names = []
+        self._index = {}
+        self.hits = np.zeros(0)
+        self.misses = np.zeros(0)
+
+    def _indices(self, feeds):
+        for name in feeds:
+            if name not in self._index:
+                self._index[name] = len(self.names)
+                self.names.append(name)
+        grow = len(self.names) - len(self.hits)
+        if grow:
+            self.hits = np.concatenate([self.hits, np.zeros(grow)])
+            self.misses = np.concatenate([self.misses, np.zeros(grow)])
+        return np.fromiter((self._index[name] for name in feeds), dtype=np.intp, count=len(feeds))
+
+    def update(self, feeds, hits):
+        """
+        Fold resolved outcomes in. Older counts decay by DECAY per new outcome
+        of the same feed; outcomes within one pass are weighted equally.
+        """
+        if not len(feeds):
+            return
+        index = self._indices(feeds)
+        n = np.bincount(index, minlength=len(self.names))
+        h = np.bincount(index, weights=np.asarray(hits, dtype=np.float64), minlength=len(self.names))
+        keep = self.decay ** n
+        self.hits = self.hits * keep + h
+        self.misses = self.misses * keep + (n - h)
+
+    def confidences(self, feeds):
+        """Posterior mean hit rate per feed, clipped to [FLOOR, CEILING]."""
+        index = self._indices(feeds)
+        alpha = self.prior[0] + self.hits[index]
+        beta = self.prior[1] + self.misses[index]
+        return np.clip(alpha / (alpha + beta), FLOOR, CEILING)
+
+    def evidence(self, feeds):
+        """Effective number of outcomes behind each feed's estimate."""
+        index = self._indices(feeds)
+        return self.hits[index] + self.misses[index]
+
+    def to_state(self):
+        return {"names": self.names, "hits": self.hits.tolist(), "misses": self.misses.tolist()}
+
+    def load_state(self, state):
+        self.names = list(state["names"])
+        self._index = {name: i for i, name in enumerate(self.names)}
+        self.hits = np.asarray(state["hits"], dtype=np.float64)
+        self.misses = np.asarray(state["misses"], dtype=np.float64)
+
+
+def replay(hits, prior=PRIOR, decay=DECAY, block=256):
+    """
+    Confidence a Calibrator updated one outcome at a time would report just
+    before each of `hits` (one feed, in time order). The decayed counts are a
+    linear recurrence, evaluated with cumulative sums in blocks short enough
+    for DECAY ** -block to stay finite.
+    """
+    hits = np.asarray(hits, dtype=np.float64)
+    before = np.empty((2, len(hits)))
+    carry = np.zeros(2)
+    for start in range(0, len(hits), block):
+        x = hits[start:start + block]
+        powers = decay ** np.arange(len(x))
+        counts = np.stack([x, 1.0 - x])
+        after = powers * (decay * carry[:, None] + np.cumsum(counts / powers, axis=1))
+        before[:, start] = carry
+        before[:, start + 1:start + len(x)] = after[:, :-1]
+        carry = after[:, -1]
+    alpha, beta = prior[0] + before[0], prior[1] + before[1]
+    return np.clip(alpha / (alpha + beta), FLOOR, CEILING)
+
+
+class CalibrationEngine(performance_tracker.AccuracyEngine):
+    """AccuracyEngine that also feeds resolved predictions to a Calibrator."""
+
+    checkpoint_file = "calibration.json"
+
+    def __init__(self, root=performance_tracker.LOG_DIR, window=performance_tracker.WINDOW):
+        super().__init__(root, window)
+        self.calibrator = Calibrator()
+        self._feeds, self._hits = [], []
+
+    def on_result(self, feed, hit, confidence):
+        super().on_result(feed, hit, confidence)
+        self._feeds.append(feed)
+        self._hits.append(hit)
+
+    def fit(self):
+        """Fold results collected since the last fit; returns how many."""
+        feeds, hits, self._feeds, self._hits = self._feeds, self._hits, [], []
+        self.calibrator.update(feeds, hits)
+        return len(feeds)
+
+    def to_state(self):
+        return dict(super().to_state(), calibration=self.calibrator.to_state())
+
+    def load_state(self, state):
+        super().load_state(state)
+        if "calibration" in state:
+            self.calibrator.load_state(state["calibration"])
+
+
+def refresh(engine):
+    """Resolve closed epochs, fit the new outcomes and checkpoint; returns how many were fitted."""
+    engine.catch_up()
+    if performance_tracker.resolve_outcomes(engine):
+        engine.catch_up()
+    fitted = engine.fit()
+    engine.save_checkpoint()
+    return fitted
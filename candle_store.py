@@ -0,0 +1,191 @@
+# candle_store.py
+"""
+Local OHLCV candle store, one per symbol and interval.
+
+Each store is a directory of append-only column files (`open_time.i8`,
+`close.f8`, ...) that are memory-mapped read-only, so `tail(n)` hands out
+zero-copy NumPy views of the last N candles without reading the rest of
+the history. `top_up()` only fetches candles newer than the last one stored.
+Another process may append to the same files; `refresh()` maps whatever
+complete rows it added.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+import http_client
+import scheduler
+
+DATA_DIR = "data/candles"
+BINANCE_API = os.getenv("BINANCE_API", "https://api.binance.com")
+PAGE_LIMIT = 1000  # Binance klines maximum per request
+
+COLUMNS = (
+    ("open_time", np.dtype("<i8")),   # ms since epoch, like Binance
+    ("open", np.dtype("<f8")),
+    ("high", np.dtype("<f8")),
+    ("low", np.dtype("<f8")),
+    ("close", np.dtype("<f8")),
+    ("volume", np.dtype("<f8")),
+)
+
+
+def binance_interval(feed):
+    """Binance interval string for a feed ('5m', '1h', ...)."""
+    seconds = scheduler.feed_interval_seconds(feed)
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    raise ValueError(f"Unsupported candle interval: {seconds}s")
+
+
+def fetch_binance_klines(symbol, interval, start_ms, limit=PAGE_LIMIT):
+    """One page of klines starting at `start_ms` as (open_time, o, h, l, c, v, close_time) rows."""
+    r = http_client.get(
+        f"{BINANCE_API}/api/v3/klines",
+        params={"symbol": symbol, "interval": interval, "startTime": int(start_ms), "limit": limit},
+        timeout=10,
+    )
+    return [(int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]), int(k[6]))
+            for k in r.json()]
+
+
+class CandleStore:
+    def __init__(self, symbol, interval, root=DATA_DIR):
+        self.symbol = symbol
+        self.interval = interval
+        self.interval_ms = scheduler.parse_interval(interval) * 1000
+        self.path = os.path.join(root, f"{symbol}_{interval}")
+        self._lock = threading.Lock()
+        self._views = {}
+        os.makedirs(self.path, exist_ok=True)
+        self._repair()
+        self._remap()
+
+    def _file(self, name):
+        return os.path.join(self.path, f"{name}.{'i8' if name == 'open_time' else 'f8'}")
+
+    def _repair(self):
+        """Trim columns to a common length after a crash mid-append."""
+        lengths = []
+        for name, dtype in COLUMNS:
+            path = self._file(name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            lengths.append(size // dtype.itemsize)
+        rows = min(lengths)
+        for name, dtype in COLUMNS:
+            with open(self._file(name), "ab") as f:
+                f.truncate(rows * dtype.itemsize)
+
+    def _rows_on_disk(self):
+        """Rows present in every column file; a concurrent append may be half written."""
+        return min(os.path.getsize(self._file(name)) // dtype.itemsize for name, dtype in COLUMNS)
+
+    def _remap(self, rows=None):
+        rows = self._rows_on_disk() if rows is None else rows
+        views = {}
+        for name, dtype in COLUMNS:
+            if rows:
+                views[name] = np.memmap(self._file(name), dtype=dtype, mode="r", shape=(rows,))
+            else:
+                views[name] = np.empty(0, dtype=dtype)
+        self._views = views
+
+    def refresh(self):
+        """Map candles appended by other processes since the last (re)map; returns how many."""
+        rows = self._rows_on_disk()
+        added = rows - len(self)
+        if added > 0:
+            with self._lock:
+                self._remap(rows)
+        return max(added, 0)
+
+    def __len__(self):
+        return len(self._views["open_time"])
+
+    def last_open_time(self):
+        times = self._views["open_time"]
+        return int(times[-1]) if len(times) else None
+
+    def column(self, name):
+        """Zero-copy view of a whole column."""
+        return self._views[name]
+
+    def tail(self, n):
+        """Zero-copy views of the last `n` candles, keyed by column name."""
+        views = self._views
+        return {name: views[name][-n:] for name, _ in COLUMNS}
+
+    def append(self, rows):
+        """Append candles newer than the last stored one; returns how many were written."""
+        self.refresh()
+        with self._lock:
+            last = self.last_open_time()
+            rows = [row for row in rows if last is None or row[0] > last]
+            if not rows:
+                return 0
+            data = np.array([row[:len(COLUMNS)] for row in rows], dtype=np.float64)
+            for i, (name, dtype) in enumerate(COLUMNS):
+                with open(self._file(name), "ab") as f:
+                    f.write(data[:, i].astype(dtype).tobytes())
+            self._remap()
+            return len(rows)
+
+    def top_up(self, fetch=fetch_binance_klines, start_ms=None, now=None):
+        """
+        Fetch only the candles missing since the last stored one (or `start_ms`
+        on an empty store). Candles still open at `now` are left for next time.
+        """
+        now_ms = int((time.time() if now is None else now) * 1000)
+        self.refresh()
+        last = self.last_open_time()
+        cursor = last + self.interval_ms if last is not None else (start_ms or now_ms - PAGE_LIMIT * self.interval_ms)
+        added = 0
+        while cursor + self.interval_ms <= now_ms:
+            page = fetch(self.symbol, self.interval, cursor, PAGE_LIMIT)
+            closed = [row for row in page if row[0] + self.interval_ms <= now_ms]
+            if not closed:
+                break
+            added += self.append(closed)
+            cursor = closed[-1][0] + self.interval_ms
+            if len(page) < PAGE_LIMIT:
+                break
+        return added
+
+
+# === REGISTRY ===
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(symbol, interval, root=DATA_DIR):
+    """One shared CandleStore per (symbol, interval) per process."""
+    key = (root, symbol, interval)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = CandleStore(symbol, interval, root)
+        return _stores[key]
+
+
+def store_for_feed(feed, root=DATA_DIR):
+    return get_store(feed["symbol"], binance_interval(feed), root)
+
+
+def last_candles(feed, n, fetch=fetch_binance_klines):
+    """Top up the feed's store and return views of its last `n` candles."""
+    store = store_for_feed(feed)
+    store.top_up(fetch)
+    return store.tail(n)
+
+
+if __name__ == "__main__":
+    import yaml
+
+    with open("feeds.yaml", "r") as f:
+        yaml_feeds = yaml.safe_load(f)["feeds"]
+    for feed in yaml_feeds:
+        store = store_for_feed(feed)
+        added = store.top_up()
+        print(f"✅ {feed['symbol']} {store.interval}: +{added} candles ({len(store)} stored)")
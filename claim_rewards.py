@@ -1,72 +1,194 @@
-import os
 import json
+import os
 import time
-import requests
-from datetime import datetime
-from telegram import Bot
+import config
+import http_client
+import log_sink
+import metrics
+import performance_tracker
+import scheduler
+import telegram_notify
 
-# === Load config ===
-with open("agent_instructions.json", "r") as f:
-    cfg = json.load(f)
+# === CLAIM PLANNER ===
+# Instead of POSTing /claim on a timer, every submission we log becomes a
+# pending slot (wallet, feed, epoch). Once a slot's epoch has resolved its
+# payout is priced with one /payouts call per wallet; losing slots drop out.
+# A wallet's claimable slots go out together in one /claim when they are worth
+# more than a claim costs and either reach `claims.threshold`, include a payout
+# of at least `claims.early_payout`, or have waited claim_interval_seconds.
+PAYOUT_BATCH = 500
+CHECK_LEAD = 60
 
-# Wallet & Predictoor
-WALLET_ADDRESS = os.getenv(cfg["wallet"]["address_env"])
-WALLET_PRIVATE_KEY = os.getenv(cfg["wallet"]["private_key_env"])
-PREDICTOOR_API = os.getenv(cfg["predictor"]["api_endpoint_env"])
+# === Functions ===
+def notify(msg, key=None):
+    telegram_notify.send(msg, key=key)
 
-# Telegram
-bot = Bot(token=os.getenv(cfg["telegram"]["bot_token_env"]))
-CHAT_ID = os.getenv(cfg["telegram"]["chat_id_env"])
+class PayoutIndex:
+    """Our own submissions that may still pay out, built incrementally from the prediction log."""
 
-# Logging
-CLAIM_FILE = cfg["logging"]["claim_file"]
-ERROR_FILE = cfg["logging"]["error_file"]
+    def __init__(self, path, root=performance_tracker.LOG_DIR):
+        self.path = path
+        self.root = root
+        self.position = (1, 0)
+        self.slots = {}  # "wallet|feed|epoch" -> {wallet, feed, epoch, due, ts, amount}
+        self.deferred = set()  # wallets already told their claimable value is below threshold
 
-# === Functions ===
-def notify(msg):
-    print(msg)
-    try:
-        bot.send_message(chat_id=CHAT_ID, text=msg)
-    except Exception as e:
-        print(f"Telegram notify failed: {e}")
+    @classmethod
+    def load(cls, path, root=performance_tracker.LOG_DIR):
+        index = cls(path, root)
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                state = json.load(f)
+            index.position, index.slots = tuple(state["position"]), state["slots"]
+            index.deferred = set(state.get("deferred", []))
+        return index
 
-def claim_rewards():
-    """
-    Claims rewards from Predictoor mainnet for your wallet
-    """
-    payload = {"wallet": WALLET_ADDRESS}
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.tmp", "w") as f:
+            json.dump({"position": list(self.position), "slots": self.slots, "deferred": sorted(self.deferred)}, f)
+        os.replace(f"{self.path}.tmp", self.path)
 
-    try:
-        headers = {"Authorization": f"Bearer {PREDICTOOR_API}"}
-        resp = requests.post(f"{PREDICTOOR_API}/claim", json=payload, headers=headers, timeout=10)
-        resp.raise_for_status()
+    def catch_up(self, default_wallet, now=None):
+        """Index prediction records written since the last call; unpriced slots past PENDING_TTL are dropped."""
+        for record, position in performance_tracker.iter_records(self.root, self.position):
+            self.position = position
+            if record.get("type") != "prediction":
+                continue
+            wallet = record.get("wallet") or default_wallet
+            key = f"{wallet}|{record['feed']}|{record['epoch']}"
+            self.slots.setdefault(key, {
+                "wallet": wallet, "feed": record["feed"], "epoch": record["epoch"],
+                "due": record["epoch"] + (record.get("interval") or 0), "ts": record.get("ts", 0), "amount": None,
+            })
+        cutoff = (time.time() if now is None else now) - performance_tracker.PENDING_TTL
+        self.slots = {k: s for k, s in self.slots.items() if s["amount"] is not None or s["ts"] >= cutoff}
+
+    def unpriced(self, now):
+        """Slots whose epoch has resolved but whose payout we don't know yet, by wallet."""
+        groups = {}
+        for slot in self.slots.values():
+            if slot["amount"] is None and slot["due"] <= now:
+                groups.setdefault(slot["wallet"], []).append(slot)
+        return groups
 
-        result = resp.json()
-        with open(CLAIM_FILE, "a") as f:
-            f.write(f"{datetime.utcnow().isoformat()} - Claimed rewards: {result}\n")
+    def claimable(self):
+        groups = {}
+        for slot in self.slots.values():
+            if slot["amount"]:
+                groups.setdefault(slot["wallet"], []).append(slot)
+        return groups
 
-        notify(f"✅ Claimed rewards successfully: {result}")
+    def price(self, wallet, payouts):
+        """Apply /payouts results: losses leave the index, unsettled slots (amount null) stay."""
+        for payout in payouts:
+            key = f"{wallet}|{payout['feed']}|{payout['epoch']}"
+            if key not in self.slots or payout.get("amount") is None:
+                continue
+            if payout["amount"] > 0:
+                self.slots[key]["amount"] = payout["amount"]
+            else:
+                del self.slots[key]
 
+    def remove(self, slots):
+        for slot in slots:
+            self.slots.pop(f"{slot['wallet']}|{slot['feed']}|{slot['epoch']}", None)
+
+def plan_claim(slots, now=None):
+    """Reason to claim `slots` now, or None to keep accumulating."""
+    cfg = config.get()
+    settings, now = cfg.claims, time.time() if now is None else now
+    total = sum(slot["amount"] for slot in slots)
+    if total <= settings.cost:
+        return None
+    if total >= settings.threshold:
+        return "threshold"
+    if max(slot["amount"] for slot in slots) >= settings.early_payout:
+        return "large payout"
+    if now - min(slot["due"] for slot in slots) >= cfg.predictoor.claim_interval_seconds:
+        return "age"
+    return None
+
+def api_post(path, payload):
+    api = config.get().predictoor.api_endpoint
+    headers = {"Authorization": f"Bearer {api}"}
+    return http_client.post(f"{api}{path}", json=payload, headers=headers, timeout=10, lane="housekeeping").json()
+
+def price_slots(index, now):
+    """One /payouts call per wallet (per PAYOUT_BATCH slots) for every resolved, unpriced slot."""
+    priced = 0
+    for wallet, slots in index.unpriced(now).items():
+        for start in range(0, len(slots), PAYOUT_BATCH):
+            chunk = [{"feed": s["feed"], "epoch": s["epoch"]} for s in slots[start:start + PAYOUT_BATCH]]
+            with metrics.stage("payout_lookup"):
+                index.price(wallet, api_post("/payouts", {"wallet": wallet, "slots": chunk}).get("payouts", []))
+            priced += len(chunk)
+    return priced
+
+def claim_wallet(index, wallet, slots, reason):
+    cfg = config.get()
+    expected = sum(slot["amount"] for slot in slots)
+    payload = {"wallet": wallet, "slots": [{"feed": s["feed"], "epoch": s["epoch"]} for s in slots]}
+    with metrics.stage("claim"):
+        result = api_post("/claim", payload)
+    index.remove(slots)
+    metrics.inc("claims_total", reason=reason)
+    metrics.inc("claimed_value_total", float(result.get("claimed", 0) or 0))
+    log_sink.log(cfg.logging.claim_file, f"Claimed rewards ({reason}, {len(slots)} slots, expected {expected:.4f}): {result}")
+    notify(f"✅ Claimed {result.get('claimed')} for {len(slots)} epoch(s) ({reason}) | {wallet[:10]}…")
+
+def claim_rewards(boundary=None):
+    """
+    Claims rewards from Predictoor mainnet for every wallet whose pending
+    payouts are worth a claim now
+    """
+    cfg = config.get()
+    now = time.time()
+    try:
+        index = PayoutIndex.load(cfg.claims.index_file)
+        index.catch_up(cfg.wallet.address, now)
+        priced = price_slots(index, now)
+        index.save()
+        for wallet, slots in index.claimable().items():
+            reason = plan_claim(slots, now)
+            value = sum(slot["amount"] for slot in slots)
+            metrics.set_gauge("claimable_value", value, wallet=wallet)
+            if reason is None:
+                metrics.inc("claims_deferred_total")
+                # Checks run every epoch: only report a wallet starting to wait, not every check.
+                if wallet not in index.deferred:
+                    index.deferred.add(wallet)
+                    index.save()
+                    notify(f"⏳ {value:.2f} claimable over {len(slots)} epoch(s), below threshold "
+                           f"{cfg.claims.threshold} | {wallet[:10]}…")
+                continue
+            claim_wallet(index, wallet, slots, reason)
+            index.deferred.discard(wallet)
+            index.save()
+        if priced:
+            metrics.inc("payouts_priced_total", priced)
+            print(f"🔎 Priced {priced} resolved epoch(s)")
     except Exception as e:
-        with open(ERROR_FILE, "a") as f:
-            f.write(f"{datetime.utcnow().isoformat()} - ERROR claiming rewards: {e}\n")
+        log_sink.log(cfg.logging.error_file, f"ERROR claiming rewards: {e}")
         notify(f"❌ Error claiming rewards: {e}")
 
+def report_miss(name, boundary, late_by):
+    notify(f"⏰ Missed {name} check by {late_by:.1f}s", key=f"miss:{name}")
+
 # === Main loop ===
 def main():
-    while True:
-        try:
-            notify("🚀 Starting reward claim cycle")
-            claim_rewards()
-            # Claim every 4 hours by default
-            interval = cfg["predictor"].get("claim_interval_seconds", 14400)
-            notify(f"Sleeping for {interval} seconds until next claim...")
-            time.sleep(interval)
-
-        except Exception as e:
-            notify(f"❌ Unhandled error in claim loop: {e}")
-            time.sleep(30)  # retry after small delay
+    cfg = config.get()
+    telegram_notify.configure(cfg.telegram.bot_token, cfg.telegram.chat_id)
+    # Checks are cheap (a local index plus one /payouts call when epochs resolved),
+    # so run every epoch and let the planner decide when a claim is worth it.
+    interval = min(cfg.feed_intervals())
+    notify(f"🚀 Reward claim planner checking every {interval} seconds")
+    sched = scheduler.EpochScheduler(on_miss=report_miss)
+    sched.add("claim-rewards", interval, claim_rewards, lead_seconds=CHECK_LEAD)
+    sched.add("config-watch", config.WATCH_INTERVAL, lambda boundary: config.get(), lead_seconds=1)
+    sched.run()
 
 # === Entrypoint ===
 if __name__ == "__main__":
+    metrics.start_from_env()
     main()
@@ -0,0 +1,386 @@
+# config.py
+"""
+Typed agent configuration.
+
+`agent_instructions.json`, `feeds.yaml` and the environment are merged into
+one validated, immutable `AgentConfig`. `get()` returns the cached object
+and reloads it when either file's mtime changes (checked at most every
+CHECK_INTERVAL seconds), so feeds and settings can change under a running
+process without discarding warm connections and caches. A reload that fails
+validation keeps the last good config.
+
+Precedence, lowest to highest: built-in defaults, agent_instructions.json,
+feeds.yaml (per feed, matched by name), environment variables.
+"""
+import json
+import os
+import threading
+import time
+
+import metrics
+import scheduler
+
+AGENT_JSON = "agent_instructions.json"
+FEEDS_YAML = "feeds.yaml"
+CHECK_INTERVAL = 1.0
+WATCH_INTERVAL = 60      # long-running loops call get() at least this often to pick up edits
+
+
+class ConfigError(ValueError):
+    """Raised with every validation problem found, one per line."""
+
+
+# === TYPES ===
+class _Record:
+    """
+    Immutable record: fields are the class annotations, defaults the class
+    attributes. Names in `_hidden` are left out of repr and names in
+    `_uncompared` out of equality. Used instead of frozen dataclasses, whose
+    import and class construction alone blew the one-shot scripts' import
+    budget.
+    """
+    _hidden = ()
+    _uncompared = ()
+
+    def __init_subclass__(cls):
+        cls._fields = tuple(cls.__annotations__)
+
+    def __init__(self, **values):
+        cls = type(self)
+        unknown = sorted(set(values) - set(cls._fields))
+        missing = [name for name in cls._fields if name not in values and not hasattr(cls, name)]
+        if unknown or missing:
+            raise TypeError(f"{cls.__name__}: unexpected {unknown}, missing {missing}")
+        for name in cls._fields:
+            object.__setattr__(self, name, values[name] if name in values else getattr(cls, name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    __delattr__ = __setattr__
+
+    def _key(self):
+        return tuple(getattr(self, name) for name in self._fields if name not in self._uncompared)
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._key() == self._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        shown = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields if name not in self._hidden)
+        return f"{type(self).__name__}({shown})"
+
+
+class WalletConfig(_Record):
+    _hidden = ("private_key",)
+    address: str | None
+    private_key: str | None = None
+    feeds: tuple | None = None                # feed names this wallet stakes on; None: all
+
+
+class TelegramConfig(_Record):
+    _hidden = ("bot_token",)
+    bot_token: str | None = None
+    chat_id: str | None = None
+
+
+class PredictoorConfig(_Record):
+    contract_address: str = "auto-update"
+    api_endpoint: str | None = None
+    interval_seconds: int = 1800
+    confidence_threshold: float = 0.7
+    claim_interval_seconds: int = 14400
+    max_concurrency: int = 8
+    submit_margin_seconds: float = 10
+    schedule_lead_seconds: float = 60
+    model: str = "momentum"
+    lookback: int = 64
+    pipelined: bool = True
+    prepare_lead_seconds: float = 150
+    refresh_budget_seconds: float = 3
+    batch_submit: bool = True
+    contract_urls: tuple | None = None        # None: discovery_cache defaults
+    fallback_contract: str | None = None
+
+
+class GelatoConfig(_Record):
+    _hidden = ("api_key",)
+    relayer: str = "auto-update"
+    api_key: str | None = None
+    relayer_urls: tuple | None = None         # None: discovery_cache defaults
+    fallback_relayer: str | None = None
+
+
+class LoggingConfig(_Record):
+    performance_file: str = "logs/performance.log"
+    error_file: str = "logs/errors.log"
+    claim_file: str = "logs/claims.log"
+
+
+class SupervisorConfig(_Record):
+    profit_interval: str = "1d"
+    contract_refresh_interval: str = "6h"
+    gelato_interval: str = "6h"
+    restart_backoff_seconds: float = 30
+    restart_backoff_max_seconds: float = 900
+
+
+class ClaimConfig(_Record):
+    threshold: float = 10.0                   # claim once pending payouts reach this (OCEAN)
+    early_payout: float = 25.0                # ...or as soon as one payout is this large
+    cost: float = 0.5                         # estimated cost of one claim; never claim less
+    index_file: str = "logs/claim_index.json"
+
+
+class ShardingConfig(_Record):
+    workers: int = 0                          # worker processes; 0: one per CPU
+    virtual_nodes: int = 64                   # points per worker on the hash ring
+
+
+class AgentConfig(_Record):
+    _hidden = _uncompared = ("raw",)
+    wallet: WalletConfig
+    telegram: TelegramConfig
+    predictoor: PredictoorConfig
+    gelato: GelatoConfig
+    logging: LoggingConfig
+    supervisor: SupervisorConfig
+    claims: ClaimConfig
+    sharding: ShardingConfig
+    feeds: tuple                              # feed dicts, see normalize_feed
+    wallets: tuple                            # `wallets` entries, or just `wallet` when absent
+    raw: dict
+
+    def feed_intervals(self):
+        """Distinct feed epoch lengths in seconds."""
+        return sorted({scheduler.feed_interval_seconds(f) for f in self.feeds})
+
+    def feeds_for(self, interval):
+        return [f for f in self.feeds if scheduler.feed_interval_seconds(f) == interval]
+
+
+# === MERGING ===
+def normalize_feed(feed):
+    """Copy of `feed` with a symbol and an `interval` string, which every consumer understands."""
+    feed = dict(feed)
+    feed.setdefault("symbol", str(feed.get("name", "")).replace("/", ""))
+    if not feed.get("interval") and feed.get("interval_minutes"):
+        feed["interval"] = f"{int(feed['interval_minutes'])}m"
+    feed.setdefault("interval", "30m")
+    feed.setdefault("exchange", feed.get("source", "binance"))
+    return feed
+
+
+def merge_feeds(json_feeds, yaml_feeds):
+    """Union by name; feeds.yaml fields override agent_instructions.json ones."""
+    merged = {}
+    for feed in list(json_feeds or []) + list(yaml_feeds or []):
+        name = feed.get("name")
+        merged[name] = {**merged.get(name, {}), **feed}
+    return tuple(normalize_feed(f) for f in merged.values())
+
+
+def _env(environ, name, default=None):
+    return environ.get(name) if name and environ.get(name) else default
+
+
+def _read_yaml(path):
+    if not os.path.exists(path):
+        return {}
+    import yaml
+    with open(path, "r") as f:
+        return yaml.safe_load(f) or {}
+
+
+def _pick(cls, *sources, **overrides):
+    """Build record `cls` from the known keys of each source dict, later sources winning."""
+    names = cls._fields
+    values = {}
+    for source in sources:
+        values.update({k: v for k, v in (source or {}).items() if k in names})
+    values.update({k: v for k, v in overrides.items() if v is not None})
+    return cls(**values)
+
+
+def _wallet(entry, environ):
+    feeds = entry.get("feeds")
+    return WalletConfig(
+        address=_env(environ, entry.get("address_env"), entry.get("address")),
+        private_key=_env(environ, entry.get("private_key_env")),
+        feeds=tuple(feeds) if feeds and feeds != "*" else None,
+    )
+
+
+def build(raw, yaml_doc=None, environ=None):
+    """AgentConfig from parsed agent_instructions.json, feeds.yaml and an environment mapping."""
+    environ = os.environ if environ is None else environ
+    yaml_doc = yaml_doc or {}
+    wallet, telegram = raw.get("wallet", {}), raw.get("telegram", {})
+    predictor, predictoor = raw.get("predictor", {}), raw.get("predictoor", {})
+    gelato = raw.get("gelato", {})
+    # Older layouts kept discovery settings at the top level.
+    contract_urls = predictoor.get("contract_urls", raw.get("predictoor_contracts"))
+    relayer_urls = gelato.get("relayer_urls")
+    if raw.get("prediction_interval_minutes") and "interval_seconds" not in predictoor:
+        predictoor = dict(predictoor, interval_seconds=int(raw["prediction_interval_minutes"] * 60))
+    api_env = predictoor.get("api_endpoint_env") or predictor.get("api_endpoint_env")
+
+    primary = _wallet(wallet, environ)
+    extra = tuple(_wallet(entry, environ) for entry in raw.get("wallets", []))
+
+    return AgentConfig(
+        wallet=primary,
+        telegram=TelegramConfig(
+            bot_token=_env(environ, telegram.get("bot_token_env", "TELEGRAM_BOT_TOKEN"), telegram.get("bot_token")),
+            chat_id=_env(environ, telegram.get("chat_id_env", "TELEGRAM_CHAT_ID"), telegram.get("chat_id")),
+        ),
+        predictoor=_pick(
+            PredictoorConfig, predictor, predictoor,
+            api_endpoint=_env(environ, api_env, predictoor.get("api_endpoint", predictor.get("api_endpoint"))),
+            contract_urls=tuple(contract_urls) if contract_urls else None,
+            fallback_contract=predictoor.get("fallback_contract", raw.get("fallback_predictoor")),
+        ),
+        gelato=_pick(
+            GelatoConfig, gelato,
+            relayer=_env(environ, gelato.get("relayer_env", "GELATO_RELAYER"), gelato.get("relayer")),
+            api_key=_env(environ, gelato.get("api_key_env", "GELATO_API_KEY")),
+            relayer_urls=tuple(relayer_urls) if relayer_urls else None,
+            fallback_relayer=gelato.get("fallback_relayer", gelato.get("fallback")),
+        ),
+        logging=_pick(LoggingConfig, raw.get("logging")),
+        supervisor=_pick(SupervisorConfig, raw.get("supervisor")),
+        claims=_pick(ClaimConfig, raw.get("claims")),
+        sharding=_pick(ShardingConfig, raw.get("sharding")),
+        feeds=merge_feeds(raw.get("feeds"), yaml_doc.get("feeds")),
+        wallets=extra or (primary,),
+        raw=raw,
+    )
+
+
+# === VALIDATION ===
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_fraction(value):
+    return _is_number(value) and 0 <= value <= 1
+
+
+def validate(cfg):
+    """Raise ConfigError listing every problem; returns `cfg` when it is usable."""
+    problems = []
+    if not cfg.feeds:
+        problems.append("no feeds configured")
+    names = [f.get("name") for f in cfg.feeds]
+    if any(not n for n in names):
+        problems.append("every feed needs a name")
+    for feed in cfg.feeds:
+        try:
+            if scheduler.feed_interval_seconds(feed) <= 0:
+                problems.append(f"feed {feed.get('name')}: interval must be positive")
+        except (TypeError, ValueError) as e:
+            problems.append(f"feed {feed.get('name')}: {e}")
+        if "confidence_threshold" in feed and not _is_fraction(feed["confidence_threshold"]):
+            problems.append(f"feed {feed.get('name')}: confidence_threshold must be a number between 0 and 1")
+    p = cfg.predictoor
+    for name in ("interval_seconds", "claim_interval_seconds", "max_concurrency", "lookback"):
+        if not _is_int(getattr(p, name)) or getattr(p, name) <= 0:
+            problems.append(f"predictoor.{name} must be a positive integer")
+    for name in ("submit_margin_seconds", "schedule_lead_seconds", "prepare_lead_seconds", "refresh_budget_seconds"):
+        if not _is_number(getattr(p, name)) or getattr(p, name) < 0:
+            problems.append(f"predictoor.{name} must be a non-negative number")
+    if not _is_fraction(p.confidence_threshold):
+        problems.append("predictoor.confidence_threshold must be a number between 0 and 1")
+    for name in ("profit_interval", "contract_refresh_interval", "gelato_interval"):
+        try:
+            scheduler.parse_interval(getattr(cfg.supervisor, name))
+        except (TypeError, ValueError) as e:
+            problems.append(f"supervisor.{name}: {e}")
+    for name in ("threshold", "early_payout", "cost"):
+        if not _is_number(getattr(cfg.claims, name)) or getattr(cfg.claims, name) < 0:
+            problems.append(f"claims.{name} must be a non-negative number")
+    addresses = [w.address for w in cfg.wallets]
+    if len(set(addresses)) != len(addresses):
+        problems.append("wallets must have distinct addresses")
+    known = set(names)
+    for w in cfg.wallets:
+        for name in w.feeds or ():
+            if name not in known:
+                problems.append(f"wallet {w.address}: unknown feed {name}")
+    s = cfg.sharding
+    if not _is_int(s.workers) or not _is_int(s.virtual_nodes) or s.workers < 0 or s.virtual_nodes <= 0:
+        problems.append("sharding.workers must be >= 0 and sharding.virtual_nodes > 0")
+    if problems:
+        raise ConfigError("\n".join(problems))
+    return cfg
+
+
+def load(path=AGENT_JSON, feeds_path=FEEDS_YAML, environ=None):
+    """Read, merge and validate without touching the cache."""
+    with open(path, "r") as f:
+        raw = json.load(f)
+    return validate(build(raw, _read_yaml(feeds_path), environ))
+
+
+# === CACHE & HOT RELOAD ===
+_lock = threading.Lock()
+_current = None
+_stamp = None
+_checked = 0.0
+_listeners = []
+
+
+def _mtimes(paths):
+    return tuple(os.stat(p).st_mtime_ns if os.path.exists(p) else None for p in paths)
+
+
+def on_reload(callback):
+    """Call `callback(old, new)` after every successful reload."""
+    _listeners.append(callback)
+    return callback
+
+
+def get(path=AGENT_JSON, feeds_path=FEEDS_YAML):
+    """The cached config, reloaded first if either file changed since it was read."""
+    global _current, _stamp, _checked
+    now = time.monotonic()
+    if _current is not None and now - _checked < CHECK_INTERVAL:
+        return _current
+    with _lock:
+        stamp = _mtimes((path, feeds_path))
+        _checked = now
+        if _current is not None and stamp == _stamp:
+            return _current
+        old = _current
+        try:
+            new = load(path, feeds_path)
+        except Exception as e:  # any bad edit, not just the ones validate() anticipates
+            if old is None:
+                raise
+            metrics.inc("config_reloads_total", result="rejected")
+            print(f"⚠️ Config reload rejected, keeping the previous config:\n{e}")
+            _stamp = stamp
+            return old
+        _current, _stamp = new, stamp
+    if old is not None:
+        metrics.inc("config_reloads_total", result="applied")
+        print(f"🔄 Config reloaded ({len(new.feeds)} feeds)")
+        for callback in list(_listeners):
+            try:
+                callback(old, new)
+            except Exception as e:
+                print(f"⚠️ Config reload listener failed: {e}")
+    return new
+
+
+def reset():
+    """Forget the cached config; the next get() reads the files again."""
+    global _current, _stamp, _checked
+    with _lock:
+        _current, _stamp, _checked = None, None, 0.0
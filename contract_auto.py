@@ -1,51 +1,28 @@
-import json, requests, time, os
+import json, os
+import discovery_cache
+import metrics
 
 AGENT_JSON = "agent_instructions.json"
+HEDGE_DELAY = 0.5  # start the next mirror if the current one is silent this long
 
 def fetch_predictoor_contract():
-    urls = [
-        "https://raw.githubusercontent.com/oceanprotocol/addresses/main/predictoor.json",
-        "https://cdn.jsdelivr.net/gh/oceanprotocol/addresses@main/predictoor.json",
-        "https://oceanprotocol.github.io/addresses/predictoor.json"
-    ]
-    for i, url in enumerate(urls, 1):
-        try:
-            print(f"🔄 Fetching Predictoor contract (attempt {i})...")
-            response = requests.get(url, timeout=8)
-            response.raise_for_status()
-            data = response.json()
-            contract = data.get("predictoor", {}).get("address")
-            if contract:
-                print(f"✅ Found Predictoor contract: {contract}")
-                return contract
-        except Exception as e:
-            print(f"⚠️ Attempt {i} failed: {e}")
-            time.sleep(2)
-    print("⚠️ Using hardcoded fallback contract.")
-    return "0x7F645c91c3D177F0030041b98d89F2D9992c2125"
+    """Revalidate the shared discovery cache; a 304 from the mirror is enough."""
+    print("🔄 Fetching Predictoor contract...")
+    contract = discovery_cache.predictoor_contract(refresh=True, hedge_delay=HEDGE_DELAY)
+    if contract == discovery_cache.FALLBACK_CONTRACT:
+        print("⚠️ Using hardcoded fallback contract.")
+    else:
+        print(f"✅ Found Predictoor contract: {contract}")
+    return contract
 
 def fetch_gelato_relayer():
-    urls = [
-        "https://relay.gelato.network/api/v2/relayers",
-        "https://relay.gelato.digital/api/v2/relayers"
-    ]
-    for i, url in enumerate(urls, 1):
-        try:
-            print(f"🔄 Fetching Gelato relayer (attempt {i})...")
-            response = requests.get(url, timeout=8)
-            response.raise_for_status()
-            data = response.json()
-            if data and isinstance(data, dict):
-                relayers = data.get("relayers") or []
-                if relayers:
-                    relayer = relayers[0]
-                    print(f"✅ Gelato relayer fetched: {relayer}")
-                    return relayer
-        except Exception as e:
-            print(f"⚠️ Attempt {i} failed: {e}")
-            time.sleep(2)
-    print("⚠️ Using default Gelato relayer from JSON.")
-    return "https://relay-fallback.gelato.digital"
+    print("🔄 Fetching Gelato relayer...")
+    relayer = discovery_cache.gelato_relayer(refresh=True, hedge_delay=HEDGE_DELAY)
+    if relayer == discovery_cache.FALLBACK_RELAYER:
+        print("⚠️ Using default Gelato relayer from JSON.")
+    else:
+        print(f"✅ Gelato relayer fetched: {relayer}")
+    return relayer
 
 def update_agent_json(contract, relayer):
     try:
@@ -55,14 +32,17 @@ def update_agent_json(contract, relayer):
         config["predictoor"]["contract_address"] = contract
         config["gelato"]["relayer"] = relayer
 
-        with open(AGENT_JSON, "w") as f:
+        # Write-then-rename: running agents hot-reload this file and must never see it half-written.
+        with open(f"{AGENT_JSON}.tmp", "w") as f:
             json.dump(config, f, indent=4)
+        os.replace(f"{AGENT_JSON}.tmp", AGENT_JSON)
 
         print(f"✅ agent_instructions.json updated with latest contract & relayer.")
     except Exception as e:
         print(f"❌ Failed to update {AGENT_JSON}: {e}")
 
 if __name__ == "__main__":
+    metrics.start_from_env()
     print("🌐 Auto-updating Predictoor contract & Gelato relayer...")
     predictoor_contract = fetch_predictoor_contract()
     gelato_relayer = fetch_gelato_relayer()
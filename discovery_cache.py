@@ -0,0 +1,262 @@
+# discovery_cache.py
+"""
+Persistent cache for Predictoor contract and Gelato relayer discovery.
+
+Entries live in `.cache/discovery.json` with a TTL. A fresh entry is returned
+straight from memory; a stale one is returned immediately while a background
+thread revalidates it with ETag / If-Modified-Since (a 304 just renews the
+TTL). Only a cold cache blocks the caller on the network.
+
+Mirrors are ranked by recorded latency and success rate, and `hedge_delay`
+races them: the next mirror starts if the current one has not answered
+within the delay, and the first valid answer wins.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+import http_client
+
+CACHE_FILE = ".cache/discovery.json"
+MIRROR_STATS_FILE = ".cache/mirrors.json"
+DEFAULT_TTL = 6 * 3600           # addresses rarely change
+MAX_STALE = 7 * 24 * 3600        # beyond this a stale value is refetched inline
+
+PREDICTOOR_URLS = [
+    "https://raw.githubusercontent.com/oceanprotocol/addresses/main/predictoor.json",
+    "https://cdn.jsdelivr.net/gh/oceanprotocol/addresses@main/predictoor.json",
+    "https://oceanprotocol.github.io/addresses/predictoor.json",
+]
+RELAYER_URLS = [
+    "https://relay.gelato.network/api/v2/relayers",
+    "https://relay.gelato.digital/api/v2/relayers",
+]
+FALLBACK_CONTRACT = "0x7F645c91c3D177F0030041b98d89F2D9992c2125"
+FALLBACK_RELAYER = "https://relay-fallback.gelato.digital"
+
+_lock = threading.Lock()
+_entries = None
+_mirror_stats = None
+_refreshing = set()
+
+
+# === PARSERS ===
+def parse_predictoor(data):
+    """Accept both the addresses-repo layout and the per-network layout."""
+    if not isinstance(data, dict):
+        return None
+    return (data.get("predictoor") or {}).get("address") or (data.get("sapphire-mainnet") or {}).get("Predictoor")
+
+
+def parse_relayer(data):
+    """Accept `{"relayers": [...]}` or a bare list of relayer objects."""
+    relayers = data.get("relayers") if isinstance(data, dict) else data
+    if not isinstance(relayers, list) or not relayers:
+        return None
+    first = relayers[0]
+    return first.get("address") if isinstance(first, dict) else first
+
+
+# === STORAGE ===
+def _load():
+    global _entries
+    if _entries is None:
+        try:
+            with open(CACHE_FILE, "r") as f:
+                _entries = json.load(f)
+        except (OSError, ValueError):
+            _entries = {}
+    return _entries
+
+
+def _save():
+    os.makedirs(os.path.dirname(CACHE_FILE) or ".", exist_ok=True)
+    tmp = f"{CACHE_FILE}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(_entries, f, indent=2)
+    os.replace(tmp, CACHE_FILE)
+
+
+def _store(name, entry):
+    with _lock:
+        _load()[name] = entry
+        try:
+            _save()
+        except OSError as e:
+            print(f"[Discovery] Could not persist cache: {e}")
+
+
+# === MIRROR STATS ===
+def _stats():
+    global _mirror_stats
+    if _mirror_stats is None:
+        try:
+            with open(MIRROR_STATS_FILE, "r") as f:
+                _mirror_stats = json.load(f)
+        except (OSError, ValueError):
+            _mirror_stats = {}
+    return _mirror_stats
+
+
+def _record(url, ok, seconds):
+    """EWMA latency plus success/failure counts per mirror URL."""
+    with _lock:
+        stat = _stats().setdefault(url, {"ewma_ms": seconds * 1000, "ok": 0, "fail": 0})
+        stat["ewma_ms"] = 0.7 * stat["ewma_ms"] + 0.3 * seconds * 1000
+        stat["ok" if ok else "fail"] += 1
+
+
+def _save_stats():
+    with _lock:
+        try:
+            os.makedirs(os.path.dirname(MIRROR_STATS_FILE) or ".", exist_ok=True)
+            with open(MIRROR_STATS_FILE, "w") as f:
+                json.dump(_stats(), f, indent=2)
+        except OSError as e:
+            print(f"[Discovery] Could not persist mirror stats: {e}")
+
+
+def rank_mirrors(urls):
+    """Fastest reliable mirror first; mirrors never tried keep their configured order up front."""
+    with _lock:
+        stats = dict(_stats())
+
+    def score(url):
+        stat = stats.get(url)
+        if not stat:
+            return 0.0
+        success_rate = (stat["ok"] + 1) / (stat["ok"] + stat["fail"] + 2)
+        return stat["ewma_ms"] / success_rate
+
+    return sorted(urls, key=score)
+
+
+# === FETCH / REVALIDATE ===
+def _attempt(name, url, parse, previous):
+    """One conditional GET against one mirror; returns a new entry or None."""
+    validators = previous.get("validators", {})
+    known = validators.get(url, {})
+    headers = {}
+    if previous.get("value") and known.get("etag"):
+        headers["If-None-Match"] = known["etag"]
+    if previous.get("value") and known.get("last_modified"):
+        headers["If-Modified-Since"] = known["last_modified"]
+
+    started = time.monotonic()
+    entry = None
+    try:
+        r = http_client.get(url, headers=headers, timeout=8, retries=1, check=False, lane="housekeeping")
+        if r.status_code == 304:
+            entry = dict(previous, fetched_at=time.time(), url=url)
+        elif r.status_code == 200:
+            value = parse(r.json())
+            if value:
+                validators = dict(validators)
+                validators[url] = {
+                    "etag": r.headers.get("ETag"),
+                    "last_modified": r.headers.get("Last-Modified"),
+                }
+                entry = {"value": value, "fetched_at": time.time(), "url": url, "validators": validators}
+    except Exception as e:
+        print(f"[Discovery] {name} lookup failed for {url}: {e}")
+    _record(url, entry is not None, time.monotonic() - started)
+    return entry
+
+
+def fetch(name, urls, parse, hedge_delay=None):
+    """
+    Query mirrors best-first; returns the new entry or None.
+
+    Without `hedge_delay` mirrors are tried one after another. With it, the
+    next mirror is started whenever the running ones have been silent for
+    `hedge_delay` seconds (0 starts them all at once) or one of them fails.
+    Mirrors not yet started when a winner arrives are never queried.
+    """
+    with _lock:
+        previous = dict(_load().get(name) or {})
+    ordered = rank_mirrors(urls)
+
+    try:
+        if hedge_delay is None:
+            for url in ordered:
+                entry = _attempt(name, url, parse, previous)
+                if entry:
+                    _store(name, entry)
+                    return entry
+            return None
+
+        results = queue.Queue()
+        started = 0
+        pending = 0
+        while started < len(ordered) or pending:
+            if started < len(ordered):
+                url = ordered[started]
+                threading.Thread(
+                    target=lambda u=url: results.put(_attempt(name, u, parse, previous)),
+                    name=f"discovery-hedge-{name}",
+                    daemon=True,
+                ).start()
+                started += 1
+                pending += 1
+            try:
+                entry = results.get(timeout=hedge_delay if started < len(ordered) else None)
+            except queue.Empty:
+                continue  # hedge: start the next mirror alongside the slow one
+            pending -= 1
+            if entry:
+                _store(name, entry)
+                return entry
+        return None
+    finally:
+        _save_stats()
+
+
+def _refresh_in_background(name, urls, parse, hedge_delay=None):
+    with _lock:
+        if name in _refreshing:
+            return
+        _refreshing.add(name)
+
+    def run():
+        try:
+            fetch(name, urls, parse, hedge_delay)
+        finally:
+            with _lock:
+                _refreshing.discard(name)
+
+    threading.Thread(target=run, name=f"discovery-{name}", daemon=True).start()
+
+
+def lookup(name, urls, parse, fallback, ttl=DEFAULT_TTL, max_stale=MAX_STALE, refresh=False,
+           hedge_delay=None):
+    """
+    Cached value for `name`, stale-while-revalidate.
+
+    `refresh=True` revalidates synchronously (used by the one-shot updater).
+    Falls back to the last known value, then to `fallback`, if every URL fails.
+    """
+    with _lock:
+        entry = _load().get(name)
+    age = time.time() - entry["fetched_at"] if entry else None
+
+    if entry and not refresh:
+        if age < ttl:
+            return entry["value"]
+        if age < max_stale:
+            _refresh_in_background(name, urls, parse, hedge_delay)
+            return entry["value"]
+
+    fresh = fetch(name, urls, parse, hedge_delay)
+    if fresh:
+        return fresh["value"]
+    return entry["value"] if entry else fallback
+
+
+def predictoor_contract(urls=None, fallback=FALLBACK_CONTRACT, **kwargs):
+    return lookup("predictoor_contract", urls or PREDICTOOR_URLS, parse_predictoor, fallback, **kwargs)
+
+
+def gelato_relayer(urls=None, fallback=FALLBACK_RELAYER, **kwargs):
+    return lookup("gelato_relayer", urls or RELAYER_URLS, parse_relayer, fallback, **kwargs)
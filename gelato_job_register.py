@@ -1,75 +1,152 @@
-import os, requests, time, json
+import os, json, hashlib
+import config
+import http_client
+import metrics
+import scheduler
+import telegram_notify
 
-GELATO_API = "https://api.gelato.network/v2/jobs"
-GELATO_API_KEY = os.getenv("GELATO_API_KEY")
-RELAYER = os.getenv("GELATO_RELAYER")
-PREDICTOOR_API = os.getenv("PREDICTOOR_API")
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
-
-FEEDS = [
-    "BTC/USDT",
-    "ETH/USDT",
-    "SOL/USDT",
-    "BNB/USDT"
-]
+GELATO_API = os.getenv("GELATO_API", "https://api.gelato.network/v2/jobs")
+JOB_PREFIX = "Predictoor_"
+PAGE_SIZE = 500
+CONCURRENCY = 16      # job writes in flight at once
 
 def notify(message):
-    try:
-        requests.post(
-            f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage",
-            data={"chat_id": TELEGRAM_CHAT_ID, "text": message}
-        )
-    except Exception as e:
-        print(f"Telegram error: {e}")
+    telegram_notify.send(message)
+
+def headers():
+    return {"Authorization": f"Bearer {config.get().gelato.api_key}"}
 
+# === ACTUAL STATE ===
 def get_jobs():
+    """Every job, following the `next` cursor page by page; raises if any page fails."""
+    jobs, cursor = [], None
+    while True:
+        params = {"limit": PAGE_SIZE, **({"cursor": cursor} if cursor else {})}
+        with metrics.stage("gelato_list"):
+            r = http_client.get(GELATO_API, headers=headers(), params=params, timeout=15,
+                                lane="housekeeping")
+        page = r.json()
+        jobs += page.get("jobs", [])
+        cursor = page.get("next")
+        if not cursor:
+            return jobs
+
+def job_name(feed_name):
+    return f"{JOB_PREFIX}{feed_name.replace('/', '_')}"
+
+def job_key(job, legacy_names=None):
+    """
+    The feed a job serves, from its execData. Legacy jobs without one are
+    matched by name against `legacy_names` ({job name: feed name}), since the
+    name alone can't tell "A_B/C" from "A/B_C"; unmatched ones keep their job
+    name as key.
+    """
     try:
-        headers = {"Authorization": f"Bearer {GELATO_API_KEY}"}
-        r = requests.get(GELATO_API, headers=headers, timeout=15)
-        if r.status_code == 200:
-            return r.json().get("jobs", [])
-        else:
-            notify(f"⚠️ Failed to fetch jobs: {r.text}")
-            return []
-    except Exception as e:
-        notify(f"❌ Error fetching jobs: {str(e)}")
-        return []
+        return json.loads(job["taskSpec"]["execData"])["feed"]
+    except (KeyError, TypeError, ValueError):
+        name = job.get("name", "")
+        return (legacy_names or {}).get(name, name) if name.startswith(JOB_PREFIX) else None
 
-def register_job(feed):
-    payload = {
-        "name": f"Predictoor_{feed.replace('/', '_')}",
+# === DESIRED STATE ===
+def exec_address():
+    relayer = config.get().gelato.relayer
+    if relayer and relayer != "auto-update":
+        return relayer
+    import discovery_cache
+    return discovery_cache.gelato_relayer()
+
+def job_spec(feed, relayer):
+    return {
+        "name": job_name(feed["name"]),
         "taskSpec": {
-            "execAddress": RELAYER,
-            "execData": json.dumps({"feed": feed}),
+            "execAddress": relayer,
+            "execData": json.dumps({"feed": feed["name"]}),
         },
         "trigger": {
-            "interval": 1800  # every 30 minutes
+            "interval": scheduler.feed_interval_seconds(feed)
         }
     }
 
-    headers = {"Authorization": f"Bearer {GELATO_API_KEY}"}
-    try:
-        r = requests.post(GELATO_API, headers=headers, json=payload, timeout=15)
-        if r.status_code == 200:
-            job_id = r.json().get("id")
-            notify(f"🧠 Gelato Job Registered for {feed}: {job_id}")
+def differs(job, spec):
+    return any(job.get(field) != spec[field] for field in ("name", "taskSpec", "trigger"))
+
+def plan(jobs, feeds, relayer):
+    """
+    Desired-vs-actual diff as (action, key, job id, body) tuples. Only our own
+    jobs (named JOB_PREFIX...) are ever updated or deleted; duplicates of a
+    feed's job are deleted, keeping the first.
+    """
+    desired = {feed["name"]: job_spec(feed, relayer) for feed in feeds}
+    legacy_names = {spec["name"]: key for key, spec in desired.items()}
+    actual = {}
+    actions = []
+    for job in jobs:
+        key = job_key(job, legacy_names)
+        if key is None or not job.get("name", "").startswith(JOB_PREFIX):
+            continue
+        if key in actual or key not in desired:
+            actions.append(("delete", key, job["id"], None))
         else:
-            notify(f"⚠️ Job registration failed for {feed}: {r.text}")
-    except Exception as e:
-        notify(f"❌ Job registration error for {feed}: {str(e)}")
+            actual[key] = job
+    for key, spec in desired.items():
+        job = actual.get(key)
+        if job is None:
+            actions.append(("create", key, None, spec))
+        elif differs(job, spec):
+            actions.append(("update", key, job["id"], spec))
+    return actions, len(actual) - sum(1 for action in actions if action[0] == "update")
 
-def verify_jobs():
-    existing_jobs = get_jobs()
-    active_feeds = [j["name"].replace("Predictoor_", "").replace("_", "/") for j in existing_jobs]
+# === APPLY ===
+def idempotency_key(action, key, body):
+    """Same action on the same job state -> same key, so a retried or re-run write applies once."""
+    digest = hashlib.sha256(json.dumps([action, key, body], sort_keys=True).encode()).hexdigest()
+    return digest[:32]
 
-    for feed in FEEDS:
-        if feed not in active_feeds:
-            register_job(feed)
-        else:
-            notify(f"✅ {feed} still active on Gelato")
+def apply(change):
+    action, key, job_id, body = change
+    method, url = {"create": ("POST", GELATO_API), "update": ("PATCH", f"{GELATO_API}/{job_id}"),
+                   "delete": ("DELETE", f"{GELATO_API}/{job_id}")}[action]
+    request_headers = dict(headers(), **{"Idempotency-Key": idempotency_key(action, key, body or job_id)})
+    try:
+        r = http_client.request(method, url, headers=request_headers, json=body, timeout=15, check=False,
+                                lane="housekeeping")
+    except Exception as e:
+        return action, key, str(e)
+    if action == "delete" and r.status_code == 404:
+        return action, key, None  # already gone
+    return action, key, None if r.status_code < 300 else f"{r.status_code} {r.text[:200]}"
+
+def verify_jobs(boundary=None):
+    """Reconcile Gelato jobs with the configured feeds and report one summary."""
+    with telegram_notify.round_digest("🧠 Gelato job verification"):
+        try:
+            jobs = get_jobs()
+        except Exception as e:
+            notify(f"❌ Error fetching jobs, nothing changed: {e}")
+            return
+        changes, unchanged = plan(jobs, config.get().feeds, exec_address())
+        from concurrent.futures import ThreadPoolExecutor
+        counts = {"create": 0, "update": 0, "delete": 0}
+        failures = []
+        with metrics.stage("gelato_apply"), ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+            for action, key, error in pool.map(apply, changes):
+                if error:
+                    failures.append(f"{action} {key}: {error}")
+                else:
+                    counts[action] += 1
+                metrics.inc("gelato_jobs_reconciled_total", action=action, result="failed" if error else "ok")
+        summary = (f"{len(jobs)} job(s) listed | created {counts['create']}, updated {counts['update']}, "
+                   f"deleted {counts['delete']}, unchanged {unchanged}, failed {len(failures)}")
+        notify(("⚠️ " if failures else "✅ ") + summary)
+        for failure in failures[:10]:
+            notify(f"❌ {failure}")
+        if len(failures) > 10:
+            notify(f"… and {len(failures) - 10} more failures")
 
 if __name__ == "__main__":
+    metrics.start_from_env()
+    cfg = config.get()
+    telegram_notify.configure(cfg.telegram.bot_token, cfg.telegram.chat_id)
     notify("🚀 Starting Gelato Job Verification...")
     verify_jobs()
     notify("✅ Gelato Job Verification Completed.")
@@ -0,0 +1,462 @@
+# http_client.py
+"""
+Shared HTTP client for every agent script.
+
+One keep-alive connection pool per host, exponential backoff with full jitter,
+a per-host circuit breaker (a dead relayer fails fast instead of eating the
+whole retry schedule) and a per-host retry budget so retries can never
+multiply load during an outage.
+
+Every call also passes through its host's limiter: a token bucket paced by
+the host's rate-limit headers (`Retry-After`, `RateLimit-*`/`X-RateLimit-*`)
+and an AIMD concurrency limit that grows by one slot per window of healthy
+calls and halves on throttling, errors or latency well above the host's
+baseline. Waiting calls are admitted by lane (LANES) and then by deadline,
+and while a `submit` call is in flight anywhere the background lanes hold
+off for up to BACKGROUND_HOLD_MAX seconds.
+
+`requests` is imported on the first call rather than at import time: it is
+most of a cold start, and one-shot scripts should not pay for it before
+they do any work.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import metrics
+
+# === SETTINGS ===
+POOL_MAXSIZE = 16            # keep-alive connections per host
+FAILURE_THRESHOLD = 3        # consecutive failures before the breaker opens
+OPEN_SECONDS = 60            # how long an open breaker rejects calls
+BACKOFF_BASE = 0.5           # first retry waits up to this many seconds
+BACKOFF_MAX = 8.0
+BUDGET_RATIO = 0.2           # each request earns 0.2 retries ...
+BUDGET_MAX = 10.0            # ... up to this many banked retries per host
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+THROTTLE_STATUS = {429, 503}
+
+# --- pacing ---
+LANES = {"submit": 0, "default": 1, "notify": 2, "housekeeping": 3}   # lower goes first
+BACKGROUND_LANES = {"notify", "housekeeping"}
+BACKGROUND_SHARE = 0.5       # background lanes use at most half of a host's concurrency
+BACKGROUND_HOLD_MAX = 10.0   # longest a background call waits out in-flight submissions
+RATE = 50.0                  # starting requests/second per host
+RATE_STEP = 1.0              # added per healthy call, up to RATE_MAX or the host's advertised quota
+RATE_MIN = 0.2
+RATE_MAX = 500.0
+BURST = 50.0
+CONCURRENCY_START = 4
+CONCURRENCY_MIN = 1          # ... up to POOL_MAXSIZE
+DECREASE_FACTOR = 0.5
+DECREASE_COOLDOWN = 1.0      # at most one multiplicative decrease per second
+LATENCY_TOLERANCE = 2.0      # slower than 2x the host's baseline ...
+LATENCY_SLACK = 0.25         # ... and this many seconds over it counts as congestion
+RETRY_AFTER_MAX = 300.0
+
+
+def _requests():
+    import requests
+    return requests
+
+
+_circuit_open_error = None
+
+
+def _circuit_open_error_class():
+    global _circuit_open_error
+    if _circuit_open_error is None:
+        class CircuitOpenError(_requests().exceptions.ConnectionError):
+            """Raised without touching the network while a host's breaker is open."""
+        _circuit_open_error = CircuitOpenError
+    return _circuit_open_error
+
+
+def __getattr__(name):
+    # `http_client.CircuitOpenError` subclasses requests' ConnectionError,
+    # so it is built on first access instead of at import.
+    if name == "CircuitOpenError":
+        return _circuit_open_error_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# === PER-HOST STATE ===
+class HostState:
+    def __init__(self, host):
+        self.limiter = HostLimiter(host)
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.retry_tokens = BUDGET_MAX
+
+    # --- circuit breaker ---
+    def allow(self):
+        """
+        False while the breaker is open. Once OPEN_SECONDS have passed it lets
+        one trial call through and returns "trial"; the caller must `end_trial()`
+        however that call ends.
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < OPEN_SECONDS or self.trial_in_flight:
+                return False
+            self.trial_in_flight = True  # half-open: let one request probe the host
+            return "trial"
+
+    def end_trial(self):
+        """Free the half-open slot of a trial that ended without recording an outcome."""
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+            self.retry_tokens = min(BUDGET_MAX, self.retry_tokens + BUDGET_RATIO)
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.retry_tokens = min(BUDGET_MAX, self.retry_tokens + BUDGET_RATIO)
+            if self.trial_in_flight or self.failures >= FAILURE_THRESHOLD:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+    # --- retry budget ---
+    def take_retry(self):
+        with self.lock:
+            if self.retry_tokens < 1:
+                return False
+            self.retry_tokens -= 1
+            return True
+
+
+# === PACING ===
+def _header_seconds(value):
+    """A delay given as delta seconds or an HTTP date, clamped to [0, RETRY_AFTER_MAX]."""
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        from email.utils import parsedate_to_datetime
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(RETRY_AFTER_MAX, max(0.0, seconds))
+
+
+def rate_limit_hint(status, headers):
+    """
+    (pause, remaining, reset) from a response: `pause` is the Retry-After of a
+    throttled response, `remaining`/`reset` the quota left in the current
+    window and the seconds until it resets. Missing values are None.
+    """
+    pause = _header_seconds(headers.get("Retry-After")) if status in THROTTLE_STATUS else None
+    remaining = headers.get("RateLimit-Remaining") or headers.get("X-RateLimit-Remaining")
+    reset = headers.get("RateLimit-Reset") or headers.get("X-RateLimit-Reset")
+    try:
+        remaining = float(remaining) if remaining is not None else None
+        reset = float(reset) if reset is not None else None
+    except ValueError:
+        return pause, None, None
+    if reset is not None and reset > 1e9:  # absolute epoch seconds (or ms) rather than a delta
+        reset = (reset / 1000 if reset > 1e12 else reset) - time.time()
+    if reset is not None:
+        reset = min(RETRY_AFTER_MAX, max(0.0, reset))
+    return pause, remaining, reset
+
+
+_urgent = 0                            # submit-lane calls in flight, across hosts
+_urgent_cond = threading.Condition()
+
+
+def _hold_background(deadline):
+    """Let in-flight submissions go first, for at most BACKGROUND_HOLD_MAX seconds."""
+    end = time.monotonic() + BACKGROUND_HOLD_MAX
+    with _urgent_cond:
+        while _urgent:
+            remaining = end - time.monotonic()
+            if deadline is not None:
+                remaining = min(remaining, deadline - time.time())
+            if remaining <= 0:
+                return
+            _urgent_cond.wait(remaining)
+
+
+def _mark_urgent(delta):
+    global _urgent
+    with _urgent_cond:
+        _urgent += delta
+        if not _urgent:
+            _urgent_cond.notify_all()
+
+
+class HostLimiter:
+    """Token bucket, AIMD concurrency limit and lane-ordered wait queue for one host."""
+
+    def __init__(self, host):
+        self.host = host
+        self.cond = threading.Condition()
+        self.rate = RATE
+        self.ceiling = RATE_MAX      # highest rate the host's headers allow
+        self.tokens = BURST
+        self.refilled = time.monotonic()
+        self.blocked_until = 0.0     # monotonic; set by Retry-After or an exhausted quota
+        self.limit = float(CONCURRENCY_START)
+        self.in_flight = 0
+        self.baseline = None         # slow-rising minimum of observed latency
+        self.decreased_at = 0.0
+        self.waiting = []            # heap of (lane priority, deadline, seq)
+        self._seq = itertools.count()
+
+    def _wait_time(self, lane, now):
+        """0 if a `lane` call may start now, seconds until it might, or None to wait for a release."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        cap = self.limit * BACKGROUND_SHARE if lane in BACKGROUND_LANES else self.limit
+        if self.in_flight >= max(1, int(cap)):
+            return None
+        self.tokens = min(BURST, self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def acquire(self, lane="default", deadline=None):
+        """Wait for a slot and a token; False if `deadline` (unix time) comes first."""
+        if lane in BACKGROUND_LANES:
+            _hold_background(deadline)
+        ticket = (LANES[lane], float("inf") if deadline is None else deadline, next(self._seq))
+        started = time.monotonic()
+        with self.cond:
+            heapq.heappush(self.waiting, ticket)
+            admitted = False
+            try:
+                while True:
+                    wait = self._wait_time(lane, time.monotonic()) if self.waiting[0] == ticket else None
+                    if wait == 0:
+                        admitted = True
+                        break
+                    if deadline is not None:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            break
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self.cond.wait(wait)
+            finally:
+                if admitted:
+                    heapq.heappop(self.waiting)
+                    self.tokens -= 1
+                    self.in_flight += 1
+                else:
+                    self.waiting.remove(ticket)
+                    heapq.heapify(self.waiting)
+                self.cond.notify_all()  # the next ticket may now be at the head
+        metrics.observe("http_queue_seconds", time.monotonic() - started, host=self.host, lane=lane)
+        return admitted
+
+    def release(self, latency, congested=False):
+        """Return the slot and adapt the concurrency limit (AIMD); `latency=None` for an unused slot."""
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+            if latency is None:
+                return
+            if not congested:
+                if self.baseline is None:
+                    self.baseline = latency
+                congested = latency > max(self.baseline * LATENCY_TOLERANCE, self.baseline + LATENCY_SLACK)
+                self.baseline = min(latency, self.baseline + (latency - self.baseline) * 0.05)
+            now = time.monotonic()
+            if not congested:
+                self.limit = min(POOL_MAXSIZE, self.limit + 1 / self.limit)
+                self.rate = min(self.ceiling, self.rate + RATE_STEP)
+            elif now - self.decreased_at >= DECREASE_COOLDOWN:
+                self.limit = max(CONCURRENCY_MIN, self.limit * DECREASE_FACTOR)
+                self.decreased_at = now
+            metrics.set_gauge("http_concurrency_limit", round(self.limit, 2), host=self.host)
+
+    def observe(self, status, headers):
+        """Apply a response's Retry-After and rate-limit headers to the bucket."""
+        pause, remaining, reset = rate_limit_hint(status, headers)
+        if pause is None and remaining is None and status not in THROTTLE_STATUS:
+            return
+        with self.cond:
+            now = time.monotonic()
+            if status == 429:
+                self.rate = max(RATE_MIN, self.rate * DECREASE_FACTOR)
+                metrics.inc("http_throttled_total", host=self.host)
+            if remaining is not None and reset is not None:
+                if remaining < 1:
+                    pause = max(pause or 0.0, reset)
+                else:
+                    self.ceiling = min(RATE_MAX, max(RATE_MIN, remaining / max(reset, 1.0)))
+                    self.rate = min(self.rate, self.ceiling)
+            if pause:
+                self.blocked_until = max(self.blocked_until, now + pause)
+                self.tokens = 0.0
+            metrics.set_gauge("http_rate_limit", round(self.rate, 2), host=self.host)
+            self.cond.notify_all()
+
+    def blocked(self):
+        """Seconds until the host said it will take calls again."""
+        return max(0.0, self.blocked_until - time.monotonic())
+
+
+_lock = threading.Lock()
+_sessions = {}
+_hosts = {}
+
+
+def host_of(url):
+    return urlsplit(url).netloc
+
+
+def _host_state(host):
+    with _lock:
+        if host not in _hosts:
+            _hosts[host] = HostState(host)
+        return _hosts[host]
+
+
+def session_for(url):
+    """Keep-alive session dedicated to the URL's host."""
+    host = host_of(url)
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            from requests.adapters import HTTPAdapter
+            session = _requests().Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[host] = session
+        return session
+
+
+def is_open(url):
+    """True while the host's circuit breaker is rejecting calls."""
+    state = _host_state(host_of(url))
+    return state.opened_at is not None and time.monotonic() - state.opened_at < OPEN_SECONDS
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE):
+    """Full-jitter exponential backoff for the given 0-based attempt."""
+    return random.uniform(0, min(BACKOFF_MAX, base * (2 ** attempt)))
+
+
+# === REQUESTS ===
+def request(method, url, retries=3, timeout=15, backoff=BACKOFF_BASE, deadline=None,
+            check=True, on_retry=None, lane="default", **kwargs):
+    """
+    Send a request through the host's pooled session.
+
+    Each attempt first waits for the host's limiter, in `lane` order (see
+    LANES). Retries connection errors, timeouts, 429 and 5xx with jittered
+    backoff, or for as long as the host's Retry-After asks, bounded by the
+    host's retry budget and an optional absolute `deadline` (unix time).
+    With `check=True` the final response must be 2xx or `requests.HTTPError`
+    is raised; with `check=False` the last response is returned as-is.
+    `on_retry(attempt, retries, error)` is called before each retry sleep.
+    """
+    if lane != "submit":
+        return _request(method, url, retries, timeout, backoff, deadline, check, on_retry, lane, kwargs)
+    _mark_urgent(1)
+    try:
+        return _request(method, url, retries, timeout, backoff, deadline, check, on_retry, lane, kwargs)
+    finally:
+        _mark_urgent(-1)
+
+
+def _request(method, url, retries, timeout, backoff, deadline, check, on_retry, lane, kwargs):
+    requests = _requests()
+    host = host_of(url)
+    state = _host_state(host)
+    limiter = state.limiter
+    session = session_for(url)
+    last_error = None
+    response = None
+
+    for attempt in range(retries):
+        if deadline is not None and deadline <= time.time():
+            break
+        if not limiter.acquire(lane, deadline):
+            break
+        call_timeout = timeout
+        if deadline is not None:
+            call_timeout = min(timeout, deadline - time.time())
+            if call_timeout <= 0:
+                limiter.release(None)
+                break
+        allowed = state.allow()
+        if not allowed:
+            limiter.release(None)
+            metrics.inc("http_circuit_open_total", host=host)
+            raise _circuit_open_error_class()(f"circuit open for {host}")
+
+        response = None
+        congested = True
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=call_timeout, **kwargs)
+            congested = response.status_code in RETRY_STATUS
+            limiter.observe(response.status_code, response.headers)
+            metrics.observe("http_request_seconds", time.perf_counter() - started, host=host)
+            if response.status_code >= 400:
+                metrics.inc("http_errors_total", host=host, kind=str(response.status_code))
+            if response.status_code in RETRY_STATUS:
+                response.raise_for_status()
+            state.record_success()
+            if check:
+                response.raise_for_status()
+            return response
+        except requests.HTTPError as e:
+            if response is None or response.status_code not in RETRY_STATUS:
+                raise
+            if response.status_code == 429:
+                state.record_success()  # throttled, not down: pace it instead of tripping the breaker
+            else:
+                state.record_failure()
+            last_error = e
+        except requests.RequestException as e:
+            metrics.observe("http_request_seconds", time.perf_counter() - started, host=host)
+            metrics.inc("http_errors_total", host=host, kind=type(e).__name__)
+            state.record_failure()
+            last_error = e
+        finally:
+            limiter.release(time.perf_counter() - started, congested)
+            if allowed == "trial":
+                state.end_trial()
+
+        if attempt + 1 >= retries or not state.take_retry():
+            break
+        metrics.inc("http_retries_total", host=host)
+        if on_retry:
+            on_retry(attempt + 1, retries, last_error)
+        # A Retry-After already holds the host's limiter; the next acquire waits it out.
+        pause = 0.0 if limiter.blocked() else backoff_delay(attempt, backoff)
+        if deadline is not None:
+            pause = min(pause, max(0, deadline - time.time()))
+        metrics.observe("stage_seconds", pause, stage="retry_backoff")
+        time.sleep(pause)
+
+    if not check and response is not None:
+        return response
+    if last_error is None:
+        last_error = requests.Timeout(f"deadline reached before request to {host}")
+    raise last_error
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
@@ -0,0 +1,152 @@
+# journal.py
+"""
+Write-ahead journal of prediction submissions, keyed by (wallet, feed, epoch).
+
+A submission is recorded as `pending` (with its payload and deadline)
+before it is sent and moved to `sent` or `failed` once the relayer answers,
+so a retried round, a restarted process or a second submitter never sends
+an accepted prediction twice. After a crash, `recover()` returns the
+pending submissions whose deadline is still ahead; the rest are marked
+`expired`. Rows older than RETENTION are compacted away.
+
+Backed by SQLite in WAL mode: lookups go through the primary key, commits
+don't fsync on every write, and several processes (e.g. shard workers) can
+share one file.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+JOURNAL_FILE = "logs/submissions.db"
+RETENTION = 7 * 86400
+BUSY_TIMEOUT_MS = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    wallet   TEXT NOT NULL,
+    feed     TEXT NOT NULL,
+    epoch    INTEGER NOT NULL,
+    status   TEXT NOT NULL,          -- pending | sent | failed | expired
+    attempts INTEGER NOT NULL DEFAULT 0,
+    deadline REAL,
+    payload  TEXT,
+    updated  REAL NOT NULL,
+    PRIMARY KEY (wallet, feed, epoch)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS submissions_epoch ON submissions (epoch);
+CREATE INDEX IF NOT EXISTS submissions_status ON submissions (status, deadline);
+"""
+
+
+def submission_key(wallet, feed, epoch):
+    """Stable idempotency key for one (wallet, feed, epoch) submission."""
+    return hashlib.sha256(f"{wallet}|{feed}|{int(epoch)}".encode()).hexdigest()[:32]
+
+
+class SubmissionJournal:
+    """Thread-safe handle on the journal file; one per process."""
+
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _conn(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(SCHEMA)
+            self._db = db
+        return self._db
+
+    def begin(self, entries, now=None):
+        """
+        Record `entries` — (wallet, feed, epoch, deadline, payload) — as pending
+        and return the ones to send: everything except submissions already sent.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            db = self._conn()
+            with db:
+                sent = {
+                    (w, f, e) for w, f, e in db.execute(
+                        "SELECT wallet, feed, epoch FROM submissions WHERE status = 'sent' AND epoch IN "
+                        f"({','.join('?' * len({int(e[2]) for e in entries}))})",
+                        sorted({int(e[2]) for e in entries}),
+                    )
+                } if entries else set()
+                todo = [e for e in entries if (e[0], e[1], int(e[2])) not in sent]
+                db.executemany(
+                    "INSERT INTO submissions (wallet, feed, epoch, status, attempts, deadline, payload, updated) "
+                    "VALUES (?, ?, ?, 'pending', 1, ?, ?, ?) "
+                    "ON CONFLICT (wallet, feed, epoch) DO UPDATE SET status = 'pending', "
+                    "attempts = attempts + 1, deadline = excluded.deadline, payload = excluded.payload, "
+                    "updated = excluded.updated",
+                    [(w, f, int(e), d, json.dumps(p), now) for w, f, e, d, p in todo],
+                )
+        return todo
+
+    def finish(self, results, now=None):
+        """Record outcomes: `results` is (wallet, feed, epoch, ok) tuples."""
+        now = time.time() if now is None else now
+        with self._lock:
+            db = self._conn()
+            with db:
+                db.executemany(
+                    "UPDATE submissions SET status = ?, updated = ? WHERE wallet = ? AND feed = ? AND epoch = ?",
+                    [("sent" if ok else "failed", now, w, f, int(e)) for w, f, e, ok in results],
+                )
+
+    def status(self, wallet, feed, epoch):
+        with self._lock:
+            row = self._conn().execute(
+                "SELECT status FROM submissions WHERE wallet = ? AND feed = ? AND epoch = ?",
+                (wallet, feed, int(epoch)),
+            ).fetchone()
+        return row[0] if row else None
+
+    def recover(self, now=None):
+        """
+        Expire pending submissions whose deadline has passed and return the
+        rest as (wallet, feed, epoch, deadline, payload) to resume.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            db = self._conn()
+            with db:
+                db.execute("UPDATE submissions SET status = 'expired', updated = ? "
+                           "WHERE status = 'pending' AND deadline <= ?", (now, now))
+                rows = db.execute("SELECT wallet, feed, epoch, deadline, payload FROM submissions "
+                                  "WHERE status = 'pending'").fetchall()
+        return [(w, f, e, d, json.loads(p)) for w, f, e, d, p in rows]
+
+    def compact(self, before=None):
+        """Delete rows for epochs older than `before` (default: RETENTION ago); returns how many."""
+        before = time.time() - RETENTION if before is None else before
+        with self._lock:
+            db = self._conn()
+            with db:
+                deleted = db.execute("DELETE FROM submissions WHERE epoch < ?", (int(before),)).rowcount
+            db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return deleted
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+_journal = None
+
+
+def default_journal():
+    global _journal
+    if _journal is None:
+        _journal = SubmissionJournal()
+    return _journal
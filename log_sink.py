@@ -0,0 +1,135 @@
+# log_sink.py
+"""
+Shared buffered writer for the text logs (performance, errors, claims).
+
+`log()` only appends to an in-memory buffer; a background thread writes it
+out every FLUSH_INTERVAL seconds, as soon as FLUSH_BYTES are pending, and at
+exit. Files stay open between flushes. A file is rotated once it passes
+ROTATE_BYTES or has been open for ROTATE_SECONDS: the closed segment is
+renamed with a timestamp, gzipped by the writer thread and only the newest
+KEEP_SEGMENTS are kept. Pending data is capped at MAX_BUFFER_BYTES; lines
+past the cap are dropped and counted rather than blocking the caller.
+"""
+import atexit
+import glob
+import gzip
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import metrics
+
+FLUSH_INTERVAL = 1.0                  # seconds between background flushes
+FLUSH_BYTES = 64 * 1024               # flush early once this much is pending
+MAX_BUFFER_BYTES = 4 * 1024 * 1024    # memory ceiling for pending lines
+ROTATE_BYTES = 16 * 1024 * 1024
+ROTATE_SECONDS = 86400
+KEEP_SEGMENTS = 10                    # compressed segments kept per log
+
+_lock = threading.Lock()
+_pending = {}           # path -> [lines]
+_pending_bytes = 0
+_wake = threading.Event()
+_flushed = threading.Condition()
+_generation = 0         # bumped after every completed flush
+_worker = None
+_files = {}             # path -> [file, opened_at]; only touched by the writer
+
+
+# === FRONT END ===
+def write(path, text):
+    """Queue `text` (a complete line or lines) for `path`; never touches the disk."""
+    global _pending_bytes
+    size = len(text)
+    with _lock:
+        if _pending_bytes + size > MAX_BUFFER_BYTES:
+            metrics.inc("log_sink_dropped_total")
+            return
+        _pending.setdefault(path, []).append(text)
+        _pending_bytes += size
+        wake = _pending_bytes >= FLUSH_BYTES
+    _ensure_worker()
+    if wake:
+        _wake.set()
+
+
+def log(path, message):
+    """`write` one timestamped line, in the format the log files have always used."""
+    write(path, f"{datetime.utcnow().isoformat()} - {message}\n")
+
+
+def flush(timeout: float = 10):
+    """Write everything queued so far, waiting at most `timeout` seconds."""
+    with _lock:
+        if not _pending:
+            return
+    _ensure_worker()
+    with _flushed:
+        target = _generation + 1
+        _wake.set()
+        _flushed.wait_for(lambda: _generation > target or (_generation >= target and not _pending), timeout)
+
+
+# === WRITER ===
+def _open(path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    entry = _files[path] = [open(path, "a"), time.time()]
+    return entry
+
+
+def _rotate(path):
+    f, _ = _files.pop(path)
+    f.close()
+    segment = f"{path}.{datetime.utcnow().strftime('%Y%m%d-%H%M%S-%f')}"
+    os.replace(path, segment)
+    with open(segment, "rb") as src, gzip.open(f"{segment}.gz", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(segment)
+    for old in sorted(glob.glob(f"{glob.escape(path)}.*.gz"))[:-KEEP_SEGMENTS]:
+        os.remove(old)
+    metrics.inc("log_sink_rotations_total")
+
+
+def _write_out(batch):
+    for path, lines in batch.items():
+        try:
+            f, opened = _files.get(path) or _open(path)
+            f.write("".join(lines))
+            f.flush()
+            if f.tell() >= ROTATE_BYTES or time.time() - opened >= ROTATE_SECONDS:
+                _rotate(path)
+        except OSError as e:
+            metrics.inc("log_sink_errors_total")
+            print(f"[LogSink] Could not write {path}: {e}")
+            _files.pop(path, None)
+
+
+def _run():
+    global _pending, _pending_bytes, _generation
+    while True:
+        _wake.wait(FLUSH_INTERVAL)
+        _wake.clear()
+        with _lock:
+            batch, _pending, size, _pending_bytes = _pending, {}, _pending_bytes, 0
+        if batch:
+            with metrics.stage("log_flush"):
+                _write_out(batch)
+            metrics.inc("log_sink_bytes_total", size)
+        with _flushed:
+            _generation += 1
+            _flushed.notify_all()
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name="log-sink", daemon=True)
+            _worker.start()
+
+
+atexit.register(flush)
@@ -0,0 +1,219 @@
+# metrics.py
+"""
+In-process metrics for the hot path.
+
+Counters, gauges and fixed-bucket histograms keyed by name and labels.
+Recording is a dict lookup, a bisect and a lock (a few microseconds).
+`serve()` exposes them as Prometheus text on /metrics and as JSON on
+/metrics.json; `dump_json()` writes the same JSON to a file.
+Set METRICS_PORT and/or METRICS_JSON to enable either from any entry point.
+"""
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers sub-millisecond model passes up to 30s+ retry storms.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_server = None
+
+
+def _key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+# === RECORDING ===
+def inc(name, value=1, **labels):
+    key = _key(labels)
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    key = _key(labels)
+    with _lock:
+        _gauges.setdefault(name, {})[key] = value
+
+
+def observe(name, value, **labels):
+    """Add `value` to the histogram `name`; values above the last bucket land in +Inf."""
+    key = _key(labels)
+    index = bisect.bisect_left(BUCKETS, value)
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        hist = series.get(key)
+        if hist is None:
+            hist = series[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        hist[0][index] += 1
+        hist[1] += value
+        hist[2] += 1
+
+
+@contextmanager
+def timer(name, **labels):
+    """Observe the wall time of the block into histogram `name`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def stage(stage_name):
+    """Shorthand for the shared per-stage timing histogram."""
+    return timer("stage_seconds", stage=stage_name)
+
+
+# === EXPORT ===
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(key, extra=None):
+    pairs = list(key) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def snapshot():
+    """Deep copy of every series, safe to serialise while recording continues."""
+    with _lock:
+        return {
+            "counters": {n: dict(s) for n, s in _counters.items()},
+            "gauges": {n: dict(s) for n, s in _gauges.items()},
+            "histograms": {n: {k: [list(h[0]), h[1], h[2]] for k, h in s.items()} for n, s in _histograms.items()},
+        }
+
+
+def drain():
+    """Snapshot counters and histograms and reset them; a worker ships the result to merge()."""
+    with _lock:
+        snap = {
+            "counters": {n: dict(s) for n, s in _counters.items()},
+            "gauges": {n: dict(s) for n, s in _gauges.items()},
+            "histograms": {n: {k: [list(h[0]), h[1], h[2]] for k, h in s.items()} for n, s in _histograms.items()},
+        }
+        _counters.clear()
+        _histograms.clear()
+    return snap
+
+
+def merge(snap, **labels):
+    """Fold a drain() snapshot from another process in, adding `labels` to every series."""
+    extra = tuple(labels.items())
+    with _lock:
+        for name, series in snap["counters"].items():
+            target = _counters.setdefault(name, {})
+            for key, value in series.items():
+                key = tuple(sorted(tuple(key) + extra))
+                target[key] = target.get(key, 0) + value
+        for name, series in snap["gauges"].items():
+            target = _gauges.setdefault(name, {})
+            for key, value in series.items():
+                target[tuple(sorted(tuple(key) + extra))] = value
+        for name, series in snap["histograms"].items():
+            target = _histograms.setdefault(name, {})
+            for key, (buckets, total, count) in series.items():
+                key = tuple(sorted(tuple(key) + extra))
+                hist = target.setdefault(key, [[0] * (len(BUCKETS) + 1), 0.0, 0])
+                hist[0] = [a + b for a, b in zip(hist[0], buckets)]
+                hist[1] += total
+                hist[2] += count
+
+
+def render_prometheus():
+    snap = snapshot()
+    lines = []
+    for name, series in sorted(snap["counters"].items()):
+        lines.append(f"# TYPE {name} counter")
+        lines += [f"{name}{_fmt_labels(k)} {v}" for k, v in series.items()]
+    for name, series in sorted(snap["gauges"].items()):
+        lines.append(f"# TYPE {name} gauge")
+        lines += [f"{name}{_fmt_labels(k)} {v}" for k, v in series.items()]
+    for name, series in sorted(snap["histograms"].items()):
+        lines.append(f"# TYPE {name} histogram")
+        for k, (buckets, total, count) in series.items():
+            cumulative = 0
+            for bound, hits in zip(list(BUCKETS) + ["+Inf"], buckets):
+                cumulative += hits
+                lines.append(f"{name}_bucket{_fmt_labels(k, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_fmt_labels(k)} {total}")
+            lines.append(f"{name}_count{_fmt_labels(k)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def as_json():
+    snap = snapshot()
+
+    def series(entries):
+        return [{"labels": dict(k), "value": v} for k, v in entries.items()]
+
+    return {
+        "timestamp": time.time(),
+        "counters": {n: series(s) for n, s in snap["counters"].items()},
+        "gauges": {n: series(s) for n, s in snap["gauges"].items()},
+        "histograms": {
+            n: [{"labels": dict(k), "buckets": dict(zip(map(str, list(BUCKETS) + ["+Inf"]), b)), "sum": t, "count": c}
+                for k, (b, t, c) in s.items()]
+            for n, s in snap["histograms"].items()
+        },
+    }
+
+
+def dump_json(path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(as_json(), f, indent=2)
+
+
+def _make_handler():
+    from http.server import BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                body, ctype = json.dumps(as_json()).encode(), "application/json"
+            elif self.path.startswith("/metrics"):
+                body, ctype = render_prometheus().encode(), "text/plain; version=0.0.4"
+            else:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(port, host="127.0.0.1"):
+    """Start the exporter on a daemon thread (idempotent); returns the bound port."""
+    global _server
+    if _server is None:
+        from http.server import ThreadingHTTPServer  # only processes that export pay for http.server
+        _server = ThreadingHTTPServer((host, int(port)), _make_handler())
+        threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server.server_port
+
+
+def start_from_env():
+    """Honour METRICS_PORT (HTTP exporter) and METRICS_JSON (dump at exit)."""
+    if os.getenv("METRICS_PORT"):
+        serve(os.getenv("METRICS_PORT"))
+    if os.getenv("METRICS_JSON"):
+        atexit.register(dump_json, os.getenv("METRICS_JSON"))
@@ -1,21 +1,321 @@
-import json, os, statistics
+# performance_tracker.py
+"""
+Structured prediction log and streaming accuracy engine.
 
-LOG_PATH = "performance_log.json"
+Predictions, outcomes and confidence adjustments are appended as JSON lines
+to size-capped segment files under `logs/predictions/`. `AccuracyEngine`
+folds each record into rolling-window hit rates, per-feed counts and
+confidence buckets in O(1), and checkpoints its state together with the log
+position, so a restart only reads records written since the last checkpoint.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
 
-def calculate_accuracy(logs):
-    acc = {}
-    for pair, entries in logs.items():
-        if len(entries) < 5:
+LOG_DIR = "logs/predictions"
+SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+CHECKPOINT_FILE = "checkpoint.json"
+WINDOW = 100                     # rolling hit-rate window per feed
+PENDING_TTL = 7 * 86400          # unresolved predictions older than this are dropped
+
+
+# === APPEND-ONLY LOG ===
+_encode = json.JSONEncoder(separators=(",", ":")).encode  # json.dumps with kwargs builds an encoder per call
+
+
+def _segment_name(index):
+    return f"segment-{index:06d}.jsonl"
+
+
+def list_segments(root=LOG_DIR):
+    if not os.path.isdir(root):
+        return []
+    return sorted(int(n[8:14]) for n in os.listdir(root) if n.startswith("segment-") and n.endswith(".jsonl"))
+
+
+class PredictionLog:
+    """Thread-safe appender that rolls to a new segment past SEGMENT_MAX_BYTES."""
+
+    def __init__(self, root=LOG_DIR, max_bytes=SEGMENT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._file = None
+        self._index = None
+
+    def _open(self):
+        os.makedirs(self.root, exist_ok=True)
+        segments = list_segments(self.root)
+        self._index = segments[-1] if segments else 1
+        self._file = open(os.path.join(self.root, _segment_name(self._index)), "a")
+
+    def append(self, record):
+        self.extend([record])
+
+    def extend(self, records):
+        """Append many records with one flush at the end."""
+        with self._lock:
+            if self._file is None:
+                self._open()
+            for record in records:
+                line = _encode(record) + "\n"
+                if self._file.tell() + len(line) > self.max_bytes and self._file.tell() > 0:
+                    self._file.close()
+                    self._index += 1
+                    self._file = open(os.path.join(self.root, _segment_name(self._index)), "a")
+                self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+
+def iter_records(root=LOG_DIR, position=(1, 0)):
+    """Yield (record, position_after) from `position` on; a torn last line is left for later."""
+    segment, offset = position
+    for index in list_segments(root):
+        if index < segment:
             continue
-        # dummy accuracy = % of “UP” predictions (placeholder metric)
-        ups = sum(1 for e in entries if e["direction"] == "UP")
-        acc[pair] = ups / len(entries)
-    return acc
-
-if os.path.exists(LOG_PATH):
-    with open(LOG_PATH, "r") as f:
-        logs = json.load(f)
-        acc = calculate_accuracy(logs)
-        print(json.dumps(acc, indent=2))
-else:
-    print("No logs yet.")
+        start = offset if index == segment else 0
+        with open(os.path.join(root, _segment_name(index)), "rb") as f:
+            f.seek(start)
+            for raw in iter(f.readline, b""):
+                if not raw.endswith(b"\n"):
+                    return
+                start += len(raw)
+                yield json.loads(raw), (index, start)
+
+
+_log = None
+
+
+def default_log():
+    global _log
+    if _log is None:
+        _log = PredictionLog()
+    return _log
+
+
+def use_log(log):
+    """Send this process's record_* calls to `log` (anything with `append`/`extend`)."""
+    global _log
+    _log = log
+
+
+def record_prediction(payload, epoch, symbol=None, interval=None, log=None):
+    """`epoch` is the unix start of the epoch the prediction is for."""
+    (log or default_log()).append({
+        "type": "prediction",
+        "feed": payload["feed"],
+        "epoch": int(epoch),
+        "direction": payload["direction"],
+        "confidence": payload["confidence"],
+        "wallet": payload.get("wallet"),
+        "symbol": symbol,
+        "interval": interval,
+        "ts": time.time(),
+    })
+
+
+def record_outcome(feed, epoch, direction, log=None):
+    (log or default_log()).append({
+        "type": "outcome", "feed": feed, "epoch": int(epoch), "direction": direction, "ts": time.time(),
+    })
+
+
+def record_adjustment(feed, confidence, log=None):
+    (log or default_log()).append({
+        "type": "adjustment", "feed": feed, "confidence": confidence, "ts": time.time(),
+    })
+
+
+# === STREAMING ACCURACY ===
+def confidence_bucket(confidence):
+    return f"{min(int(confidence * 10), 9) / 10:.1f}"
+
+
+class FeedStats:
+    def __init__(self, window=WINDOW):
+        self.predictions = 0
+        self.resolved = 0
+        self.hits = 0
+        self.recent = deque(maxlen=window)
+        self.recent_hits = 0
+        self.buckets = {}  # bucket -> [resolved, hits]
+
+    def add_result(self, hit, confidence):
+        if len(self.recent) == self.recent.maxlen:
+            self.recent_hits -= self.recent[0]
+        self.recent.append(int(hit))
+        self.recent_hits += int(hit)
+        self.resolved += 1
+        self.hits += int(hit)
+        bucket = self.buckets.setdefault(confidence_bucket(confidence), [0, 0])
+        bucket[0] += 1
+        bucket[1] += int(hit)
+
+    def summary(self):
+        return {
+            "predictions": self.predictions,
+            "resolved": self.resolved,
+            "accuracy": round(self.hits / self.resolved, 4) if self.resolved else None,
+            "rolling_accuracy": round(self.recent_hits / len(self.recent), 4) if self.recent else None,
+            "confidence_buckets": {
+                b: {"resolved": n, "accuracy": round(h / n, 4)} for b, (n, h) in sorted(self.buckets.items())
+            },
+        }
+
+    def to_state(self):
+        return {"predictions": self.predictions, "resolved": self.resolved, "hits": self.hits,
+                "recent": list(self.recent), "buckets": self.buckets}
+
+    @classmethod
+    def from_state(cls, state, window=WINDOW):
+        stats = cls(window)
+        stats.predictions, stats.resolved, stats.hits = state["predictions"], state["resolved"], state["hits"]
+        stats.recent.extend(state["recent"])
+        stats.recent_hits = sum(stats.recent)
+        stats.buckets = state["buckets"]
+        return stats
+
+
+class AccuracyEngine:
+    checkpoint_file = CHECKPOINT_FILE
+
+    def __init__(self, root=LOG_DIR, window=WINDOW):
+        self.root = root
+        self.window = window
+        self.position = (1, 0)
+        self.feeds = {}
+        self.pending = {}  # "wallet|feed|epoch" -> prediction record
+        self._wallets = {}  # "feed|epoch" -> wallets with a pending prediction, as outcomes carry no wallet
+
+    def _stats(self, feed):
+        if feed not in self.feeds:
+            self.feeds[feed] = FeedStats(self.window)
+        return self.feeds[feed]
+
+    def _set_pending(self, pending):
+        self.pending, self._wallets = pending, {}
+        for record in pending.values():
+            self._wallets.setdefault(f"{record.get('feed')}|{record.get('epoch')}", set()).add(record.get("wallet") or "")
+
+    def apply(self, record):
+        """Fold one record into the running state in O(1) per wallet."""
+        kind = record.get("type")
+        slot = f"{record.get('feed')}|{record.get('epoch')}"
+        if kind == "prediction":
+            wallet = record.get("wallet") or ""
+            self._stats(record["feed"]).predictions += 1
+            self.pending[f"{wallet}|{slot}"] = record
+            self._wallets.setdefault(slot, set()).add(wallet)
+        elif kind == "outcome":
+            for wallet in self._wallets.pop(slot, ()):
+                prediction = self.pending.pop(f"{wallet}|{slot}", None)
+                if prediction:
+                    self.on_result(record["feed"], prediction["direction"] == record["direction"],
+                                   prediction["confidence"])
+
+    def on_result(self, feed, hit, confidence):
+        """Called once per resolved prediction; subclasses extend this to fit their own models."""
+        self._stats(feed).add_result(hit, confidence)
+
+    def catch_up(self):
+        """Apply every record written since the current position; returns how many."""
+        applied = 0
+        for record, position in iter_records(self.root, self.position):
+            self.apply(record)
+            self.position = position
+            applied += 1
+        cutoff = time.time() - PENDING_TTL
+        self._set_pending({k: r for k, r in self.pending.items() if r.get("ts", 0) >= cutoff})
+        return applied
+
+    def summary(self):
+        return {feed: stats.summary() for feed, stats in sorted(self.feeds.items())}
+
+    # --- checkpoints ---
+    def to_state(self):
+        return {
+            "position": list(self.position),
+            "feeds": {feed: stats.to_state() for feed, stats in self.feeds.items()},
+            "pending": self.pending,
+        }
+
+    def load_state(self, state):
+        self.position = tuple(state["position"])
+        self.feeds = {feed: FeedStats.from_state(s, self.window) for feed, s in state["feeds"].items()}
+        # Re-key from the records themselves: older checkpoints keyed pending by "feed|epoch".
+        self._set_pending({f"{r.get('wallet') or ''}|{r.get('feed')}|{r.get('epoch')}": r
+                           for r in state["pending"].values()})
+
+    def save_checkpoint(self):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, self.checkpoint_file)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self.to_state(), f)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def from_checkpoint(cls, root=LOG_DIR, window=WINDOW):
+        engine = cls(root, window)
+        path = os.path.join(root, cls.checkpoint_file)
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                engine.load_state(json.load(f))
+        return engine
+
+
+# === OUTCOMES FROM CANDLES ===
+def resolve_outcomes(engine, now=None, log=None):
+    """
+    Record outcomes for pending predictions whose epoch has closed, using the
+    local candle store: an epoch went "up" if its candle closed above its open.
+    """
+    import numpy as np
+    import candle_store
+
+    now = time.time() if now is None else now
+    resolved = 0
+    refreshed, seen = set(), set()
+    for prediction in list(engine.pending.values()):
+        interval = prediction.get("interval")
+        symbol = prediction.get("symbol")
+        slot = (prediction["feed"], prediction["epoch"])
+        if not symbol or not interval or prediction["epoch"] + interval > now or slot in seen:
+            continue
+        seen.add(slot)  # one outcome resolves every wallet's prediction for the slot
+        store = candle_store.store_for_feed({"symbol": symbol, "interval": f"{interval}s"})
+        if store.path not in refreshed:
+            store.refresh()  # the predictor, usually another process, appends the candles
+            refreshed.add(store.path)
+        times = store.column("open_time")
+        i = int(np.searchsorted(times, prediction["epoch"] * 1000))
+        if i >= len(times) or times[i] != prediction["epoch"] * 1000:
+            continue
+        direction = "up" if store.column("close")[i] > store.column("open")[i] else "down"
+        record_outcome(prediction["feed"], prediction["epoch"], direction, log)
+        resolved += 1
+    return resolved
+
+
+def main():
+    engine = AccuracyEngine.from_checkpoint()
+    engine.catch_up()
+    if resolve_outcomes(engine):
+        default_log().close()
+        engine.catch_up()
+    engine.save_checkpoint()
+    if engine.feeds:
+        print(json.dumps(engine.summary(), indent=2))
+    else:
+        print("No logs yet.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# prediction_engine.py
+"""
+Vectorized batch prediction engine.
+
+All feeds of a round are evaluated together: closes are stacked into a
+feeds x lookback matrix, features are computed column-wise with NumPy and a
+pluggable model maps them to P(up) per feed. Payloads keep the shape that
+`agent_predictoor.submit_prediction` expects.
+"""
+import warnings
+from datetime import datetime
+
+import numpy as np
+
+LOOKBACK = 64
+SHORT_WINDOW = 3
+MAX_CONFIDENCE = 0.95
+
+MODELS = {}
+
+
+def register_model(name):
+    """Decorator adding `fn(features) -> P(up) array` to the model registry."""
+    def wrap(fn):
+        MODELS[name] = fn
+        return fn
+    return wrap
+
+
+# === FEATURES ===
+def close_matrix(windows, lookback=LOOKBACK):
+    """Right-align each feed's closes into a feeds x lookback matrix, NaN-padded."""
+    closes = np.full((len(windows), lookback), np.nan)
+    for i, window in enumerate(windows):
+        window = np.asarray(window, dtype=np.float64)[-lookback:]
+        if len(window):
+            closes[i, -len(window):] = window
+    return closes
+
+
+def compute_features(closes):
+    """Per-feed features as 1-D arrays; rows without enough history come out as 0."""
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        log_prices = np.log(closes)
+        returns = np.diff(log_prices, axis=1)
+        counts = np.sum(~np.isnan(returns), axis=1)
+        volatility = np.nanstd(returns, axis=1)
+        momentum_short = np.nansum(returns[:, -SHORT_WINDOW:], axis=1)
+        momentum_long = np.nansum(returns, axis=1)
+        deviation = log_prices[:, -1] - np.nanmean(log_prices, axis=1)
+
+        features = {
+            "volatility": volatility,
+            "z_short": momentum_short / (volatility * np.sqrt(min(SHORT_WINDOW, closes.shape[1] - 1))),
+            "z_long": momentum_long / (volatility * np.sqrt(counts)),
+            "z_deviation": deviation / (volatility * np.sqrt(counts)),
+        }
+    enough = counts >= 2
+    for name, values in features.items():
+        features[name] = np.where(enough & np.isfinite(values), values, 0.0)
+    features["enough"] = enough
+    return features
+
+
+# === MODELS ===
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+@register_model("momentum")
+def momentum_model(features):
+    return _sigmoid(0.8 * features["z_short"] + 0.4 * features["z_long"])
+
+
+@register_model("mean_reversion")
+def mean_reversion_model(features):
+    return _sigmoid(-features["z_deviation"])
+
+
+# === BATCH PREDICTION ===
+def predict_proba(closes, model="momentum"):
+    """P(up) per feed; feeds without history stay at 0.5."""
+    features = compute_features(closes)
+    prob_up = MODELS[model](features)
+    return np.where(features["enough"], prob_up, 0.5)
+
+
+def direction_confidence(prob_up):
+    """(predicts up?, confidence = P(predicted direction)) arrays from P(up)."""
+    up = prob_up >= 0.5
+    return up, np.clip(np.where(up, prob_up, 1.0 - prob_up), 0.5, MAX_CONFIDENCE).round(2)
+
+
+def build_payloads(feeds, prob_up, wallet_address, timestamp=None):
+    """Turn P(up) into the relayer payloads."""
+    timestamp = timestamp or datetime.utcnow().isoformat()
+    up, confidence = direction_confidence(prob_up)
+    return [
+        {
+            "feed": feed["name"],
+            "exchange": feed.get("exchange", feed.get("source")),
+            "direction": "up" if up[i] else "down",
+            "confidence": float(confidence[i]),
+            "wallet": wallet_address,
+            "timestamp": timestamp,
+        }
+        for i, feed in enumerate(feeds)
+    ]
+
+
+def predict_batch(feeds, windows, wallet_address, model="momentum", lookback=LOOKBACK):
+    """One payload per feed from its recent closes (`windows[i]` belongs to `feeds[i]`)."""
+    prob_up = predict_proba(close_matrix(windows, lookback), model)
+    return build_payloads(feeds, prob_up, wallet_address)
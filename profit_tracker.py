@@ -1,31 +1,25 @@
 # profit_tracker.py
-import os, json, time, requests
-from datetime import datetime, timedelta
-
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
-WALLET_ADDRESS = os.getenv("WALLET_ADDRESS")
+import os, json, time, struct
+import config
+import http_client
+import metrics
+import telegram_notify
+from datetime import date, datetime, timedelta
 
 # Ocean or Sapphire block explorer API for balance tracking
-EXPLORER_API = f"https://api.sapphire.oasis.io/api/v1/accounts/{WALLET_ADDRESS}"
+SAPPHIRE_API = os.getenv("SAPPHIRE_API", "https://api.sapphire.oasis.io")
+
+def explorer_url():
+    return f"{SAPPHIRE_API}/api/v1/accounts/{config.get().wallet.address}"
 
 def notify(msg: str):
-    """Send Telegram message or print fallback."""
-    if TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID:
-        try:
-            requests.post(
-                f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage",
-                json={"chat_id": TELEGRAM_CHAT_ID, "text": msg},
-                timeout=10
-            )
-        except Exception as e:
-            print(f"[ProfitTracker] Telegram notify failed: {e}")
-    print(msg)
+    """Print and queue a Telegram message."""
+    telegram_notify.send(msg)
 
 def get_balance():
     """Fetch current wallet balance from Sapphire explorer API."""
     try:
-        r = requests.get(EXPLORER_API, timeout=10)
+        r = http_client.get(explorer_url(), timeout=10, lane="housekeeping")
         data = r.json()
         balance = int(data.get("balance", 0)) / 1e18  # convert from wei
         return balance
@@ -33,36 +27,139 @@ def get_balance():
         notify(f"[ProfitTracker] ❌ Error fetching balance: {e}")
         return None
 
+# === BALANCE HISTORY STORE ===
+# Fixed-width records (day number, unix time, balance, profit) appended in
+# time order, so the last entry and any date range are found with a few
+# seeks instead of loading the whole history. Weekly/monthly/all-time
+# rollups are updated as each entry arrives.
+LOG_FILE = "profit_log.bin"
+ROLLUP_FILE = "profit_rollups.json"
+LEGACY_FILE = "profit_log.json"
+RECORD = struct.Struct("<i4xddd")
+EPOCH_DAY = date(1970, 1, 1)
+
+def _day_number(day):
+    return (day - EPOCH_DAY).days
+
+def _period_keys(day):
+    iso = day.isocalendar()
+    return {"weekly": f"{iso[0]}-W{iso[1]:02d}", "monthly": day.strftime("%Y-%m")}
+
+class BalanceStore:
+    def __init__(self, path=LOG_FILE, rollup_path=ROLLUP_FILE):
+        self.path = path
+        self.rollup_path = rollup_path
+        self.rollups = {"weekly": {}, "monthly": {}, "all_time": {}}
+        if os.path.exists(rollup_path):
+            with open(rollup_path, "r") as f:
+                self.rollups = json.load(f)
+
+    def __len__(self):
+        return os.path.getsize(self.path) // RECORD.size if os.path.exists(self.path) else 0
+
+    def _read(self, f, index):
+        f.seek(index * RECORD.size)
+        day, ts, balance, profit = RECORD.unpack(f.read(RECORD.size))
+        return {"date": (EPOCH_DAY + timedelta(days=day)).isoformat(), "ts": ts, "balance": balance, "profit": profit}
+
+    def last(self):
+        count = len(self)
+        if not count:
+            return None
+        with open(self.path, "rb") as f:
+            return self._read(f, count - 1)
+
+    def append(self, day, balance, ts=None):
+        """Append today's balance in O(1); returns the stored entry."""
+        last = self.last()
+        profit = balance - last["balance"] if last else 0.0
+        ts = time.time() if ts is None else ts
+        with open(self.path, "ab") as f:
+            f.write(RECORD.pack(_day_number(day), ts, balance, profit))
+        self._roll_up(day, balance, profit)
+        return {"date": day.isoformat(), "ts": ts, "balance": balance, "profit": profit}
+
+    def _roll_up(self, day, balance, profit):
+        periods = [self.rollups[name].setdefault(key, {}) for name, key in _period_keys(day).items()]
+        periods.append(self.rollups["all_time"])
+        for agg in periods:
+            if not agg:
+                agg.update({"open_balance": balance - profit, "pnl": 0.0, "peak": balance,
+                            "max_drawdown": 0.0, "entries": 0})
+            agg["pnl"] += profit
+            agg["close_balance"] = balance
+            agg["peak"] = max(agg["peak"], balance)
+            agg["drawdown"] = agg["peak"] - balance
+            agg["max_drawdown"] = max(agg["max_drawdown"], agg["drawdown"])
+            agg["entries"] += 1
+        tmp = f"{self.rollup_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.rollups, f, indent=2)
+        os.replace(tmp, self.rollup_path)
+
+    def _lower_bound(self, f, day_number):
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            f.seek(mid * RECORD.size)
+            if RECORD.unpack(f.read(RECORD.size))[0] < day_number:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def range(self, start, end):
+        """Entries with start <= date <= end, located by binary search."""
+        if not len(self):
+            return []
+        with open(self.path, "rb") as f:
+            first = self._lower_bound(f, _day_number(start))
+            stop = self._lower_bound(f, _day_number(end) + 1)
+            f.seek(first * RECORD.size)
+            raw = f.read((stop - first) * RECORD.size)
+        return [
+            {"date": (EPOCH_DAY + timedelta(days=d)).isoformat(), "ts": ts, "balance": b, "profit": p}
+            for d, ts, b, p in RECORD.iter_unpack(raw)
+        ]
+
+    def pnl(self, start, end):
+        return sum(e["profit"] for e in self.range(start, end))
+
+    def import_legacy(self, legacy_path=LEGACY_FILE):
+        """One-time migration of the old JSON list into the binary store."""
+        if len(self) or not os.path.exists(legacy_path):
+            return 0
+        with open(legacy_path, "r") as f:
+            history = json.load(f)
+        for entry in history:
+            self.append(date.fromisoformat(entry["date"]), entry["balance"])
+        return len(history)
+
 def track_profit():
-    """Compare today’s and yesterday’s wallet balances."""
-    today = datetime.utcnow().strftime("%Y-%m-%d")
-    last_balance = 0
-    prev_file = "profit_log.json"
+    """Append today's wallet balance and report 24h, weekly and monthly change."""
+    today = datetime.utcnow().date()
 
     new_balance = get_balance()
     if new_balance is None:
         return
 
-    if os.path.exists(prev_file):
-        with open(prev_file, "r") as f:
-            history = json.load(f)
-            last_entry = history[-1] if history else {}
-            last_balance = last_entry.get("balance", 0)
-    else:
-        history = []
-
-    profit = new_balance - last_balance
-    entry = {"date": today, "balance": new_balance, "profit": profit}
-
-    history.append(entry)
-    with open(prev_file, "w") as f:
-        json.dump(history, f, indent=2)
+    store = BalanceStore()
+    store.import_legacy()
+    entry = store.append(today, new_balance)
+    keys = _period_keys(today)
+    week = store.rollups["weekly"][keys["weekly"]]
+    month = store.rollups["monthly"][keys["monthly"]]
+    all_time = store.rollups["all_time"]
 
     msg = f"📊 *Daily Profit Summary*\n" \
-          f"Date: {today}\n" \
+          f"Date: {today.isoformat()}\n" \
           f"Current Balance: {new_balance:.4f} OCEAN\n" \
-          f"Change (24h): {profit:+.4f} OCEAN\n"
+          f"Change (24h): {entry['profit']:+.4f} OCEAN\n" \
+          f"Week {keys['weekly']}: {week['pnl']:+.4f} OCEAN\n" \
+          f"Month {keys['monthly']}: {month['pnl']:+.4f} OCEAN\n" \
+          f"Drawdown: {all_time['drawdown']:.4f} OCEAN (max {all_time['max_drawdown']:.4f})\n"
     notify(msg)
 
 if __name__ == "__main__":
+    metrics.start_from_env()
     track_profit()
@@ -0,0 +1,105 @@
+# relayer_client.py
+"""
+Batched submission to the Gelato relayer.
+
+A round's payloads are packed into one multicall-style POST,
+`{"batch": [payload, ...]}`, answered with `{"results": [{"ok": bool, ...}]}`
+in the same order. Relayers that reject batches are remembered for the rest
+of the process and served one POST per payload instead.
+
+Callers may pass one idempotency key per payload; they travel in the
+envelope as `"keys"` (parallel to `"batch"`) and must be the same keys the
+per-payload fallback sends as `Idempotency-Key`. A batch whose answer is
+lost (timeout, reset) may still have landed, and its items are resent one
+by one: the shared keys let the relayer apply each prediction once.
+"""
+import threading
+from collections import deque
+
+import http_client
+import metrics
+
+BATCH_MAX = 100
+# Status codes meaning "this relayer does not understand batches". A 413
+# splits the chunk instead, and a 400/422 only fails the chunk that got it.
+REJECT_STATUS = {404, 405, 415, 501}
+
+_lock = threading.Lock()
+_unsupported = set()
+
+
+def supports_batches(relayer):
+    with _lock:
+        return relayer not in _unsupported
+
+
+def mark_unsupported(relayer):
+    with _lock:
+        _unsupported.add(relayer)
+
+
+def submit_batch(relayer, payloads, deadline=None, on_retry=None, headers=None, keys=None):
+    """
+    POST `payloads` as batches of up to BATCH_MAX, with their per-item
+    idempotency `keys` when given.
+
+    Returns one `{"ok": bool, ...}` result per payload, or None when the
+    relayer rejects batches (callers then fall back to per-payload sends).
+    A chunk answered 413 is split in half and resent; one refused as a bad
+    request fails its items without giving up on batches. Transport
+    failures mark every payload of the affected chunk as failed; they may
+    have landed, so only resend them under the same keys.
+    """
+    if not supports_batches(relayer):
+        return None
+    results = []
+    chunks = deque((start, min(start + BATCH_MAX, len(payloads))) for start in range(0, len(payloads), BATCH_MAX))
+    while chunks:
+        start, end = chunks.popleft()
+        chunk = payloads[start:end]
+        body = {"batch": chunk}
+        if keys:
+            body["keys"] = keys[start:end]
+        try:
+            with metrics.stage("batch_submission"):
+                # Idempotency keys are per chunk: each chunk is its own request.
+                r = http_client.post(relayer, json=body, deadline=deadline, on_retry=on_retry, check=False,
+                                     headers=headers and {k: f"{v}-{start}-{end}" for k, v in headers.items()},
+                                     lane="submit")
+        except Exception as e:
+            results += [{"ok": False, "error": str(e)}] * len(chunk)
+            continue
+        if r.status_code in REJECT_STATUS:
+            mark_unsupported(relayer)
+            return None if not results else results + [{"ok": False, "error": "batch rejected"}] * (len(payloads) - len(results))
+        if r.status_code == 413 and len(chunk) > 1:
+            middle = (start + end) // 2
+            chunks.extendleft([(middle, end), (start, middle)])
+            metrics.inc("batch_splits_total")
+            continue
+        try:
+            r.raise_for_status()
+            items = r.json().get("results")
+        except Exception as e:
+            results += [{"ok": False, "error": str(e)}] * len(chunk)
+            continue
+        if not isinstance(items, list) or len(items) != len(chunk):
+            # A relayer that answers but ignores the batch envelope can't be trusted with it.
+            mark_unsupported(relayer)
+            return None if not results else results + [{"ok": False, "error": "batch ignored"}] * (len(payloads) - len(results))
+        results += [item if isinstance(item, dict) else {"ok": bool(item)} for item in items]
+    metrics.inc("batch_items_total", len(results))
+    return results
+
+
+def submit_many(relayer, payloads, send_one, deadline=None, on_retry=None, headers=None, keys=None):
+    """
+    Submit all payloads, batched when the relayer allows it. Items the batch
+    reports as failed, or every item if batches are rejected, go through
+    `send_one(payload) -> bool`, which must send the payload's key from `keys`.
+    Returns a list of booleans.
+    """
+    results = submit_batch(relayer, payloads, deadline, on_retry, headers, keys) if len(payloads) > 1 else None
+    if results is None:
+        return [bool(send_one(p)) for p in payloads]
+    return [True if res.get("ok") else bool(send_one(p)) for p, res in zip(payloads, results)]
@@ -0,0 +1,109 @@
+# scheduler.py
+"""
+Epoch-aligned deadline scheduler.
+
+Each task fires `lead_seconds` before its own epoch boundary (a multiple of
+its interval since the unix epoch). Fire times are computed from absolute
+boundaries, so processing time never accumulates as drift. All tasks share
+one heap and one thread, which sleeps until the earliest fire time.
+"""
+import heapq
+import itertools
+import re
+import threading
+import time
+
+import metrics
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_interval(value):
+    """'5m' -> 300, '1h' -> 3600, plain numbers are seconds."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.fullmatch(r"\s*(\d+)\s*([smhd]?)\s*", str(value))
+    if not match:
+        raise ValueError(f"Invalid interval: {value!r}")
+    return int(match.group(1)) * _UNITS[match.group(2) or "s"]
+
+
+def feed_interval_seconds(feed, default=1800):
+    """Epoch length of a feed from `interval` ('5m') or `interval_minutes`."""
+    if feed.get("interval"):
+        return parse_interval(feed["interval"])
+    if feed.get("interval_minutes"):
+        return int(feed["interval_minutes"] * 60)
+    return default
+
+
+def next_boundary(interval, now=None):
+    """First epoch boundary strictly after `now`."""
+    now = time.time() if now is None else now
+    return (int(now // interval) + 1) * interval
+
+
+class EpochScheduler:
+    def __init__(self, lead_seconds=0, on_miss=None, clock=time.time):
+        self.lead_seconds = lead_seconds
+        self.on_miss = on_miss
+        self.clock = clock
+        self._heap = []
+        self._seq = itertools.count()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._lock = threading.RLock()   # add() may be called from other threads while run() is going
+
+    def add(self, name, interval, callback, lead_seconds=None):
+        """Fire `callback(boundary)` before every epoch boundary of `interval` seconds."""
+        interval = parse_interval(interval)
+        lead = self.lead_seconds if lead_seconds is None else lead_seconds
+        with self._lock:
+            self._push(name, interval, lead, callback, next_boundary(interval, self.clock() + lead))
+        self._wakeup.set()
+
+    def _push(self, name, interval, lead, callback, boundary):
+        heapq.heappush(self._heap, (boundary - lead, next(self._seq), name, interval, lead, callback, boundary))
+
+    def _miss(self, name, boundary, late_by):
+        metrics.inc("deadline_misses_total", task=name)
+        if self.on_miss:
+            self.on_miss(name, boundary, late_by)
+
+    def run_due(self):
+        """Run every task whose fire time has passed; returns seconds until the next one."""
+        while True:
+            with self._lock:
+                if not self._heap or self._heap[0][0] > self.clock():
+                    break
+                _, _, name, interval, lead, callback, boundary = heapq.heappop(self._heap)
+            now = self.clock()
+            if now >= boundary:
+                self._miss(name, boundary, now - boundary)
+            else:
+                metrics.observe("schedule_slack_seconds", boundary - now, task=name)
+                callback(boundary)
+                finished = self.clock()
+                if finished > boundary:
+                    self._miss(name, boundary, finished - boundary)
+            # Re-anchor on the absolute grid: skipped boundaries are misses, not drift.
+            following = next_boundary(interval, max(boundary, self.clock()))
+            skipped = (following - boundary) // interval - 1
+            for k in range(1, int(skipped) + 1):
+                self._miss(name, boundary + k * interval, self.clock() - (boundary + k * interval))
+            with self._lock:
+                self._push(name, interval, lead, callback, following)
+        with self._lock:
+            return max(0.0, self._heap[0][0] - self.clock()) if self._heap else None
+
+    def run(self):
+        """Block, firing tasks on schedule, until stop() is called."""
+        while not self._stopped:
+            # Clear first: an add() landing while run_due() works must still wake the wait.
+            self._wakeup.clear()
+            delay = self.run_due()
+            self._wakeup.wait(timeout=delay)
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
@@ -0,0 +1,385 @@
+# sharding.py
+"""
+Sharded multi-wallet execution.
+
+Feeds are spread over long-lived worker processes by consistent hashing on
+the feed name, so each feed's candle store is written by exactly one
+process and adding a feed (or a worker) only moves the feeds that land on
+the new ring points. Wallets follow their feeds: a shard is
+`{feed name: [wallet addresses staking on it]}`.
+
+Per round the coordinator sends `(interval, boundary)` to every worker with
+feeds on that interval. A worker runs the model once per feed
+(`prepare_predictions`, pipelined ahead like agent_predictoor) and submits
+one copy per wallet through `run_round`, one thread per wallet. Workers
+reply with per-wallet results, a metrics delta and the prediction records
+they produced; the coordinator merges all three, so it is the only process
+appending to the prediction log (segment rolls stay in order for its
+readers), records per-wallet metrics and sends one Telegram digest per round.
+
+Config reloads that add feeds, wallets or workers rebalance the ring; dead
+workers are restarted with their shard before the next round.
+
+    python sharding.py
+"""
+import bisect
+import hashlib
+import itertools
+import os
+import threading
+import time
+from datetime import datetime
+
+import config
+import metrics
+import performance_tracker
+import scheduler
+import telegram_notify
+
+# Seconds past the submit deadline the coordinator waits for late replies.
+REPLY_GRACE = 5
+
+
+def notify(msg, key=None):
+    telegram_notify.send(msg, key=key)
+
+
+# === CONSISTENT HASHING ===
+def _point(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """`virtual_nodes` points per node; a key belongs to the first point clockwise of its hash."""
+
+    def __init__(self, nodes, virtual_nodes=64):
+        self._points = sorted((_point(f"{node}#{i}"), node) for node in nodes for i in range(virtual_nodes))
+        self._hashes = [h for h, _ in self._points]
+
+    def node_for(self, key):
+        if not self._points:
+            raise LookupError("empty hash ring")
+        index = bisect.bisect(self._hashes, _point(key)) % len(self._points)
+        return self._points[index][1]
+
+
+def worker_count(cfg):
+    return cfg.sharding.workers or os.cpu_count() or 1
+
+
+def plan(cfg, workers=None):
+    """`{worker index: {feed name: [wallet addresses]}}`; feeds no wallet stakes on are left out."""
+    workers = worker_count(cfg) if workers is None else workers
+    ring = HashRing(range(workers), cfg.sharding.virtual_nodes)
+    shards = {index: {} for index in range(workers)}
+    for feed in cfg.feeds:
+        name = feed["name"]
+        wallets = [w.address for w in cfg.wallets if w.feeds is None or name in w.feeds]
+        if wallets:
+            shards[ring.node_for(name)][name] = wallets
+    return shards
+
+
+# === WORKER ===
+class _RecordBuffer:
+    """Stand-in prediction log for workers: records wait for the next reply to the coordinator."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = []
+
+    def append(self, record):
+        self.extend([record])
+
+    def extend(self, records):
+        with self._lock:
+            self._records.extend(records)
+
+    def close(self):
+        pass
+
+    def take(self):
+        with self._lock:
+            records, self._records = self._records, []
+        return records
+
+
+def _wallet_round(agent, address, feeds, payloads):
+    names = {f["name"] for f in feeds}
+    own = [dict(p, wallet=address) for p in payloads if p["feed"] in names]
+    return agent.run_round(feeds, own)
+
+
+def _work_round(agent, shard, interval, boundary):
+    """Predict the shard's feeds for `interval` once, then submit them for every wallet in parallel."""
+    cfg = config.get()
+    feeds = [f for f in cfg.feeds_for(interval) if f["name"] in shard]
+    if not feeds:
+        return {}
+    payloads = agent.take_prepared(interval, boundary) if cfg.predictoor.pipelined else None
+    payloads = agent.refresh_prepared(feeds, payloads) if payloads is not None else agent.prepare_predictions(feeds)
+    by_wallet = {}
+    for feed in feeds:
+        for address in shard[feed["name"]]:
+            by_wallet.setdefault(address, []).append(feed)
+    threads, results = [], {}
+
+    def run(address, wallet_feeds):
+        try:
+            results[address] = _wallet_round(agent, address, wallet_feeds, payloads)
+        except Exception as e:
+            results[address] = {"feeds": {}, "counts": {"error": len(wallet_feeds)}, "seconds": 0, "error": str(e)}
+
+    for address, wallet_feeds in by_wallet.items():
+        thread = threading.Thread(target=run, args=(address, wallet_feeds), name=f"wallet-{address[:10]}")
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def worker_main(index, inbox, outbox):
+    """Process entry point: apply `assign`, `prepare` and `round` messages until `stop`."""
+    # The coordinator owns Telegram; workers only print.
+    telegram_notify.BOT_TOKEN = None
+    records = _RecordBuffer()
+    performance_tracker.use_log(records)
+    import agent_predictoor as agent
+    if index == 0:
+        agent.resume_submissions()  # the journal is shared; one worker resumes it
+    shard = {}
+    while True:
+        message = inbox.get()
+        kind = message[0]
+        if kind == "stop":
+            return
+        if kind == "assign":
+            shard = message[1]
+            continue
+        _, interval, boundary, round_id = message
+        try:
+            if kind == "prepare":
+                feeds = [f for f in config.get().feeds_for(interval) if f["name"] in shard]
+                if feeds:
+                    agent.prepare_ahead(interval, feeds, boundary)
+                continue
+            wallets = _work_round(agent, shard, interval, boundary)
+            outbox.put((round_id, index, wallets, None, metrics.drain(), records.take()))
+            if index == 0:
+                agent.compact_journal()  # after the reply, so it never delays a round
+        except Exception as e:
+            if kind == "round":
+                outbox.put((round_id, index, {}, str(e), metrics.drain(), records.take()))
+
+
+# === COORDINATOR ===
+class Coordinator:
+    """Owns the worker processes, their shards and the per-round fan-out and aggregation."""
+
+    def __init__(self):
+        import multiprocessing
+        self._context = multiprocessing.get_context("spawn")
+        self._outbox = self._context.Queue()
+        self._lock = threading.RLock()
+        self._workers = {}       # index -> (process, inbox)
+        self._shards = {}
+        self._rounds = {}        # round id -> {worker index: reply}
+        self._replies = threading.Condition()
+        self._round_ids = itertools.count(1)
+        threading.Thread(target=self._collect, name="shard-replies", daemon=True).start()
+
+    # --- workers ---
+    def _start(self, index):
+        inbox = self._context.Queue()
+        process = self._context.Process(target=worker_main, args=(index, inbox, self._outbox),
+                                        name=f"shard-{index}", daemon=True)
+        process.start()
+        self._workers[index] = (process, inbox)
+        inbox.put(("assign", self._shards.get(index, {})))
+
+    def _stop(self, index):
+        process, inbox = self._workers.pop(index)
+        inbox.put(("stop",))
+        process.join(timeout=10)
+        if process.is_alive():
+            process.terminate()
+
+    def ensure_alive(self):
+        """Restart any worker that died, handing it its shard again."""
+        with self._lock:
+            for index, (process, _) in list(self._workers.items()):
+                if not process.is_alive():
+                    metrics.inc("shard_worker_restarts_total", worker=str(index))
+                    notify(f"❌ Shard worker {index} exited ({process.exitcode}), restarting",
+                           key=f"shard-restart:{index}")
+                    self._workers.pop(index)
+                    self._start(index)
+
+    def rebalance(self, cfg=None):
+        """Recompute the shards from config, resize the pool and send changed shards out."""
+        cfg = cfg or config.get()
+        shards = plan(cfg)
+        with self._lock:
+            owner = {name: i for i, shard in self._shards.items() for name in shard}
+            moved = sum(1 for i, shard in shards.items() for name in shard if owner.get(name, i) != i)
+            for index in [i for i in self._workers if i not in shards]:
+                self._stop(index)
+            old, self._shards = self._shards, shards
+            for index, shard in shards.items():
+                if index not in self._workers:
+                    self._start(index)
+                elif old.get(index) != shard:
+                    self._workers[index][1].put(("assign", shard))
+            for index, shard in shards.items():
+                metrics.set_gauge("shard_feeds", len(shard), worker=str(index))
+        feeds = sum(len(shard) for shard in shards.values())
+        notify(f"🧩 {feeds} feed(s) over {len(shards)} worker(s)" + (f", {moved} moved" if moved else ""))
+        return shards
+
+    def shutdown(self):
+        with self._lock:
+            for index in list(self._workers):
+                self._stop(index)
+
+    # --- rounds ---
+    def _busy(self, interval):
+        names = {f["name"] for f in config.get().feeds_for(interval)}
+        return [i for i, shard in self._shards.items() if names & shard.keys()]
+
+    def _broadcast(self, kind, interval, boundary):
+        self.ensure_alive()
+        round_id = next(self._round_ids)
+        with self._lock:
+            targets = self._busy(interval)
+            if kind == "round":
+                with self._replies:
+                    self._rounds[round_id] = {}
+            for index in targets:
+                self._workers[index][1].put((kind, interval, boundary, round_id))
+        return round_id, targets
+
+    def prepare(self, interval, boundary):
+        self._broadcast("prepare", interval, boundary)
+
+    def _collect(self):
+        while True:
+            try:
+                round_id, index, wallets, error, snap, records = self._outbox.get()
+            except (EOFError, OSError):
+                return
+            metrics.merge(snap, worker=str(index))
+            if records:
+                with metrics.stage("log_write"):
+                    performance_tracker.default_log().extend(records)
+            with self._replies:
+                if round_id in self._rounds:
+                    self._rounds[round_id][index] = (wallets, error)
+                    self._replies.notify_all()
+
+    def run_round(self, interval, boundary):
+        """Fan the round out and wait for every worker until the submit deadline (plus grace)."""
+        started = time.time()
+        round_id, targets = self._broadcast("round", interval, boundary)
+        deadline = boundary - config.get().predictoor.submit_margin_seconds + REPLY_GRACE
+        with self._replies:
+            self._replies.wait_for(lambda: len(self._rounds[round_id]) == len(targets),
+                                   timeout=max(0, deadline - time.time()))
+            replies = self._rounds.pop(round_id)
+        return aggregate(replies, [i for i in targets if i not in replies], time.time() - started)
+
+
+# === AGGREGATION ===
+def aggregate(replies, silent, seconds):
+    """Per-wallet summaries merged across workers; also records the per-wallet metrics."""
+    wallets, errors = {}, [f"worker {i} did not reply" for i in silent]
+    for index, (results, error) in sorted(replies.items()):
+        if error:
+            errors.append(f"worker {index}: {error}")
+        for address, summary in results.items():
+            total = wallets.setdefault(address, {"counts": {}, "seconds": 0.0, "feeds": {}})
+            for status, n in summary["counts"].items():
+                total["counts"][status] = total["counts"].get(status, 0) + n
+            total["feeds"].update(summary["feeds"])
+            total["seconds"] = max(total["seconds"], summary["seconds"])
+            if summary.get("error"):
+                errors.append(f"{address[:10]}…: {summary['error']}")
+    for address, total in wallets.items():
+        for status, n in total["counts"].items():
+            metrics.inc("wallet_submissions_total", n, wallet=address, status=status)
+        metrics.observe("wallet_round_seconds", total["seconds"], wallet=address)
+    metrics.observe("sharded_round_seconds", seconds)
+    return {"wallets": wallets, "errors": errors, "seconds": round(seconds, 2)}
+
+
+def format_summary(summary):
+    lines = [f"📋 Sharded round finished in {summary['seconds']}s | {len(summary['wallets'])} wallet(s)"]
+    for address, total in sorted(summary["wallets"].items()):
+        counts = ", ".join(f"{k}={v}" for k, v in sorted(total["counts"].items()))
+        lines.append(f"  {address[:10]}… {counts}")
+    lines += [f"  ❌ {error}" for error in summary["errors"]]
+    return "\n".join(lines)
+
+
+# === SCHEDULE ===
+def round_tasks(coordinator, intervals=None):
+    """(name, interval, run(boundary), lead_seconds) like agent_predictoor.round_tasks, fanned out to the shards."""
+    cfg = config.get()
+    lead, prepare_lead = cfg.predictoor.schedule_lead_seconds, cfg.predictoor.prepare_lead_seconds
+    tasks = []
+    for interval in cfg.feed_intervals() if intervals is None else intervals:
+        if cfg.predictoor.pipelined and prepare_lead > lead:
+            tasks.append((f"prepare-{interval}s", interval,
+                          lambda boundary, i=interval: coordinator.prepare(i, boundary), min(prepare_lead, interval - 1)))
+
+        def predict(boundary, interval=interval):
+            with telegram_notify.round_digest("🔮 Sharded prediction round"):
+                notify(format_summary(coordinator.run_round(interval, boundary)))
+        tasks.append((f"predict-{interval}s", interval, predict, lead))
+    return tasks
+
+
+def report_miss(name, boundary, late_by):
+    closed = datetime.utcfromtimestamp(boundary).strftime("%H:%M:%S")
+    notify(f"⏰ Missed {name} epoch closing {closed} UTC (late by {late_by:.1f}s)", key=f"miss:{name}")
+
+
+# === MAIN LOOP ===
+def main():
+    import agent_predictoor
+
+    metrics.start_from_env()
+    cfg = config.get()
+    telegram_notify.configure(cfg.telegram.bot_token, cfg.telegram.chat_id)
+    notify(f"🚀 Starting sharded agent: {len(cfg.wallets)} wallet(s), {worker_count(cfg)} worker(s)")
+    coordinator = Coordinator()
+    coordinator.rebalance(cfg)
+    sched = scheduler.EpochScheduler(lead_seconds=cfg.predictoor.schedule_lead_seconds, on_miss=report_miss)
+    scheduled = set(cfg.feed_intervals())
+
+    def add(name, interval, run, lead_seconds):
+        sched.add(name, interval, agent_predictoor.spawn(run, name.split("-")[0] + "-round"), lead_seconds=lead_seconds)
+
+    def on_reload(old, new):
+        fresh = [interval for interval in new.feed_intervals() if interval not in scheduled]
+        scheduled.update(fresh)
+        for task in round_tasks(coordinator, fresh):
+            add(*task)
+        if (old.feeds, old.wallets, old.sharding) != (new.feeds, new.wallets, new.sharding):
+            coordinator.rebalance(new)
+
+    for task in round_tasks(coordinator):
+        add(*task)
+    config.on_reload(on_reload)
+    sched.add("config-watch", config.WATCH_INTERVAL, lambda boundary: config.get(), lead_seconds=1)
+    try:
+        sched.run()
+    except KeyboardInterrupt:
+        notify("🛑 Sharded agent stopped")
+    finally:
+        coordinator.shutdown()
+        telegram_notify.flush()
+
+
+if __name__ == "__main__":
+    main()
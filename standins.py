@@ -0,0 +1,393 @@
+# standins.py
+"""
+Local stand-ins for the external services the agent talks to.
+
+Each stand-in is a small threaded HTTP server with configurable latency,
+error rate and rate limit that records every request it receives, so
+batching, retries, fallbacks and whole rounds can be exercised offline.
+"""
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class StandinServer:
+    """
+    Base class: subclasses implement `handle(method, path, body, headers)`
+    returning `(status, payload)` or `(status, payload, extra_headers)`.
+    `rate_limit` (requests/second) answers excess requests with 429 and
+    `Retry-After`.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, rate_limit=None, seed=None, port=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+        self.requests = []
+        self._lock = threading.Lock()
+        self._tokens = rate_limit or 0
+        self._refilled = time.monotonic()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle(self, method, path, body, headers):
+        raise NotImplementedError
+
+    def _take_token(self):
+        if not self.rate_limit:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled) * self.rate_limit)
+        self._refilled = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def _dispatch(self, method, path, body, headers):
+        with self._lock:
+            self.requests.append((method, path, body))
+            fail = self.random.random() < self.error_rate
+            allowed = self._take_token()
+        if self.latency:
+            time.sleep(self.latency)
+        if not allowed:
+            retry_after = max(1, math.ceil(1 / self.rate_limit))
+            return 429, {"ok": False, "parameters": {"retry_after": retry_after}}, {"Retry-After": str(retry_after)}
+        if fail:
+            return 503, {"error": "injected failure"}
+        return self.handle(method, path, body, headers)
+
+    def _make_handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else None
+                except ValueError:
+                    body = raw.decode(errors="replace")
+                status, payload, *extra = standin._dispatch(method, self.path, body, self.headers)
+                data = json.dumps(payload).encode() if payload is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (extra[0] if extra else {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def do_PATCH(self):
+                self._serve("PATCH")
+
+            def do_DELETE(self):
+                self._serve("DELETE")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class StandinRelayer(StandinServer):
+    """
+    Gelato relayer stand-in. Single payloads get `{"taskId": ...}`; with
+    `batch_supported` a `{"batch": [...]}` body gets one result per item,
+    `item_error_rate` of them failing. Without it batches get a 415, and
+    batches longer than `max_batch` a 413. An accepted payload's key (its
+    `Idempotency-Key`, or its entry in the envelope's `keys`) replays the
+    first task instead of submitting again.
+    """
+
+    def __init__(self, batch_supported=True, item_error_rate=0.0, max_batch=None, **kwargs):
+        super().__init__(**kwargs)
+        self.batch_supported = batch_supported
+        self.item_error_rate = item_error_rate
+        self.max_batch = max_batch
+        self.submissions = []
+        self._task_ids = iter(range(1, 10 ** 9))
+        self._tasks = {}
+
+    def handle(self, method, path, body, headers):
+        if method != "POST" or not isinstance(body, dict):
+            return 400, {"error": "expected a JSON object"}
+        if "batch" in body:
+            if not self.batch_supported:
+                return 415, {"error": "batches not supported"}
+            if self.max_batch and len(body["batch"]) > self.max_batch:
+                return 413, {"error": f"at most {self.max_batch} items per batch"}
+            if not all(isinstance(item, dict) for item in body["batch"]):
+                return 400, {"error": "expected a JSON object per item"}
+            keys = body.get("keys") or [None] * len(body["batch"])
+            results = []
+            for item, key in zip(body["batch"], keys):
+                if key not in self._tasks and self.random.random() < self.item_error_rate:
+                    results.append({"ok": False, "error": "item rejected"})
+                else:
+                    results.append({"ok": True, "taskId": self._submit(item, key)})
+            return 200, {"results": results}
+        return 200, {"taskId": self._submit(body, headers.get("Idempotency-Key"))}
+
+    def _submit(self, payload, key):
+        with self._lock:
+            if key in self._tasks:
+                return self._tasks[key]
+            self.submissions.append(payload)
+            task_id = next(self._task_ids)
+            if key:
+                self._tasks[key] = task_id
+            return task_id
+
+
+class StandinMirror(StandinServer):
+    """Contract address mirror serving predictoor.json and relayer lists with ETag revalidation."""
+
+    def __init__(self, contract="0x" + "ab" * 20, relayer="0x" + "cd" * 20, **kwargs):
+        super().__init__(**kwargs)
+        self.documents = {
+            "/predictoor.json": {"predictoor": {"address": contract}},
+            "/relayers": {"relayers": [relayer]},
+        }
+
+    def handle(self, method, path, body, headers):
+        document = self.documents.get(urlsplit(path).path)
+        if document is None:
+            return 404, {"error": "not found"}
+        etag = '"' + hashlib.sha1(json.dumps(document, sort_keys=True).encode()).hexdigest()[:16] + '"'
+        if headers.get("If-None-Match") == etag:
+            return 304, None, {"ETag": etag}
+        return 200, document, {"ETag": etag}
+
+
+class StandinTelegram(StandinServer):
+    """Bot API sendMessage with Telegram's per-chat pacing (`chat_interval` seconds)."""
+
+    def __init__(self, chat_interval=1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.chat_interval = chat_interval
+        self.messages = []
+        self._last_sent = {}
+
+    def handle(self, method, path, body, headers):
+        if not path.endswith("/sendMessage") or not isinstance(body, dict):
+            return 404, {"ok": False}
+        chat, now = str(body.get("chat_id")), time.monotonic()
+        with self._lock:
+            wait = self._last_sent.get(chat, -math.inf) + self.chat_interval - now
+            if wait > 0:
+                return 429, {"ok": False, "parameters": {"retry_after": max(1, math.ceil(wait))}}
+            self._last_sent[chat] = now
+            self.messages.append(body.get("text"))
+        return 200, {"ok": True, "result": {"message_id": len(self.messages)}}
+
+
+class StandinExplorer(StandinServer):
+    """Sapphire explorer account endpoint returning a slowly drifting balance (wei)."""
+
+    def __init__(self, balance=100.0, **kwargs):
+        super().__init__(**kwargs)
+        self.balance = balance
+
+    def handle(self, method, path, body, headers):
+        if "/accounts/" not in path:
+            return 404, {"error": "not found"}
+        self.balance += self.random.uniform(-1, 1)
+        return 200, {"balance": str(int(self.balance * 1e18))}
+
+
+class StandinExchange(StandinServer):
+    """Binance /api/v3/klines with a deterministic random walk per symbol."""
+
+    def handle(self, method, path, body, headers):
+        parts = urlsplit(path)
+        if parts.path != "/api/v3/klines":
+            return 404, {"code": -1}
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        step = _interval_ms(query.get("interval", "5m"))
+        limit = int(query.get("limit", 500))
+        now_ms = int(time.time() * 1000)
+        start = int(query.get("startTime", now_ms - limit * step)) // step * step
+        seed = int(hashlib.sha1(query.get("symbol", "").encode()).hexdigest()[:8], 16)
+        rows = []
+        for open_time in range(start, min(now_ms, start + limit * step), step):
+            rng = random.Random(seed ^ open_time)
+            base = 100 * math.exp(0.001 * math.sin(open_time / (step * 50)) + rng.gauss(0, 0.002))
+            close = base * math.exp(rng.gauss(0, 0.003))
+            rows.append([open_time, f"{base:.4f}", f"{max(base, close) * 1.001:.4f}",
+                         f"{min(base, close) * 0.999:.4f}", f"{close:.4f}", f"{rng.uniform(1, 100):.2f}",
+                         open_time + step - 1])
+        return 200, rows
+
+
+class StandinGelatoJobs(StandinServer):
+    """
+    Gelato jobs API: GET lists jobs a page at a time (`limit`, `cursor`,
+    answered with `next`), POST creates, PATCH /<id> updates and DELETE /<id>
+    removes one. Writes carrying a seen `Idempotency-Key` replay the first
+    answer instead of applying twice.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.jobs = {}
+        self.writes = 0
+        self._ids = iter(range(1, 10 ** 9))
+        self._replies = {}
+
+    def handle(self, method, path, body, headers):
+        parts = urlsplit(path)
+        if method == "GET":
+            query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+            start, limit = int(query.get("cursor", 0)), int(query.get("limit", 100))
+            with self._lock:
+                jobs = list(self.jobs.values())
+            page = jobs[start:start + limit]
+            return 200, {"jobs": page, "next": str(start + limit) if start + limit < len(jobs) else None}
+        key = headers.get("Idempotency-Key")
+        with self._lock:
+            if key and key in self._replies:
+                return self._replies[key]
+            reply = self._write(method, parts.path.rstrip("/").rsplit("/", 1)[-1], body)
+            if key:
+                self._replies[key] = reply
+        return reply
+
+    def _write(self, method, job_id, body):
+        if method == "POST" and isinstance(body, dict):
+            job = dict(body, id=f"job-{next(self._ids)}")
+            self.jobs[job["id"]] = job
+        elif method == "PATCH" and isinstance(body, dict) and job_id in self.jobs:
+            job = self.jobs[job_id] = dict(self.jobs[job_id], **body)
+        elif method == "DELETE" and job_id in self.jobs:
+            job = self.jobs.pop(job_id)
+        else:
+            return 404 if method in ("PATCH", "DELETE") else 400, {"error": "bad request"}
+        self.writes += 1
+        return 200, job
+
+
+class StandinPredictoorAPI(StandinServer):
+    """
+    Predictoor API stand-in. POST /payouts prices `slots` ({feed, epoch}) for
+    a wallet: a deterministic `loss_rate` share pays 0, `large_rate` pays
+    `large_payout`, the rest 0.1-5. POST /claim pays the listed slots once;
+    a claim without slots pays a random amount, like the old endpoint.
+    """
+
+    def __init__(self, loss_rate=0.5, large_rate=0.02, large_payout=50.0, **kwargs):
+        super().__init__(**kwargs)
+        self.loss_rate = loss_rate
+        self.large_rate = large_rate
+        self.large_payout = large_payout
+        self.claims = []
+        self._claimed = set()
+
+    def payout(self, wallet, feed, epoch):
+        digest = hashlib.sha1(f"{wallet}|{feed}|{epoch}".encode()).digest()
+        roll = int.from_bytes(digest[:4], "big") / 2 ** 32
+        if roll < self.loss_rate:
+            return 0.0
+        if roll < self.loss_rate + self.large_rate:
+            return self.large_payout
+        return round(0.1 + 4.9 * int.from_bytes(digest[4:8], "big") / 2 ** 32, 4)
+
+    def handle(self, method, path, body, headers):
+        route = urlsplit(path).path
+        body = body if isinstance(body, dict) else {}
+        wallet = body.get("wallet")
+        if method == "POST" and route.endswith("/payouts"):
+            payouts = [
+                dict(slot, amount=0.0 if (wallet, slot["feed"], slot["epoch"]) in self._claimed
+                     else self.payout(wallet, slot["feed"], slot["epoch"]))
+                for slot in body.get("slots", [])
+            ]
+            return 200, {"payouts": payouts}
+        if method == "POST" and route.endswith("/claim"):
+            if "slots" not in body:
+                return 200, {"claimed": round(self.random.uniform(0, 5), 4), "wallet": wallet}
+            claimed = 0.0
+            with self._lock:
+                for slot in body["slots"]:
+                    key = (wallet, slot["feed"], slot["epoch"])
+                    if key not in self._claimed:
+                        self._claimed.add(key)
+                        claimed += self.payout(*key)
+                self.claims.append(body)
+            return 200, {"claimed": round(claimed, 4), "wallet": wallet, "slots": len(body["slots"])}
+        return 404, {"error": "not found"}
+
+
+def _interval_ms(interval):
+    units = {"m": 60_000, "h": 3_600_000, "d": 86_400_000}
+    return int(interval[:-1]) * units[interval[-1]]
+
+
+SERVICES = {
+    "relayer": StandinRelayer,
+    "mirror": StandinMirror,
+    "telegram": StandinTelegram,
+    "explorer": StandinExplorer,
+    "exchange": StandinExchange,
+    "gelato": StandinGelatoJobs,
+    "predictoor": StandinPredictoorAPI,
+}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a local stand-in service.")
+    parser.add_argument("service", choices=sorted(SERVICES))
+    parser.add_argument("--port", type=int, default=8545)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=None)
+    parser.add_argument("--no-batch", action="store_true", help="relayer only: reject batched submissions")
+    parser.add_argument("--max-batch", type=int, default=None, help="relayer only: answer 413 to longer batches")
+    args = parser.parse_args()
+
+    options = {"latency": args.latency, "error_rate": args.error_rate, "rate_limit": args.rate_limit, "port": args.port}
+    if args.service == "relayer":
+        options.update(batch_supported=not args.no_batch, max_batch=args.max_batch)
+    server = SERVICES[args.service](**options).start()
+    print(f"🧪 Stand-in {args.service} listening on {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,184 @@
+# supervisor.py
+"""
+Long-running supervisor for every agent task.
+
+One process runs the predictor rounds, accuracy adjuster, reward claimer,
+profit tracker, contract refresh and Gelato job verification on one epoch
+scheduler. The tasks share the process's config, HTTP connection pools,
+discovery cache and Telegram queue, so nothing is re-installed, re-parsed
+or re-connected per run.
+
+Each task runs on its own thread. A crash is reported and the task is
+restarted after an exponential backoff (while its epoch is still open)
+without touching the others. A run that is still going when its next
+fire time comes is skipped instead of stacked.
+"""
+import importlib
+import sys
+import threading
+import time
+from datetime import datetime
+
+import config
+import metrics
+import scheduler
+import telegram_notify
+
+# Tasks not tied to a prediction epoch fire this long before their boundary.
+HOUSEKEEPING_LEAD = 60
+
+
+def notify(msg, key=None):
+    telegram_notify.send(msg, key=key)
+
+
+# === SUPERVISED TASKS ===
+class Task:
+    """One scheduled job with crash isolation, restart backoff and an overlap guard."""
+
+    def __init__(self, name, run):
+        self.name = name
+        self.run = run
+        self.failures = 0
+        self.restart_timer = None
+        self._running = threading.Lock()
+
+    def fire(self, boundary):
+        """Scheduler callback: start a run on its own thread unless one is still going."""
+        if self.restart_timer:
+            self.restart_timer.cancel()
+            self.restart_timer = None
+        if self._running.locked():
+            metrics.inc("supervisor_overlaps_total", task=self.name)
+            notify(f"⏳ {self.name} still running, skipping this epoch", key=f"overlap:{self.name}")
+            return
+        threading.Thread(target=self._attempt, args=(boundary,), name=self.name, daemon=True).start()
+
+    def _attempt(self, boundary):
+        if not self._running.acquire(blocking=False):
+            return
+        started = time.perf_counter()
+        error = None
+        try:
+            metrics.set_gauge("supervisor_task_running", 1, task=self.name)
+            self.run(boundary)
+        except Exception as e:
+            error = e
+            self.failures += 1
+            metrics.inc("supervisor_task_failures_total", task=self.name)
+        else:
+            if self.failures:
+                notify(f"✅ {self.name} recovered after {self.failures} failure(s)")
+            self.failures = 0
+        finally:
+            metrics.set_gauge("supervisor_task_running", 0, task=self.name)
+            metrics.observe("supervisor_task_seconds", time.perf_counter() - started, task=self.name)
+            self._running.release()
+        if error is not None:
+            self._schedule_restart(boundary, error)
+
+    def backoff(self):
+        settings = config.get().supervisor
+        return min(settings.restart_backoff_max_seconds, settings.restart_backoff_seconds * 2 ** (self.failures - 1))
+
+    def _schedule_restart(self, boundary, error):
+        delay = self.backoff()
+        if time.time() + delay >= boundary:
+            notify(f"❌ {self.name} crashed: {error} — next run at the following epoch", key=f"crash:{self.name}")
+            return
+        notify(f"❌ {self.name} crashed: {error} — restarting in {delay:.0f}s", key=f"crash:{self.name}")
+        metrics.inc("supervisor_restarts_total", task=self.name)
+        self.restart_timer = threading.Timer(delay, self._attempt, args=(boundary,))
+        self.restart_timer.daemon = True
+        self.restart_timer.start()
+
+
+def module_call(module_name, function, *args):
+    """
+    `run(boundary)` importing `module_name` on first use, so a module that
+    fails to load only takes down its own task (and is retried on restart).
+    """
+    def run(boundary):
+        getattr(importlib.import_module(module_name), function)(*args)
+    return run
+
+
+# === TASKS ===
+def refresh_contracts(boundary):
+    import contract_auto
+    contract_auto.update_agent_json(contract_auto.fetch_predictoor_contract(), contract_auto.fetch_gelato_relayer())
+
+
+def verify_gelato_jobs(boundary):
+    import gelato_job_register
+    with metrics.stage("gelato_verify"):
+        gelato_job_register.verify_jobs()
+
+
+def predictor_tasks():
+    """The predictor's own prepare/predict rounds, one pair per feed interval."""
+    import agent_predictoor
+    agent_predictoor.current_relayer()  # warm the discovery cache before the first deadline
+    agent_predictoor.resume_submissions()
+    return agent_predictoor.round_tasks()
+
+
+def build_tasks():
+    """(name, interval, run(boundary), lead_seconds) for everything the supervisor runs."""
+    cfg = config.get()
+    tasks = [
+        ("accuracy-adjust", min(cfg.feed_intervals()), module_call("accuracy_adjuster", "adjust_round"),
+         cfg.predictoor.schedule_lead_seconds),
+        ("claim-rewards", min(cfg.feed_intervals()), module_call("claim_rewards", "claim_rewards"),
+         HOUSEKEEPING_LEAD),
+        ("profit-tracker", cfg.supervisor.profit_interval, module_call("profit_tracker", "track_profit"),
+         HOUSEKEEPING_LEAD),
+        ("contract-refresh", cfg.supervisor.contract_refresh_interval, refresh_contracts, HOUSEKEEPING_LEAD),
+        ("gelato-verify", cfg.supervisor.gelato_interval, verify_gelato_jobs, HOUSEKEEPING_LEAD),
+    ]
+    try:
+        tasks = predictor_tasks() + tasks
+    except Exception as e:
+        notify(f"❌ Predictor could not start, running the other tasks without it: {e}")
+    return tasks
+
+
+def report_miss(name, boundary, late_by):
+    closed = datetime.utcfromtimestamp(boundary).strftime("%H:%M:%S")
+    notify(f"⏰ Missed {name} epoch closing {closed} UTC (late by {late_by:.1f}s)", key=f"miss:{name}")
+
+
+# === MAIN LOOP ===
+def main():
+    metrics.start_from_env()
+    cfg = config.get()
+    telegram_notify.configure(cfg.telegram.bot_token, cfg.telegram.chat_id)
+    notify("🚀 Supervisor starting")
+    sched = scheduler.EpochScheduler(lead_seconds=cfg.predictoor.schedule_lead_seconds, on_miss=report_miss)
+
+    def add(name, interval, run, lead):
+        sched.add(name, interval, Task(name, run).fire, lead_seconds=lead)
+        notify(f"Scheduled {name} every {scheduler.parse_interval(interval)}s")
+
+    for task in build_tasks():
+        add(*task)
+    if "agent_predictoor" in sys.modules:  # only when the predictor loaded
+        sys.modules["agent_predictoor"].watch_feed_intervals(add)
+    # Reloads agent_instructions.json / feeds.yaml edits without restarting anything.
+    sched.add("config-watch", config.WATCH_INTERVAL, lambda boundary: config.get(), lead_seconds=1)
+    while True:
+        try:
+            sched.run()
+            return
+        except KeyboardInterrupt:
+            notify("🛑 Supervisor stopped")
+            telegram_notify.flush()
+            return
+        except Exception as e:
+            # Task bodies run on their own threads; this only guards the scheduler loop itself.
+            notify(f"❌ Scheduler loop error, resuming: {e}")
+            time.sleep(1)
+
+
+if __name__ == "__main__":
+    main()
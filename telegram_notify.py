@@ -1,35 +1,279 @@
 # telegram_notify.py
-import os
-import requests
+"""
+Single front end for Telegram notifications.
+
+`send()` never blocks on the network: messages are printed, then handed to a
+background worker that rate-limits per chat, collapses repeated warnings and
+spills to disk when the queue is full. Inside `round_digest()` all messages of
+a round are coalesced into one Telegram message.
+"""
+import atexit
+import html
 import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
+import http_client
+import metrics
+
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+TELEGRAM_API = os.getenv("TELEGRAM_API", "https://api.telegram.org")
+
+MAX_QUEUE = 200                       # messages held in memory before spilling
+SPILL_FILE = "logs/notify_spill.jsonl"
+MIN_INTERVAL = 1.0                    # Telegram allows ~1 msg/s per chat
+DEDUPE_WINDOW = 60                    # seconds a repeated key stays suppressed
+MAX_TEXT = 4000                       # Telegram hard limit is 4096 chars
+
+ICONS = {"info": "ℹ️", "success": "✅", "error": "❌", "warn": "⚠️"}
+
+_queue = queue.Queue(maxsize=MAX_QUEUE)
+_lock = threading.Lock()
+_worker = None
+_local = threading.local()  # .digest: the round digest open on this thread, if any
+_recent = {}            # dedupe key -> [first_seen, suppressed_count]
+_spill_lock = threading.Lock()
+
+
+def configure(bot_token=None, chat_id=None):
+    """Fill in credentials from agent config when the environment has none."""
+    global BOT_TOKEN, CHAT_ID
+    BOT_TOKEN = BOT_TOKEN or bot_token
+    CHAT_ID = CHAT_ID or chat_id
+
+
+def _fit(text, budget):
+    """`text` HTML-escaped and cut to at most `budget` chars, never inside an entity."""
+    escaped = html.escape(text)
+    if len(escaped) <= budget:
+        return escaped
+    cut = text[:budget - 1]
+    while len(html.escape(cut)) > budget - 1:
+        cut = cut[:len(cut) - (len(html.escape(cut)) - (budget - 1))]
+    return html.escape(cut) + "…"
+
+
+def format_message(msg: str, level: str = "info", data: dict | None = None):
+    """Telegram HTML for `msg`, cut to MAX_TEXT without breaking an entity or tag."""
+    icon = ICONS.get(level, "📢")
+    timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
+    head, tail = f"{icon} <b>Predictoor Agent</b>\n\n", f"\n\n🕒 <code>{timestamp}</code>"
+    extra = f"\n\n📊 Data:\n<pre>{html.escape(json.dumps(data, indent=2))}</pre>" if data else ""
+    if len(extra) > MAX_TEXT // 2:
+        extra = ""
+    return head + _fit(msg, MAX_TEXT - len(head) - len(tail) - len(extra)) + tail + extra
+
+
+def split_digest(heading, lines):
+    """
+    Digest bodies that each fit one message once formatted, split on line
+    boundaries so no line (least of all the closing summary) is cut off.
+    """
+    budget = MAX_TEXT - len(format_message("")) - len(html.escape(heading)) - len(" (99/99)\n\n")
+    chunks, current, size = [], [], 0
+    for line in lines:
+        n = len(html.escape(line)) + 1
+        if current and size + n > budget:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(line)
+        size += n
+    if current:
+        chunks.append(current)
+    total = len(chunks)
+    return [f"{heading}{f' ({i}/{total})' if total > 1 else ''}\n\n" + "\n".join(chunk)
+            for i, chunk in enumerate(chunks, 1)]
+
+
+def _suppressed(key):
+    """Return None to drop a repeat of `key`, else the number of repeats dropped so far."""
+    now = time.monotonic()
+    with _lock:
+        seen = _recent.get(key)
+        if seen and now - seen[0] < DEDUPE_WINDOW:
+            seen[1] += 1
+            return None
+        dropped = seen[1] if seen else 0
+        _recent[key] = [now, 0]
+        return dropped
+
+
+def send(msg: str, level: str = "info", data: dict | None = None, key: str | None = None):
+    """
+    Print `msg` and queue it for Telegram without blocking.
+
+    Messages sharing a `key` (e.g. retry warnings for one URL) are sent at
+    most once per DEDUPE_WINDOW; the next one reports how many were dropped.
+    """
+    print(msg)
+    if key is not None:
+        dropped = _suppressed(key)
+        if dropped is None:
+            return
+        if dropped:
+            msg = f"{msg} (+{dropped} similar suppressed)"
+
+    digest = getattr(_local, "digest", None)
+    if digest is not None:
+        with _lock:
+            if not digest.closed:
+                digest.lines.append((level, msg))
+                return
+    _enqueue(format_message(msg, level, data))
+
 
-def send(msg: str, level: str = "info", data: dict | None = None):
-    """Send formatted Telegram message with optional JSON payload"""
+class _Digest:
+    def __init__(self):
+        self.depth = 0
+        self.titles = []
+        self.lines = []
+        self.closed = False
+
+
+@contextmanager
+def round_digest(title: str):
+    """
+    Collect every send() of this thread inside the block into one per-round
+    message. Nested blocks join the outer digest; rounds on other threads
+    keep their own. Work fanned out to pools joins it through `bind()`.
+    """
+    digest = getattr(_local, "digest", None)
+    if digest is None or digest.closed:
+        digest = _local.digest = _Digest()
+    with _lock:
+        digest.depth += 1
+        if title not in digest.titles:
+            digest.titles.append(title)
+    try:
+        yield
+    finally:
+        with _lock:
+            digest.depth -= 1
+            lines = None
+            if digest.depth == 0:
+                # Late sends from bound workers go out on their own from here on.
+                digest.closed = True
+                lines, heading = digest.lines, " + ".join(digest.titles)
+        if lines is not None:
+            _local.digest = None
+        if lines:
+            level = "error" if any(l == "error" for l, _ in lines) else "info"
+            for body in split_digest(heading, [m for _, m in lines]):
+                _enqueue(format_message(body, level))
+
+
+def bind(fn):
+    """`fn` wrapped so its sends join the round digest open on the calling thread, wherever it runs."""
+    digest = getattr(_local, "digest", None)
+    if digest is None:
+        return fn
+
+    def bound(*args, **kwargs):
+        previous, _local.digest = getattr(_local, "digest", None), digest
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.digest = previous
+    return bound
+
+
+# === QUEUE / BACKPRESSURE ===
+def _enqueue(text):
     if not BOT_TOKEN or not CHAT_ID:
-        print("[Notify] Missing Telegram config.")
         return
+    _ensure_worker()
+    try:
+        _queue.put_nowait(text)
+    except queue.Full:
+        metrics.inc("notify_spilled_total")
+        _spill(text)
 
-    icons = {"info": "ℹ️", "success": "✅", "error": "❌", "warn": "⚠️"}
-    icon = icons.get(level, "📢")
-    timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
 
-    text = f"{icon} *Predictoor Agent*\n\n{msg}\n\n🕒 `{timestamp}`"
-    if data:
-        text += f"\n\n📊 Data:\n<pre>{json.dumps(data, indent=2)}</pre>"
+def _spill(text):
+    try:
+        with _spill_lock:
+            os.makedirs(os.path.dirname(SPILL_FILE) or ".", exist_ok=True)
+            with open(SPILL_FILE, "a") as f:
+                f.write(json.dumps({"text": text}) + "\n")
+    except OSError as e:
+        print(f"[Notify] Dropped message, spill failed: {e}")
+
+
+def _drain_spill():
+    """Move spilled messages back into the queue once there is room."""
+    with _spill_lock:
+        if not os.path.exists(SPILL_FILE):
+            return
+        with open(SPILL_FILE, "r") as f:
+            pending = [json.loads(line)["text"] for line in f if line.strip()]
+        os.remove(SPILL_FILE)
+    for i, text in enumerate(pending):
+        try:
+            _queue.put_nowait(text)
+        except queue.Full:
+            for rest in pending[i:]:
+                _spill(rest)
+            return
+
 
+# === WORKER ===
+def _post(text):
+    """Deliver one message; returns seconds to wait before the next one."""
     try:
-        requests.post(
-            f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage",
+        r = http_client.post(
+            f"{TELEGRAM_API}/bot{BOT_TOKEN}/sendMessage",
             json={"chat_id": CHAT_ID, "text": text, "parse_mode": "HTML"},
             timeout=10,
+            retries=1,
+            check=False,
+            lane="notify",
         )
-        print("[Notify] Message sent to Telegram successfully.")
+        if r.status_code == 429:
+            retry_after = r.json().get("parameters", {}).get("retry_after", 5)
+            _spill(text)
+            return float(retry_after)
+        if r.status_code >= 400:
+            print(f"[Notify] Telegram rejected message: {r.status_code} {r.text[:200]}")
     except Exception as e:
         print(f"[Notify] Telegram send failed: {e}")
+    return MIN_INTERVAL
+
+
+def _run():
+    while True:
+        try:
+            text = _queue.get(timeout=5)
+        except queue.Empty:
+            _drain_spill()
+            continue
+        metrics.set_gauge("notify_queue_depth", _queue.qsize())
+        with metrics.stage("notification"):
+            pause = _post(text)
+        _queue.task_done()
+        time.sleep(pause)
+
+
+def _ensure_worker():
+    global _worker
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name="telegram-notify", daemon=True)
+            _worker.start()
+
+
+def flush(timeout: float = 10):
+    """Wait (bounded) for queued messages to be delivered; used at shutdown."""
+    end = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < end:
+        time.sleep(0.05)
+
+
+atexit.register(flush)
 
 if __name__ == "__main__":
     # Quick manual test
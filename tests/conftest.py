@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+# The agent scripts are flat top-level modules.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Run every test in an empty directory, so logs/ and data/ never touch the repo."""
+    monkeypatch.chdir(tmp_path)
+    config.reset()
+    yield tmp_path
+    config.reset()
+
+
+@pytest.fixture
+def use_config(monkeypatch):
+    """Install a config built from `raw` (agent_instructions.json layout) as config.get()."""
+    def install(raw):
+        cfg = config.build(raw, environ={})
+        monkeypatch.setattr(config, "get", lambda *args, **kwargs: cfg)
+        return cfg
+    return install
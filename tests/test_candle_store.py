@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+import candle_store
+import standins
+
+INTERVAL_MS = 5 * 60_000
+
+
+@pytest.fixture
+def exchange(monkeypatch):
+    with standins.StandinExchange(seed=1) as server:
+        monkeypatch.setattr(candle_store, "BINANCE_API", server.url)
+        yield server
+
+
+def test_top_up_fills_an_empty_store_with_closed_candles(exchange):
+    store = candle_store.CandleStore("BTCUSDT", "5m", root="data")
+    now = 1_700_000_000
+    added = store.top_up(start_ms=(now - 3600) * 1000, now=now)
+    times = np.asarray(store.column("open_time"))
+    assert added == len(store) == 12
+    assert np.all(np.diff(times) == INTERVAL_MS)
+    assert times[-1] + INTERVAL_MS <= now * 1000  # the still-open candle is left for later
+
+
+def test_top_up_only_fetches_candles_after_the_last_stored_one(exchange):
+    store = candle_store.CandleStore("BTCUSDT", "5m", root="data")
+    now = 1_700_000_000
+    store.top_up(start_ms=(now - 3600) * 1000, now=now)
+    before = len(exchange.requests)
+    assert store.top_up(now=now) == 0
+    assert store.top_up(now=now + 600) == 2
+    assert len(exchange.requests) == before + 1
+    assert "startTime" in exchange.requests[-1][1]
+
+
+def test_refresh_maps_candles_appended_by_another_store(exchange):
+    reader = candle_store.CandleStore("BTCUSDT", "5m", root="data")
+    writer = candle_store.CandleStore("BTCUSDT", "5m", root="data")
+    now = 1_700_000_000
+    writer.top_up(start_ms=(now - 3600) * 1000, now=now)
+    assert len(reader) == 0
+    assert reader.refresh() == 12
+    assert reader.last_open_time() == writer.last_open_time()
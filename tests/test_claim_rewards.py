@@ -0,0 +1,69 @@
+import pytest
+
+import claim_rewards
+import performance_tracker
+import standins
+
+WALLET = "0x" + "ab" * 20
+NOW = 1_700_000_000
+
+
+@pytest.fixture
+def claims_config(use_config):
+    return use_config({
+        "feeds": [{"name": "BTC/USDT", "interval": "5m"}],
+        "claims": {"threshold": 10, "early_payout": 5, "cost": 0.5},
+        "predictoor": {"claim_interval_seconds": 14400},
+    })
+
+
+def slots(*amounts, due=NOW):
+    return [{"wallet": WALLET, "feed": "BTC/USDT", "epoch": i, "due": due, "amount": a} for i, a in enumerate(amounts)]
+
+
+@pytest.mark.parametrize("amounts, due, reason", [
+    ((0.2, 0.2), NOW - 86400, None),              # never worth less than a claim costs
+    ((4.0, 3.0), NOW, None),                      # below threshold, nothing large, still young
+    ((6.0, 4.0), NOW, "threshold"),
+    ((6.0,), NOW, "large payout"),
+    ((1.0, 2.0), NOW - 14400, "age"),
+])
+def test_plan_claim(claims_config, amounts, due, reason):
+    assert claim_rewards.plan_claim(slots(*amounts, due=due), now=NOW) == reason
+
+
+def write_predictions(count):
+    log = performance_tracker.PredictionLog()
+    for epoch in range(count):
+        log.append({"type": "prediction", "feed": "BTC/USDT", "epoch": NOW - 3600 + epoch * 300,
+                    "direction": "up", "confidence": 0.7, "wallet": WALLET, "interval": 300, "ts": NOW - 3600})
+    log.close()
+
+
+def test_payout_index_prices_resolved_slots_and_drops_losses(use_config):
+    with standins.StandinPredictoorAPI(loss_rate=0.5, seed=1) as api:
+        use_config({"feeds": [{"name": "BTC/USDT", "interval": "5m"}], "predictoor": {"api_endpoint": api.url}})
+        write_predictions(10)
+        index = claim_rewards.PayoutIndex("logs/claim_index.json")
+        index.catch_up(WALLET, NOW)
+        assert len(index.slots) == 10
+        assert not index.claimable()
+
+        assert claim_rewards.price_slots(index, NOW) == 10
+        assert len(api.requests) == 1  # one /payouts call for the wallet
+        winners = [(s["feed"], s["epoch"]) for s in index.slots.values()]
+        assert all(api.payout(WALLET, feed, epoch) > 0 for feed, epoch in winners)
+        assert len(winners) == sum(api.payout(WALLET, "BTC/USDT", NOW - 3600 + e * 300) > 0 for e in range(10))
+        assert claim_rewards.price_slots(index, NOW) == 0  # priced slots are not asked for again
+
+        index.save()
+        reloaded = claim_rewards.PayoutIndex.load("logs/claim_index.json")
+        reloaded.catch_up(WALLET, NOW)
+        assert reloaded.slots == index.slots
+
+
+def test_unresolved_epochs_are_not_priced(claims_config):
+    write_predictions(3)
+    index = claim_rewards.PayoutIndex("logs/claim_index.json")
+    index.catch_up(WALLET, NOW)
+    assert index.unpriced(NOW - 3600) == {}
@@ -0,0 +1,38 @@
+import journal
+
+WALLET = "0xabc"
+
+
+def entry(feed, epoch, deadline=2_000, payload=None):
+    return (WALLET, feed, epoch, deadline, payload or {"feed": feed})
+
+
+def test_begin_skips_submissions_already_sent():
+    j = journal.SubmissionJournal("logs/submissions.db")
+    todo = j.begin([entry("A", 100), entry("B", 100)], now=1_000)
+    assert [e[1] for e in todo] == ["A", "B"]
+    j.finish([(WALLET, "A", 100, True), (WALLET, "B", 100, False)], now=1_001)
+
+    todo = j.begin([entry("A", 100), entry("B", 100), entry("A", 200)], now=1_002)
+    assert [(e[1], e[2]) for e in todo] == [("B", 100), ("A", 200)]
+    assert j.status(WALLET, "A", 100) == "sent"
+    assert j.status(WALLET, "B", 100) == "pending"
+    j.close()
+
+
+def test_recover_resumes_open_submissions_and_expires_the_rest():
+    j = journal.SubmissionJournal("logs/submissions.db")
+    j.begin([entry("A", 100, deadline=1_500, payload={"x": 1}), entry("B", 100, deadline=900)], now=800)
+    j.close()
+
+    reopened = journal.SubmissionJournal("logs/submissions.db")
+    assert reopened.recover(now=1_000) == [(WALLET, "A", 100, 1_500, {"x": 1})]
+    assert reopened.status(WALLET, "B", 100) == "expired"
+    assert reopened.recover(now=2_000) == []
+    assert reopened.status(WALLET, "A", 100) == "expired"
+    reopened.close()
+
+
+def test_submission_key_is_stable_and_distinct():
+    assert journal.submission_key(WALLET, "A", 100) == journal.submission_key(WALLET, "A", 100.0)
+    assert journal.submission_key(WALLET, "A", 100) != journal.submission_key(WALLET, "A", 101)
@@ -0,0 +1,32 @@
+import time
+
+import performance_tracker
+
+
+def prediction(wallet, direction, confidence=0.7, feed="A", epoch=100):
+    return {"type": "prediction", "feed": feed, "epoch": epoch, "direction": direction,
+            "confidence": confidence, "wallet": wallet, "ts": time.time()}
+
+
+def test_one_outcome_resolves_every_wallets_prediction():
+    engine = performance_tracker.AccuracyEngine()
+    engine.apply(prediction("0x1", "up"))
+    engine.apply(prediction("0x2", "down"))
+    assert len(engine.pending) == 2
+    engine.apply({"type": "outcome", "feed": "A", "epoch": 100, "direction": "up"})
+    assert engine.pending == {}
+    stats = engine.feeds["A"]
+    assert (stats.predictions, stats.resolved, stats.hits) == (2, 2, 1)
+
+
+def test_checkpoints_keyed_by_feed_and_epoch_still_resolve():
+    old = performance_tracker.AccuracyEngine()
+    old.apply(prediction("0x1", "up"))
+    state = old.to_state()
+    state["pending"] = {"A|100": prediction("0x1", "up")}
+
+    engine = performance_tracker.AccuracyEngine()
+    engine.load_state(state)
+    engine.apply({"type": "outcome", "feed": "A", "epoch": 100, "direction": "up"})
+    assert engine.pending == {}
+    assert engine.feeds["A"].hits == 1
@@ -0,0 +1,79 @@
+import pytest
+
+import http_client
+import relayer_client
+import standins
+
+
+@pytest.fixture(autouse=True)
+def forget_unsupported():
+    relayer_client._unsupported.clear()
+    yield
+    relayer_client._unsupported.clear()
+
+
+def payloads(n):
+    return [{"feed": f"F{i}/USDT", "direction": "up", "confidence": 0.7, "wallet": "0xabc"} for i in range(n)]
+
+
+def test_batch_reports_partial_failures_per_item():
+    with standins.StandinRelayer(item_error_rate=0.5, seed=3) as relayer:
+        results = relayer_client.submit_batch(relayer.url, payloads(20))
+        assert len(results) == 20
+        failed = [r for r in results if not r["ok"]]
+        assert 0 < len(failed) < 20
+        assert len(relayer.submissions) == 20 - len(failed)
+        assert len(relayer.requests) == 1
+
+
+def test_submit_many_resends_only_the_failed_items():
+    with standins.StandinRelayer(item_error_rate=0.5, seed=3) as relayer:
+        sent_one = []
+
+        def send_one(payload):
+            sent_one.append(payload)
+            return True
+
+        items = payloads(20)
+        results = relayer_client.submit_many(relayer.url, items, send_one)
+        assert results == [True] * 20
+        assert 0 < len(sent_one) < 20
+        batched = {p["feed"] for p in relayer.submissions}
+        assert batched.isdisjoint(p["feed"] for p in sent_one)
+        assert batched | {p["feed"] for p in sent_one} == {p["feed"] for p in items}
+
+
+def test_rejected_batches_fall_back_to_single_posts_and_are_remembered():
+    with standins.StandinRelayer(batch_supported=False) as relayer:
+        assert relayer_client.submit_batch(relayer.url, payloads(3)) is None
+        assert not relayer_client.supports_batches(relayer.url)
+        sent = relayer_client.submit_many(relayer.url, payloads(3), lambda p: True)
+        assert sent == [True, True, True]
+        assert len(relayer.requests) == 1  # the second round never tried a batch
+
+
+def test_per_item_keys_let_a_resend_dedupe_against_a_batch_that_landed():
+    with standins.StandinRelayer() as relayer:
+        items, keys = payloads(5), [f"key-{i}" for i in range(5)]
+        assert all(r["ok"] for r in relayer_client.submit_batch(relayer.url, items, keys=keys))
+        # The batch's answer was lost, so every item goes out again under its own key.
+        for item, key in zip(items, keys):
+            http_client.post(relayer.url, json=item, headers={"Idempotency-Key": key})
+        assert relayer.submissions == items
+
+
+def test_oversized_batches_are_split_until_they_fit():
+    with standins.StandinRelayer(max_batch=4) as relayer:
+        items = payloads(10)
+        results = relayer_client.submit_batch(relayer.url, items)
+        assert [r["ok"] for r in results] == [True] * 10
+        assert relayer.submissions == items
+        assert relayer_client.supports_batches(relayer.url)
+
+
+def test_a_bad_request_fails_the_batch_but_keeps_batching_on():
+    with standins.StandinRelayer() as relayer:
+        results = relayer_client.submit_batch(relayer.url, payloads(2) + ["not a payload"])
+        assert results is not None
+        assert not any(r["ok"] for r in results)
+        assert relayer_client.supports_batches(relayer.url)
@@ -0,0 +1,47 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import telegram_notify
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    messages = []
+    monkeypatch.setattr(telegram_notify, "_enqueue", messages.append)
+    return messages
+
+
+def test_rounds_on_other_threads_keep_their_own_digest(sent):
+    inside = threading.Event()
+    release = threading.Event()
+
+    def other_round():
+        with telegram_notify.round_digest("B round"):
+            telegram_notify.send("from B")
+            inside.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=other_round)
+    with telegram_notify.round_digest("A round"):
+        thread.start()
+        inside.wait(5)
+        telegram_notify.send("from A")
+    release.set()
+    thread.join(5)
+
+    assert len(sent) == 2
+    a, b = sent
+    assert "A round" in a and "from A" in a and "from B" not in a
+    assert "B round" in b and "from B" in b and "from A" not in b
+
+
+def test_bound_pool_work_joins_the_callers_digest(sent):
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        with telegram_notify.round_digest("Round"):
+            list(pool.map(telegram_notify.bind(telegram_notify.send), ["one", "two"]))
+        pool.submit(telegram_notify.send, "after").result()
+    assert len(sent) == 2
+    assert "one" in sent[0] and "two" in sent[0]
+    assert "after" in sent[1]